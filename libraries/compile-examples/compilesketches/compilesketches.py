@@ -1,16 +1,28 @@
+import concurrent.futures
 import contextlib
 import enum
+import functools
+import hashlib
+import http.client
 import json
 import os
 import pathlib
+import queue
 import re
 import shlex
 import shutil
+import sqlite3
 import subprocess
 import sys
+import tarfile
 import tempfile
+import threading
+import time
 import urllib
+import urllib.error
+import urllib.parse
 import urllib.request
+import zipfile
 
 import git
 import gitdb.exc
@@ -50,7 +62,21 @@ def main():
         github_token=os.environ["INPUT_GITHUB-TOKEN"],
         enable_deltas_report=os.environ["INPUT_ENABLE-DELTAS-REPORT"],
         enable_warnings_report=os.environ["INPUT_ENABLE-WARNINGS-REPORT"],
-        sketches_report_path=os.environ["INPUT_SKETCHES-REPORT-PATH"]
+        sketches_report_path=os.environ["INPUT_SKETCHES-REPORT-PATH"],
+        jobs=os.environ["INPUT_JOBS"],
+        compilation_cache_path=os.environ["INPUT_COMPILATION-CACHE-PATH"],
+        compilation_cache_size=os.environ["INPUT_COMPILATION-CACHE-SIZE"],
+        reuse_core_build_cache=os.environ["INPUT_REUSE-CORE-BUILD-CACHE"],
+        download_cache_path=os.environ["INPUT_DOWNLOAD-CACHE-PATH"],
+        repository_cache_path=os.environ["INPUT_REPOSITORY-CACHE-PATH"],
+        ranged_download_threshold=os.environ["INPUT_RANGED-DOWNLOAD-THRESHOLD"],
+        platform_snapshot_path=os.environ["INPUT_PLATFORM-SNAPSHOT-PATH"],
+        lockfile_path=os.environ["INPUT_LOCKFILE-PATH"],
+        board_manager_index_ttl=os.environ["INPUT_BOARD-MANAGER-INDEX-TTL"],
+        concurrent_deltas=os.environ["INPUT_CONCURRENT-DELTAS"],
+        baseline_report_path=os.environ["INPUT_BASELINE-REPORT-PATH"],
+        result_store_path=os.environ["INPUT_RESULT-STORE-PATH"],
+        result_store_retention=os.environ["INPUT_RESULT-STORE-RETENTION"]
     )
 
     compile_sketches.compile_sketches()
@@ -62,7 +88,7 @@ class CompileSketches:
     Keyword arguments:
     cli_version -- version of the Arduino CLI to use
     fqbn_arg -- fully qualified board name of the board to compile for. Space separated list with Boards Manager URL if
-                needed
+                needed. May also be a YAML-format list of boards in that format, to compile for multiple boards.
     platforms -- YAML-format list of platforms to install
     libraries -- YAML-format or space-separated list of libraries to install
     sketch_paths -- space-separated list of paths containing sketches to compile. These paths will be searched
@@ -74,6 +100,34 @@ class CompileSketches:
     enable_warnings_report -- set to "true" to cause the action to add compiler warning count to the sketches report
                                  ("true", "false")
     sketches_report_path -- folder to save the sketches report to
+    jobs -- maximum number of sketch compilations to run concurrently. Set to "" to use the number of CPUs.
+    compilation_cache_path -- folder to store the compilation results in, for reuse by later runs. Set to "" to disable
+                              the compilation cache.
+    compilation_cache_size -- maximum size in megabytes of the compilation cache
+    reuse_core_build_cache -- set to "true" to keep the compiled core between compilations when the warnings report is
+                              enabled. The core warnings are replayed to keep the warning counts accurate.
+                              ("true", "false")
+    download_cache_path -- folder to store downloaded archives in, for reuse by later runs. Set to "" to disable the
+                           download cache.
+    repository_cache_path -- folder to store mirrors of the repository dependencies in, for reuse by later runs. Set to
+                             "" to disable the repository cache.
+    ranged_download_threshold -- size in megabytes above which a download is split into byte ranges which are
+                                 downloaded concurrently. Set to "0" to disable ranged downloads.
+    platform_snapshot_path -- folder to store snapshots of the Arduino CLI data directory with the Board Manager
+                              platforms installed in, for reuse by later runs. Set to "" to disable the snapshots.
+    lockfile_path -- path of the lockfile. If the file exists, the dependencies are installed as locked by it,
+                     otherwise it is written with the dependencies as installed. Set to "" to disable the lockfile.
+    board_manager_index_ttl -- time in minutes for which the Board Manager index files are used without checking for
+                               updates
+    concurrent_deltas -- set to "true" to compile the sketches at the head and deltas base refs at the same time
+                         ("true", "false")
+    baseline_report_path -- sketches report file, or folder of sketches report files, made at the deltas base ref
+                            commit. Its data is used in place of compiling the sketches at the deltas base ref. Set to
+                            "" to always compile at the deltas base ref.
+    result_store_path -- path of the SQLite database to store the data of the sketches in, by commit, for use by later
+                         runs in place of compiling the sketches at the deltas base ref. Set to "" to disable the result
+                         store.
+    result_store_retention -- time in days for which the data of the sketches is kept in the result store
     """
 
     class RunCommandOutput(enum.Enum):
@@ -82,10 +136,16 @@ class CompileSketches:
         ALWAYS = enum.auto()
 
     not_applicable_indicator = "N/A"
+    multiple_boards_sketches_report_file_name = "sketches-report.json"
     relative_size_report_decimal_places = 2
 
     temporary_directory = tempfile.TemporaryDirectory(prefix="compilesketches-")
     arduino_cli_installation_path = pathlib.Path.home().joinpath("bin")
+    arduino_cli_latest_version_file_name = "arduino-cli-latest.json"
+    # Time in seconds for which the version "latest" was resolved to is reused without checking for a newer release
+    arduino_cli_latest_version_ttl = 24 * 60 * 60
+    board_manager_index_url = "https://downloads.arduino.cc/packages/package_index.json"
+    board_manager_index_record_file_name = "compilesketches-index-record.json"
     arduino_cli_user_directory_path = pathlib.Path.home().joinpath("Arduino")
     arduino_cli_data_directory_path = pathlib.Path.home().joinpath(".arduino15")
     libraries_path = arduino_cli_user_directory_path.joinpath("libraries")
@@ -115,17 +175,31 @@ class CompileSketches:
     dependency_source_path_key = "source-path"
     dependency_source_url_key = "source-url"
     dependency_destination_name_key = "destination-name"
+    dependency_checksum_key = "checksum"
+    dependency_submodules_key = "submodules"
 
     latest_release_indicator = "latest"
 
+    installation_receipt_file_name = ".compilesketches-receipt.json"
+
+    # Extensions of the library files Arduino CLI compiles, or which might be included by them
+    library_source_file_extensions = [".c", ".cpp", ".S", ".h", ".hh", ".hpp", ".tpp", ".ipp", ".ino", ".pde"]
+
+    lockfile_cli_version_key = "cli-version"
+    lockfile_platforms_key = "platforms"
+    lockfile_libraries_key = "libraries"
+    lockfile_library_manager_releases_key = "library-manager-releases"
+
     def __init__(self, cli_version, fqbn_arg, platforms, libraries, sketch_paths, verbose, github_token,
-                 enable_deltas_report, enable_warnings_report, sketches_report_path):
+                 enable_deltas_report, enable_warnings_report, sketches_report_path, jobs, compilation_cache_path,
+                 compilation_cache_size, reuse_core_build_cache, download_cache_path, repository_cache_path,
+                 ranged_download_threshold, platform_snapshot_path, lockfile_path, board_manager_index_ttl,
+                 concurrent_deltas, baseline_report_path, result_store_path, result_store_retention):
         """Process, store, and validate the action's inputs."""
         self.cli_version = cli_version
 
-        parsed_fqbn_arg = parse_fqbn_arg_input(fqbn_arg=fqbn_arg)
-        self.fqbn = parsed_fqbn_arg["fqbn"]
-        self.additional_url = parsed_fqbn_arg["additional_url"]
+        # List of dictionaries in the format returned by parse_fqbn_arg_input(), one for each board to compile for
+        self.boards = parse_fqbn_input(fqbn_input=fqbn_arg)
         self.platforms = platforms
         self.libraries = libraries
 
@@ -136,24 +210,24 @@ class CompileSketches:
 
         self.verbose = parse_boolean_input(boolean_input=verbose)
 
-        if github_token == "":
-            # Access token is not needed for public repositories
-            self.github_api = github.Github()
-        else:
-            self.github_api = github.Github(login_or_token=github_token)
+        # Access token is not needed for public repositories
+        self.github_api = github.Github(login_or_token=None if github_token == "" else github_token)
 
-        self.enable_deltas_report = parse_boolean_input(boolean_input=enable_deltas_report)
-        # The enable-deltas-report input has a default value so it should always be either True or False
-        if self.enable_deltas_report is None:
-            print("::error::Invalid value for enable-deltas-report input")
-            sys.exit(1)
+        self.enable_deltas_report = parse_required_boolean_input(boolean_input=enable_deltas_report,
+                                                                 input_name="enable-deltas-report")
 
-        self.enable_warnings_report = parse_boolean_input(boolean_input=enable_warnings_report)
-        # The enable-deltas-report input has a default value so it should always be either True or False
-        if self.enable_warnings_report is None:
-            print("::error::Invalid value for enable-warnings-report input")
-            sys.exit(1)
+        self.enable_warnings_report = parse_required_boolean_input(boolean_input=enable_warnings_report,
+                                                                   input_name="enable-warnings-report")
 
+        self.concurrent_deltas = parse_required_boolean_input(boolean_input=concurrent_deltas,
+                                                              input_name="concurrent-deltas")
+
+        # Hash of the commit of the deltas base ref, once it has been fetched
+        self.deltas_base_commit = None
+        # Original contents of the workspace repository configuration while it is set up for partial fetches
+        self.workspace_git_config = None
+        # Paths of the files changed since the deltas base ref, relative to the workspace, once they are determined
+        self.deltas_changed_paths = None
         if self.enable_deltas_report:
             self.deltas_base_ref = self.get_deltas_base_ref()
         else:
@@ -163,6 +237,190 @@ class CompileSketches:
 
         self.sketches_report_path = pathlib.PurePath(sketches_report_path)
 
+        self.baseline_report_path = parse_optional_path_input(path_input=baseline_report_path)
+
+        self.result_store_path = parse_optional_path_input(path_input=result_store_path)
+        self.result_store_retention = parse_required_duration_input(duration_input=result_store_retention,
+                                                                    input_name="result-store-retention")
+        # The result store is connected once per run, when it is first used
+        self.result_store_connection = None
+        # Data of the sketches compiled in this run, which is added to the result store in a single transaction
+        self.result_store_rows = []
+
+        self.jobs = parse_jobs_input(jobs_input=jobs)
+        if self.jobs is None:
+            print("::error::Invalid value for jobs input")
+            sys.exit(1)
+
+        # Source paths of the installations done by install_from_path(), keyed by destination path
+        self.path_installations = {}
+
+        # Paths of the cloned repositories and extracted archives of dependencies, keyed by the value returned by
+        # get_fetch_key(). A dependency is only fetched once, even if multiple installations are made from it.
+        self.fetched_dependencies = {}
+
+        self.compilation_cache_path = parse_optional_path_input(path_input=compilation_cache_path)
+
+        self.compilation_cache_size = parse_size_input(size_input=compilation_cache_size)
+        if self.compilation_cache_size is None:
+            print("::error::Invalid value for compilation-cache-size input")
+            sys.exit(1)
+
+        self.reuse_core_build_cache = parse_required_boolean_input(boolean_input=reuse_core_build_cache,
+                                                                   input_name="reuse-core-build-cache")
+
+        self.download_cache_path = parse_optional_path_input(path_input=download_cache_path)
+
+        self.repository_cache_path = parse_optional_path_input(path_input=repository_cache_path)
+
+        # URLs of the repositories which have been mirrored to the repository cache during this run, and the locks
+        # which prevent concurrent updates of a mirror
+        self.updated_repository_mirrors = set()
+        self.repository_mirror_locks = {}
+
+        self.ranged_download_threshold = parse_size_input(size_input=ranged_download_threshold)
+        if self.ranged_download_threshold is None:
+            print("::error::Invalid value for ranged-download-threshold input")
+            sys.exit(1)
+
+        self.platform_snapshot_path = parse_optional_path_input(path_input=platform_snapshot_path)
+
+        self.board_manager_index_ttl = parse_required_duration_input(duration_input=board_manager_index_ttl,
+                                                                     input_name="board-manager-index-ttl")
+
+        self.lockfile_path = parse_optional_path_input(path_input=lockfile_path)
+        # Contents of the lockfile, or None if there is no lockfile to install from
+        self.lockfile = self.read_lockfile()
+        if self.lockfile is not None and self.lockfile_cli_version_key in self.lockfile:
+            self.cli_version = self.lockfile[self.lockfile_cli_version_key]
+
+        # Resolutions of the dependencies, recorded for the lockfile
+        self.arduino_cli_version = None
+        self.platform_dependencies = self.Dependencies()
+        self.library_dependencies = self.Dependencies()
+        self.library_manager_releases = None
+        # SHA-256 hashes of the downloads, keyed by URL
+        self.download_hashes = {}
+        # Headers of the HEAD requests for the downloads, keyed by URL and request headers
+        self.download_head_headers = {}
+        # Hashes of the commits of the repository dependencies, keyed by URL and Git ref
+        self.repository_commits = {}
+        # Refs advertised by the remote repositories, and the locks which prevent concurrent lookups, keyed by URL
+        self.remote_refs = {}
+        self.remote_refs_locks = {}
+
+        # Warnings from the compilation of the core, keyed by build cache path and FQBN. A worker's build cache path is
+        # only used by one compilation at a time, so no lock is needed.
+        self.core_warnings = {}
+
+        # Fingerprints of the installed dependencies, keyed by the Arduino CLI user and data directory paths
+        self.dependencies_fingerprints = {}
+        self.dependencies_fingerprints_lock = threading.Lock()
+
+        # Versions of the platforms installed via Board Manager, keyed by platform ID. Built on first use by
+        # get_installed_platforms().
+        self.installed_platforms = None
+
+    def read_lockfile(self):
+        """Return the contents of the lockfile, or None if there is no lockfile."""
+        if self.lockfile_path is None or not self.lockfile_path.exists():
+            return None
+
+        with open(file=self.lockfile_path, encoding="utf-8") as lockfile_file:
+            try:
+                lockfile = yaml.load(stream=lockfile_file, Loader=yaml.SafeLoader)
+            except yaml.YAMLError:
+                lockfile = None
+
+        if not isinstance(lockfile, dict) or not all(
+            isinstance(lockfile.get(key, []), list)
+            for key in [self.lockfile_platforms_key,
+                        self.lockfile_libraries_key,
+                        self.lockfile_library_manager_releases_key]
+        ):
+            print("::error::Invalid lockfile:", self.lockfile_path)
+            sys.exit(1)
+
+        return lockfile
+
+    def write_lockfile(self):
+        """Write the lockfile with the dependencies as they were installed."""
+        lockfile = {}
+        if self.arduino_cli_version is not None:
+            lockfile[self.lockfile_cli_version_key] = self.arduino_cli_version
+        lockfile[self.lockfile_platforms_key] = self.get_locked_dependency_list(
+            dependency_list=self.platform_dependencies,
+            lock_manager_dependency=self.get_locked_board_manager_platform
+        )
+        lockfile[self.lockfile_libraries_key] = self.get_locked_dependency_list(
+            dependency_list=self.library_dependencies,
+            # The Library Manager libraries are locked by the list of releases they were resolved to
+            lock_manager_dependency=dict
+        )
+        if self.library_manager_releases is not None:
+            lockfile[self.lockfile_library_manager_releases_key] = [
+                {key: library_release[key] for key in ["name", "version", "url", "checksum"]}
+                for library_release in self.library_manager_releases
+            ]
+        elif len(self.library_dependencies.manager) > 0:
+            print("::warning::The Library Manager libraries were installed by Arduino CLI, so their versions are not",
+                  "locked")
+
+        self.verbose_print("Writing lockfile:", self.lockfile_path)
+        self.lockfile_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(file=self.lockfile_path, mode="w", encoding="utf-8") as lockfile_file:
+            yaml.dump(data=lockfile, stream=lockfile_file, default_flow_style=False, sort_keys=False)
+
+    def get_locked_dependency_list(self, dependency_list, lock_manager_dependency):
+        """Return the list of dependency definitions which install the dependencies as they were installed.
+
+        Keyword arguments:
+        dependency_list -- Dependencies object containing lists of dictionaries defining the installed dependencies of
+                           each source type
+        lock_manager_dependency -- function which returns the locked definition of a manager dependency
+        """
+        locked_dependency_list = [lock_manager_dependency(dependency) for dependency in dependency_list.manager]
+
+        for dependency in dependency_list.path:
+            locked_dependency = dict(dependency)
+            # Absolute paths of the workspace are not valid on other machines
+            locked_dependency[self.dependency_source_path_key] = str(
+                path_relative_to_workspace(path=dependency[self.dependency_source_path_key])
+            )
+            locked_dependency_list.append(locked_dependency)
+
+        for dependency in dependency_list.repository:
+            locked_dependency = dict(dependency)
+            commit = self.repository_commits.get(
+                (dependency[self.dependency_source_url_key], self.get_repository_dependency_ref(dependency=dependency))
+            )
+            if commit is not None:
+                locked_dependency[self.dependency_version_key] = commit
+            locked_dependency_list.append(locked_dependency)
+
+        for dependency in dependency_list.download:
+            locked_dependency = dict(dependency)
+            if dependency[self.dependency_source_url_key] in self.download_hashes:
+                locked_dependency[self.dependency_checksum_key] = (
+                    "SHA-256:" + self.download_hashes[dependency[self.dependency_source_url_key]]
+                )
+            locked_dependency_list.append(locked_dependency)
+
+        return locked_dependency_list
+
+    def get_locked_board_manager_platform(self, platform):
+        """Return the definition of the Board Manager platform dependency with the installed version.
+
+        Keyword arguments:
+        platform -- dictionary defining the Board Manager platform dependency
+        """
+        locked_platform = dict(platform)
+        installed_version = self.get_installed_platforms().get(platform[self.dependency_name_key])
+        if installed_version is not None:
+            locked_platform[self.dependency_version_key] = installed_version
+
+        return locked_platform
+
     def get_deltas_base_ref(self):
         """Return the Git ref to make deltas comparisons against."""
         if os.environ["GITHUB_EVENT_NAME"] == "pull_request":
@@ -198,54 +456,185 @@ class CompileSketches:
         # Install the library dependencies
         self.install_libraries()
 
-        # Compile all sketches under the paths specified by the sketch-paths input
+        if self.lockfile_path is not None and self.lockfile is None:
+            self.write_lockfile()
+
+        # Compile all sketches under the paths specified by the sketch-paths input for each board
         all_compilations_successful = True
-        sketch_report_list = []
+        board_report_list = []
 
+        # A board listed more than once in the fqbn input is only compiled for once, in the order of its first listing
+        fqbn_list = list(dict.fromkeys(board["fqbn"] for board in self.boards))
         sketch_list = self.find_sketches()
-        for sketch in sketch_list:
+        compilation_list = [{"sketch_path": sketch, "fqbn": fqbn} for fqbn in fqbn_list for sketch in sketch_list]
+        previous_sketch_report_list = self.get_previous_sketch_report_list(compilation_list=compilation_list)
+        if self.enable_deltas_report and self.concurrent_deltas and self.jobs > 1:
+            compilation_result_list, previous_compilation_result_list = (
+                self.compile_sketch_list_with_deltas_base(compilation_list=compilation_list,
+                                                          previous_sketch_report_list=previous_sketch_report_list)
+            )
+        else:
             # It's necessary to clear the cache between each compilation to get a true compiler warning count, otherwise
-            # only the first sketch compilation's warning count would reflect warnings from cached code
-            compilation_result = self.compile_sketch(sketch_path=sketch, clean_build_cache=self.enable_warnings_report)
-            if not compilation_result.success:
-                all_compilations_successful = False
+            # only the first sketch compilation's warning count would reflect warnings from cached code. Alternatively,
+            # the warnings from the cached core can be replayed.
+            compilation_result_list = self.compile_sketch_list(
+                compilation_list=compilation_list,
+                clean_build_cache=self.enable_warnings_report and not self.reuse_core_build_cache,
+                replay_core_warnings=self.enable_warnings_report and self.reuse_core_build_cache
+            )
+            previous_compilation_result_list = self.get_previous_compilation_result_list(
+                compilation_result_list=compilation_result_list,
+                previous_sketch_report_list=previous_sketch_report_list
+            )
+        for fqbn in fqbn_list:
+            sketch_report_list = []
+            for compilation_result, previous_compilation_result, previous_sketch_report in zip(
+                compilation_result_list,
+                previous_compilation_result_list,
+                previous_sketch_report_list
+            ):
+                if compilation_result.fqbn != fqbn:
+                    continue
 
-            # Store the size data for this sketch
-            sketch_report_list.append(self.get_sketch_report(compilation_result=compilation_result))
+                # The compilations may finish in any order, so the output is only printed once they are all complete
+                self.print_compilation_result(compilation_result=compilation_result)
+                if not compilation_result.success:
+                    all_compilations_successful = False
 
-        sketches_report = self.get_sketches_report(sketch_report_list=sketch_report_list)
+                # Store the size data for this sketch
+                sketch_report_list.append(
+                    self.get_sketch_report(compilation_result=compilation_result,
+                                           previous_compilation_result=previous_compilation_result,
+                                           previous_sketch_report=previous_sketch_report)
+                )
+
+            board_report_list.append(self.get_board_report(fqbn=fqbn, sketch_report_list=sketch_report_list))
+
+        sketches_report = self.get_sketches_report(board_report_list=board_report_list)
 
         self.create_sketches_report_file(sketches_report=sketches_report)
 
+        self.prune_compilation_cache()
+        self.save_result_store()
+        self.restore_workspace_git_config()
+
         if not all_compilations_successful:
             print("::error::One or more compilations failed")
             sys.exit(1)
 
     def install_arduino_cli(self):
-        """Install Arduino CLI."""
+        """Install Arduino CLI. Each version is stored in its own folder under the installation path, so a version
+        stored by a previous run is only activated, not downloaded again.
+        """
         self.verbose_print("Installing Arduino CLI version", self.cli_version)
-        arduino_cli_archive_download_url_prefix = "https://downloads.arduino.cc/arduino-cli/"
-        arduino_cli_archive_file_name = "arduino-cli_" + self.cli_version + "_Linux_64bit.tar.gz"
+        version = self.cli_version
+        if version == self.latest_release_indicator:
+            version = self.get_arduino_cli_latest_version()
 
-        self.install_from_download(
-            url=arduino_cli_archive_download_url_prefix + arduino_cli_archive_file_name,
-            # The Arduino CLI has no root folder, so just install the arduino-cli executable from the archive root
-            source_path="arduino-cli",
-            destination_parent_path=self.arduino_cli_installation_path,
-            force=False
-        )
+        if version is not None and self.get_arduino_cli_store_path(version=version).joinpath("arduino-cli").exists():
+            self.verbose_print("Using stored Arduino CLI version", version)
+        else:
+            version = self.store_arduino_cli()
+
+        self.activate_arduino_cli(version=version)
+        self.arduino_cli_version = version
 
         # Configure the location of the Arduino CLI user directory
         os.environ["ARDUINO_DIRECTORIES_USER"] = str(self.arduino_cli_user_directory_path)
         # Configure the location of the Arduino CLI data directory
         os.environ["ARDUINO_DIRECTORIES_DATA"] = str(self.arduino_cli_data_directory_path)
 
+    def get_arduino_cli_store_path(self, version):
+        """Return the path of the folder the Arduino CLI version is stored in.
+
+        Keyword arguments:
+        version -- version of the Arduino CLI
+        """
+        return self.arduino_cli_installation_path.joinpath("arduino-cli-" + version)
+
+    def get_arduino_cli_latest_version(self):
+        """Return the version "latest" was resolved to by a previous run, or None if it was not resolved within the
+        TTL.
+        """
+        latest_version_path = self.arduino_cli_installation_path.joinpath(self.arduino_cli_latest_version_file_name)
+        try:
+            if time.time() - latest_version_path.stat().st_mtime > self.arduino_cli_latest_version_ttl:
+                return None
+            with open(file=latest_version_path, encoding="utf-8") as latest_version_file:
+                return json.load(fp=latest_version_file)["version"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def store_arduino_cli(self):
+        """Download the Arduino CLI to the store and return its version."""
+        arduino_cli_archive_download_url_prefix = "https://downloads.arduino.cc/arduino-cli/"
+        arduino_cli_archive_file_name = "arduino-cli_" + self.cli_version + "_Linux_64bit.tar.gz"
+
+        # The Arduino CLI has no root folder, so just extract the arduino-cli executable from the archive root
+        archive_root_path = self.get_extracted_download(url=arduino_cli_archive_download_url_prefix
+                                                        + arduino_cli_archive_file_name,
+                                                        sparse_path="arduino-cli")
+        executable_path = archive_root_path.joinpath("arduino-cli")
+
+        version = self.cli_version
+        if version == self.latest_release_indicator:
+            version = self.get_arduino_cli_version(executable_path=executable_path)
+            self.arduino_cli_installation_path.mkdir(parents=True, exist_ok=True)
+            with open(file=self.arduino_cli_installation_path.joinpath(self.arduino_cli_latest_version_file_name),
+                      mode="w",
+                      encoding="utf-8") as latest_version_file:
+                json.dump(obj={"version": version}, fp=latest_version_file)
+
+        store_path = self.get_arduino_cli_store_path(version=version)
+        self.verbose_print("Storing Arduino CLI version", version, "at:", store_path)
+        store_path.mkdir(parents=True, exist_ok=True)
+        # Copy to a temporary file, then move it into place so that a partially copied executable is never used
+        temporary_executable_path = store_path.joinpath("arduino-cli.tmp")
+        shutil.copy2(src=executable_path, dst=temporary_executable_path)
+        os.replace(src=temporary_executable_path, dst=store_path.joinpath("arduino-cli"))
+
+        return version
+
+    def get_arduino_cli_version(self, executable_path):
+        """Return the version of the Arduino CLI executable.
+
+        Keyword arguments:
+        executable_path -- path of the Arduino CLI executable
+        """
+        version_output = self.run_command(command=[executable_path, "version"]).stdout
+        version_match = re.search(pattern=r"Version:\s*(\S+)", string=version_output)
+        if version_match is None:
+            print("::error::Unable to determine the version of Arduino CLI from its output:", version_output.strip())
+            sys.exit(1)
+
+        return version_match.group(1)
+
+    def activate_arduino_cli(self, version):
+        """Make the stored Arduino CLI version the one used by the action.
+
+        Keyword arguments:
+        version -- version of the Arduino CLI
+        """
+        executable_link_path = self.arduino_cli_installation_path.joinpath("arduino-cli")
+        temporary_link_path = self.arduino_cli_installation_path.joinpath("arduino-cli.tmp")
+        if temporary_link_path.is_symlink() or temporary_link_path.exists():
+            temporary_link_path.unlink()
+        # The link is relative so that it is still valid if the home folder is restored to a different path
+        temporary_link_path.symlink_to(
+            target=self.get_arduino_cli_store_path(version=version).relative_to(
+                self.arduino_cli_installation_path
+            ).joinpath("arduino-cli")
+        )
+        # Replace the link in a single step, replacing an executable installed by a previous version of the action
+        os.replace(src=temporary_link_path, dst=executable_link_path)
+
     def verbose_print(self, *print_arguments):
         """Print log output when in verbose mode"""
         if self.verbose:
             print(*print_arguments)
 
-    def install_from_download(self, url, source_path, destination_parent_path, destination_name=None, force=False):
+    def install_from_download(self, url, source_path, destination_parent_path, destination_name=None, force=False,
+                              checksum=None):
         """Download an archive, extract, and install.
 
         Keyword arguments:
@@ -255,72 +644,351 @@ class CompileSketches:
         destination_name -- folder name to use for the installation. Set to None to take the name from source_path.
                             (default None)
         force -- replace existing destination folder if present. (default False)
+        checksum -- expected checksum of the archive in the format "SHA-256:<hash>". Set to None to skip verification.
+                    (default None)
         """
         destination_parent_path = pathlib.Path(destination_parent_path)
 
-        # Create temporary folder with function duration for the download
-        with tempfile.TemporaryDirectory("-compilesketches-download_folder") as download_folder:
-            download_file_path = pathlib.PurePath(download_folder, url.rsplit(sep="/", maxsplit=1)[1])
-
-            # https://stackoverflow.com/a/38358646
-            with open(file=str(download_file_path), mode="wb") as out_file:
-                with contextlib.closing(thing=urllib.request.urlopen(url=url)) as file_pointer:
-                    block_size = 1024 * 8
-                    while True:
-                        block = file_pointer.read(block_size)
-                        if not block:
-                            break
-                        out_file.write(block)
+        installed_name = destination_name
+        if installed_name is None and get_sparse_path(source_path=source_path) is not None:
+            # The name of the archive's root folder is not needed
+            installed_name = pathlib.PurePath(source_path).name
+        if checksum is not None and installed_name is not None:
+            destination_path = destination_parent_path.joinpath(installed_name)
+            if self.is_installed(destination_path=destination_path,
+                                 receipt=get_download_receipt(
+                                     url=url,
+                                     source_path=source_path,
+                                     checksum="SHA-256:" + self.get_expected_download_hash(url=url, checksum=checksum)
+                                 )):
+                self.use_existing_installation(destination_path=destination_path)
+                return
+
+        archive_root_path = self.get_extracted_download(url=url,
+                                                        checksum=checksum,
+                                                        sparse_path=get_sparse_path(source_path=source_path))
+
+        absolute_source_path = pathlib.Path(archive_root_path, source_path).resolve()
+
+        if not absolute_source_path.exists():
+            print("::error::Archive source path:", source_path, "not found")
+            sys.exit(1)
+
+        file_hash = self.download_hashes.get(url)
+        self.install_from_path(source_path=absolute_source_path,
+                               destination_parent_path=destination_parent_path,
+                               destination_name=destination_name,
+                               force=force,
+                               receipt=get_download_receipt(url=url,
+                                                            source_path=source_path,
+                                                            checksum=None if file_hash is None
+                                                            else "SHA-256:" + file_hash))
+
+    def get_extracted_download(self, url, checksum=None, sparse_path=None):
+        """Download and extract the archive if that was not already done and return the path of its root folder.
 
+        Keyword arguments:
+        url -- URL to download the archive from
+        checksum -- expected checksum of the archive in the format "SHA-256:<hash>". Set to None to skip verification.
+                    (default None)
+        sparse_path -- path relative to the root folder of the archive to limit the extraction to, as returned by
+                       get_sparse_path(). Set to None to extract the whole archive. (default None)
+        """
+        fetch_key = ("download", url, checksum, sparse_path)
+        if fetch_key not in self.fetched_dependencies:
             # Create temporary folder with script run duration for the extraction
             extract_folder = tempfile.mkdtemp(dir=self.temporary_directory.name, prefix="install_from_download-")
 
-            # Extract archive
-            shutil.unpack_archive(filename=str(download_file_path), extract_dir=extract_folder)
+            archive_root_path = None
+            if self.download_cache_path is None and is_tar_archive_url(url=url):
+                try:
+                    archive_root_path = self.stream_extract_download(url=url,
+                                                                     checksum=checksum,
+                                                                     extract_path=pathlib.Path(extract_folder),
+                                                                     sparse_path=sparse_path)
+                except tarfile.TarError:
+                    # e.g., a hard link to a file outside the sparse path, which can't be extracted from the stream
+                    self.verbose_print("Unable to extract the archive while downloading it:", url)
+                    shutil.rmtree(path=extract_folder)
+                    pathlib.Path(extract_folder).mkdir()
+                    sparse_path = None
+
+            if archive_root_path is None:
+                # Create temporary folder with function duration for the download
+                with tempfile.TemporaryDirectory("-compilesketches-download_folder") as download_folder:
+                    download_file_path = self.download(url=url,
+                                                       download_folder_path=pathlib.Path(download_folder),
+                                                       checksum=checksum)
+
+                    archive_root_path = extract_archive(archive_path=download_file_path,
+                                                        extract_path=pathlib.Path(extract_folder),
+                                                        sparse_path=sparse_path)
+
+            self.fetched_dependencies[fetch_key] = archive_root_path
+
+        return self.fetched_dependencies[fetch_key]
+
+    def stream_extract_download(self, url, checksum, extract_path, sparse_path):
+        """Extract the tar archive while it is downloaded, without saving the archive, and return the path of its root
+        folder. Return None without extracting the archive if it is large enough to be downloaded in ranges instead.
+
+        Keyword arguments:
+        url -- URL to download the archive from
+        checksum -- expected checksum of the archive in the format "SHA-256:<hash>". Set to None to skip verification.
+        extract_path -- path to extract the archive to
+        sparse_path -- path relative to the root folder of the archive to limit the extraction to. Set to None to
+                       extract the whole archive.
+        """
+        expected_hash = self.get_expected_download_hash(url=url, checksum=checksum)
+
+        head_headers = self.get_download_head_headers(request=urllib.request.Request(url=url))
+        if head_headers is not None and self.get_ranged_download_size(headers=head_headers) is not None:
+            # Downloading a large archive over multiple connections is faster than a single stream
+            return None
+
+        with contextlib.closing(thing=urllib.request.urlopen(url=url)) as file_pointer:
+            hashing_reader = HashingReader(file_object=file_pointer)
+            with tarfile.open(fileobj=hashing_reader, mode="r|*") as archive:
+                archive_root_path = extract_tar_archive(archive=archive,
+                                                        extract_path=extract_path,
+                                                        sparse_path=sparse_path)
+            # The hash must cover any data after the end of the tar archive
+            hashing_reader.read_to_end()
+
+        file_hash = hashing_reader.hexdigest()
+        self.download_hashes[url] = file_hash
+        if expected_hash is not None and file_hash != expected_hash:
+            print("::error::Checksum mismatch for download URL:", url, "Expected:", expected_hash, "Actual:", file_hash)
+            sys.exit(1)
+
+        return archive_root_path
 
-            archive_root_path = get_archive_root_path(extract_folder)
+    def get_expected_download_hash(self, url, checksum):
+        """Return the SHA-256 hash from the checksum of the download, or None if no checksum was provided. Exit if the
+        checksum is not valid.
+
+        Keyword arguments:
+        url -- URL of the download
+        checksum -- expected checksum of the download in the format "SHA-256:<hash>". Set to None to skip verification.
+        """
+        if checksum is None:
+            return None
 
-            absolute_source_path = pathlib.Path(archive_root_path, source_path).resolve()
+        expected_hash = parse_checksum(checksum=checksum)
+        if expected_hash is None:
+            print("::error::Invalid checksum:", checksum, "for download URL:", url, "(the supported format is",
+                  "SHA-256:<hash>)")
+            sys.exit(1)
 
-            if not absolute_source_path.exists():
-                print("::error::Archive source path:", source_path, "not found")
-                sys.exit(1)
+        return expected_hash
 
-            self.install_from_path(source_path=absolute_source_path,
-                                   destination_parent_path=destination_parent_path,
-                                   destination_name=destination_name,
-                                   force=force)
+    def download(self, url, download_folder_path, checksum=None):
+        """Download the file and return its path. If the download cache is enabled, the file is stored in the cache and
+        only downloaded if the cached copy is missing or out of date.
+
+        Keyword arguments:
+        url -- URL to download the file from
+        download_folder_path -- folder to download the file to when the download cache is disabled
+        checksum -- expected checksum of the file in the format "SHA-256:<hash>". Set to None to skip verification.
+                    (default None)
+        """
+        expected_hash = self.get_expected_download_hash(url=url, checksum=checksum)
+
+        file_name = url.rsplit(sep="/", maxsplit=1)[1]
+        if self.download_cache_path is None:
+            download_file_path = download_folder_path.joinpath(file_name)
+            file_hash, _ = self.download_to_file(request=urllib.request.Request(url=url),
+                                                 file_path=download_file_path)
+        else:
+            cache_entry_path = pathlib.Path(self.download_cache_path, hashlib.sha256(url.encode()).hexdigest())
+            download_file_path = cache_entry_path.joinpath(file_name)
+            file_hash = self.download_to_cache(url=url,
+                                               cache_entry_path=cache_entry_path,
+                                               download_file_path=download_file_path)
+        self.download_hashes[url] = file_hash
+
+        if expected_hash is not None and file_hash != expected_hash:
+            if self.download_cache_path is not None:
+                # Don't keep the bad file around for the next run
+                shutil.rmtree(path=download_file_path.parent)
+            print("::error::Checksum mismatch for download URL:", url, "Expected:", expected_hash, "Actual:", file_hash)
+            sys.exit(1)
+
+        return download_file_path
+
+    def download_to_cache(self, url, cache_entry_path, download_file_path):
+        """Update the cached copy of the file if it is missing or the server reports it has changed and return the
+        SHA-256 hash of the cached file. The server is asked with a conditional request using the ETag and Last-Modified
+        headers of the cached copy.
+
+        Keyword arguments:
+        url -- URL to download the file from
+        cache_entry_path -- folder of the cache entry for the URL
+        download_file_path -- path of the cached file
+        """
+        metadata_path = cache_entry_path.joinpath("metadata.json")
+        request = urllib.request.Request(url=url)
+        if download_file_path.exists() and metadata_path.exists():
+            with open(file=metadata_path, encoding="utf-8") as metadata_file:
+                metadata = json.load(fp=metadata_file)
+            if metadata["etag"] is not None:
+                request.add_header(key="If-None-Match", val=metadata["etag"])
+            if metadata["last_modified"] is not None:
+                request.add_header(key="If-Modified-Since", val=metadata["last_modified"])
+
+        cache_entry_path.mkdir(parents=True, exist_ok=True)
+        # Download to a temporary file, then move it into place so that a partial download is never used
+        file_descriptor, temporary_file_path = tempfile.mkstemp(dir=cache_entry_path, suffix=".tmp")
+        os.close(file_descriptor)
+        try:
+            file_hash, headers = self.download_to_file(request=request, file_path=pathlib.Path(temporary_file_path))
+        except urllib.error.HTTPError as exception:
+            os.remove(temporary_file_path)
+            if exception.code != 304:
+                raise
+            self.verbose_print("Using cached download of:", url)
+            return get_file_hash(path=download_file_path)
+
+        os.replace(src=temporary_file_path, dst=download_file_path)
+        with open(file=metadata_path, mode="w", encoding="utf-8") as metadata_file:
+            json.dump(obj={"url": url, "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")},
+                      fp=metadata_file)
+
+        return file_hash
+
+    def download_to_file(self, request, file_path):
+        """Download the file and return a tuple of its SHA-256 hash and the response headers. If the file is larger
+        than the ranged download threshold and the server supports range requests, the file is split into one byte
+        range per job, which are downloaded concurrently.
+
+        Keyword arguments:
+        request -- urllib.request.Request object for the file
+        file_path -- path to write the file to
+        """
+        headers = self.get_download_head_headers(request=request)
+        file_size = None if headers is None else self.get_ranged_download_size(headers=headers)
+        if file_size is not None:
+            if download_ranges(url=request.full_url,
+                               validator=get_range_validator(headers=headers),
+                               file_path=file_path,
+                               file_size=file_size,
+                               range_count=self.jobs):
+                return get_file_hash(path=file_path), headers
+
+            self.verbose_print("Unable to download in ranges, falling back to a single stream:", request.full_url)
+
+        with contextlib.closing(thing=urllib.request.urlopen(url=request)) as file_pointer:
+            return write_response_to_file(response=file_pointer, file_path=file_path), file_pointer.headers
+
+    def get_download_head_headers(self, request):
+        """Return the headers of the response to a HEAD request for the download, or None if the download won't be made
+        in ranges or the server doesn't support HEAD requests. This determines the size of the file and whether the
+        server supports range requests without starting a transfer of the file.
+
+        Keyword arguments:
+        request -- urllib.request.Request object for the file
+        """
+        if self.ranged_download_threshold == 0 or self.jobs < 2:
+            return None
+
+        request_headers = dict(request.header_items())
+        head_key = (request.full_url, tuple(sorted(request_headers.items())))
+        if head_key not in self.download_head_headers:
+            head_request = urllib.request.Request(url=request.full_url, headers=request_headers, method="HEAD")
+            try:
+                with contextlib.closing(thing=urllib.request.urlopen(url=head_request)) as file_pointer:
+                    self.download_head_headers[head_key] = file_pointer.headers
+            except urllib.error.HTTPError as exception:
+                # A conditional request for a file which hasn't changed is handled the same as for the download request
+                if exception.code == 304:
+                    raise
+                self.download_head_headers[head_key] = None
+
+        return self.download_head_headers[head_key]
+
+    def get_ranged_download_size(self, headers):
+        """Return the size of the download if it should be downloaded in ranges, otherwise None.
+
+        Keyword arguments:
+        headers -- headers of the response to the download request
+        """
+        if self.ranged_download_threshold == 0 or self.jobs < 2:
+            return None
+
+        if headers.get("Accept-Ranges", "").strip().lower() != "bytes":
+            return None
+
+        # Ranges of an encoded response are ranges of the encoded data, which can't be validated by If-Range
+        if headers.get("Content-Encoding", "identity").strip().lower() != "identity":
+            return None
+
+        if get_range_validator(headers=headers) is None:
+            # Without a validator, there is no way to detect a change of the file between the range requests
+            return None
+
+        try:
+            file_size = int(headers.get("Content-Length", ""))
+        except ValueError:
+            return None
+
+        if file_size <= self.ranged_download_threshold * 1024 * 1024:
+            return None
+
+        return file_size
 
     def install_platforms(self):
         """Install Arduino boards platforms."""
         platform_list = self.Dependencies()
-        if self.platforms == "":
-            # When no platforms input is provided, automatically determine the board's platform dependency from the FQBN
-            platform_list.manager.append(self.get_fqbn_platform_dependency())
+        if self.lockfile is not None and self.lockfile_platforms_key in self.lockfile:
+            platform_list = self.sort_dependency_list(self.lockfile[self.lockfile_platforms_key])
+        elif self.platforms == "":
+            # When no platforms input is provided, automatically determine the boards' platform dependencies from the
+            # FQBNs
+            for board in self.boards:
+                fqbn_platform_dependency = self.get_fqbn_platform_dependency(board=board)
+                # Multiple boards of the same platform only require a single installation
+                if not any(
+                    platform[self.dependency_name_key] == fqbn_platform_dependency[self.dependency_name_key]
+                    for platform in platform_list.manager
+                ):
+                    platform_list.manager.append(fqbn_platform_dependency)
         else:
             platform_list = self.sort_dependency_list(yaml.load(stream=self.platforms, Loader=yaml.SafeLoader))
+        self.platform_dependencies = platform_list
+
+        # The Board Manager installation is always done before the installations from other sources so that the
+        # override system will work. The installation path of the platforms from other sources depends on the installed
+        # platforms, so they are installed one at a time, in order. Only the clones and downloads run concurrently.
+        self.run_task_graph(
+            task_list=self.get_dependency_installation_task_list(
+                dependency_list=platform_list,
+                install_from_manager=lambda dependency_list: self.install_platforms_from_board_manager(
+                    platform_list=dependency_list
+                ),
+                installers={
+                    "path": lambda dependency_list: self.install_platforms_from_path(platform_list=dependency_list),
+                    "repository": lambda dependency_list: self.install_platforms_from_repository(
+                        platform_list=dependency_list
+                    ),
+                    "download": lambda dependency_list: self.install_platforms_from_download(
+                        platform_list=dependency_list
+                    )
+                },
+                get_destination_key=lambda dependency, source_type: None
+            )
+        )
 
-        if len(platform_list.manager) > 0:
-            # This should always be called before the functions to install platforms from other sources so that the
-            # override system will work
-            self.install_platforms_from_board_manager(platform_list=platform_list.manager)
-
-        if len(platform_list.path) > 0:
-            self.install_platforms_from_path(platform_list=platform_list.path)
-
-        if len(platform_list.repository) > 0:
-            self.install_platforms_from_repository(platform_list=platform_list.repository)
-
-        if len(platform_list.download) > 0:
-            self.install_platforms_from_download(platform_list=platform_list.download)
+    def get_fqbn_platform_dependency(self, board):
+        """Return the platform dependency definition automatically generated from the FQBN.
 
-    def get_fqbn_platform_dependency(self):
-        """Return the platform dependency definition automatically generated from the FQBN."""
+        Keyword arguments:
+        board -- dictionary defining the board, in the format returned by parse_fqbn_arg_input()
+        """
         # Extract the platform name from the FQBN (e.g., arduino:avr:uno => arduino:avr)
-        fqbn_component_list = self.fqbn.split(sep=":")
+        fqbn_component_list = board["fqbn"].split(sep=":")
         fqbn_platform_dependency = {self.dependency_name_key: fqbn_component_list[0] + ":" + fqbn_component_list[1]}
-        if self.additional_url is not None:
-            fqbn_platform_dependency[self.dependency_source_url_key] = self.additional_url
+        if board["additional_url"] is not None:
+            fqbn_platform_dependency[self.dependency_source_url_key] = board["additional_url"]
 
         return fqbn_platform_dependency
 
@@ -373,28 +1041,193 @@ class CompileSketches:
         Keyword arguments:
         platform_list -- list of dictionaries defining the Board Manager platform dependencies
         """
+        snapshot_path = self.get_platform_snapshot_path(platform_list=platform_list)
+        if snapshot_path is not None and snapshot_path.exists():
+            self.verbose_print("Restoring Board Manager platforms from snapshot:", snapshot_path)
+            copy_arduino_data_directory(source_path=snapshot_path,
+                                        destination_path=self.arduino_cli_data_directory_path)
+            # The index is rebuilt on next use to include the restored platforms
+            self.installed_platforms = None
+            return
+
+        pending_platform_list = []
+        for platform in platform_list:
+            if self.is_board_manager_platform_installed(platform=platform):
+                self.verbose_print("Platform", self.get_manager_dependency_name(platform), "is already installed")
+            else:
+                pending_platform_list.append(platform)
+
+        if len(pending_platform_list) > 0:
+            # Download the platform indexes for all the platforms at once
+            self.update_board_manager_index(
+                additional_urls=list(dict.fromkeys(platform[self.dependency_source_url_key]
+                                                   for platform in pending_platform_list
+                                                   if self.dependency_source_url_key in platform))
+            )
+
         # Although Arduino CLI supports doing this all in one command, it may assist troubleshooting to install one
         # platform at a time, and most users will only do a single Board Manager platform installation anyway
-        for platform in platform_list:
-            core_update_index_command = ["core", "update-index"]
+        for platform in pending_platform_list:
             core_install_command = ["core", "install"]
 
-            # Append additional Boards Manager URLs to the commands, if required
+            # Append additional Boards Manager URLs to the command, if required
             if self.dependency_source_url_key in platform:
-                additional_urls_option = ["--additional-urls", platform[self.dependency_source_url_key]]
-                core_update_index_command.extend(additional_urls_option)
-                core_install_command.extend(additional_urls_option)
+                core_install_command.extend(["--additional-urls", platform[self.dependency_source_url_key]])
 
             core_install_command.append(self.get_manager_dependency_name(platform))
 
-            # Download the platform index for the platform
-            self.run_arduino_cli_command(command=core_update_index_command,
-                                         enable_output=self.get_run_command_output_level())
-
             # Install the platform
             self.run_arduino_cli_command(command=core_install_command,
                                          enable_output=self.get_run_command_output_level())
 
+            if self.installed_platforms is not None:
+                self.index_installed_platform(
+                    architecture_path=self.board_manager_platforms_path.joinpath(
+                        platform[self.dependency_name_key].split(sep=":")[0],
+                        "hardware",
+                        platform[self.dependency_name_key].rsplit(sep=":", maxsplit=1)[1]
+                    )
+                )
+
+        if snapshot_path is not None:
+            self.save_platform_snapshot(snapshot_path=snapshot_path)
+
+    def is_board_manager_platform_installed(self, platform):
+        """Return whether the pinned version of the platform is already installed via Board Manager, so it doesn't need
+        to be installed again.
+
+        Keyword arguments:
+        platform -- dictionary defining the Board Manager platform dependency
+        """
+        version = platform.get(self.dependency_version_key, self.latest_release_indicator)
+        if (
+            version == self.latest_release_indicator
+            or self.get_installed_platforms().get(platform[self.dependency_name_key]) != version
+        ):
+            return False
+
+        # The index also includes releases overwritten by installations from other sources, which lack the
+        # installed.json metadata file Board Manager saves
+        return self.board_manager_platforms_path.joinpath(
+            platform[self.dependency_name_key].split(sep=":")[0],
+            "hardware",
+            platform[self.dependency_name_key].rsplit(sep=":", maxsplit=1)[1],
+            version,
+            "installed.json"
+        ).is_file()
+
+    def update_board_manager_index(self, additional_urls):
+        """Update the Board Manager index files of Arduino's package index and the additional Board Manager URLs with a
+        single `core update-index` command. The update is skipped if each index file was updated within the TTL, or the
+        server reports that it hasn't changed since it was updated.
+
+        Keyword arguments:
+        additional_urls -- list of the additional Board Manager URLs
+        """
+        index_record = self.read_board_manager_index_record()
+        # Validators of the current versions of the index files which are out of date, keyed by URL
+        outdated_index_validators = {}
+        for url in [self.board_manager_index_url] + additional_urls:
+            url_record = index_record.get(url)
+            if not self.arduino_cli_data_directory_path.joinpath(get_board_manager_index_file_name(url=url)).exists():
+                url_record = None
+            if url_record is not None and time.time() - url_record["time"] < self.board_manager_index_ttl * 60:
+                continue
+
+            try:
+                validators = get_url_validators(url=url,
+                                                validators=None if url_record is None else url_record["validators"])
+            except (OSError, http.client.HTTPException):
+                validators = {}
+            if validators is None:
+                # The index file is unchanged since it was updated
+                url_record["time"] = time.time()
+            else:
+                outdated_index_validators[url] = validators
+
+        if len(outdated_index_validators) > 0:
+            core_update_index_command = ["core", "update-index"]
+            if len(additional_urls) > 0:
+                core_update_index_command.extend(["--additional-urls", ",".join(additional_urls)])
+            self.run_arduino_cli_command(command=core_update_index_command,
+                                         enable_output=self.get_run_command_output_level())
+
+            for url, validators in outdated_index_validators.items():
+                index_record[url] = {"time": time.time(), "validators": validators}
+        else:
+            self.verbose_print("Board Manager index is up to date")
+
+        self.arduino_cli_data_directory_path.mkdir(parents=True, exist_ok=True)
+        with open(file=self.arduino_cli_data_directory_path.joinpath(self.board_manager_index_record_file_name),
+                  mode="w",
+                  encoding="utf-8") as index_record_file:
+            json.dump(obj=index_record, fp=index_record_file)
+
+    def read_board_manager_index_record(self):
+        """Return a dictionary of the times the Board Manager index files were updated and the validators of the
+        updated versions, keyed by URL.
+        """
+        try:
+            with open(file=self.arduino_cli_data_directory_path.joinpath(self.board_manager_index_record_file_name),
+                      encoding="utf-8") as index_record_file:
+                index_record = json.load(fp=index_record_file)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(index_record, dict):
+            return {}
+
+        return index_record
+
+    def get_platform_snapshot_path(self, platform_list):
+        """Return the path of the snapshot of the Arduino CLI data directory with the platforms installed, or None if
+        snapshots are disabled or not possible for the platforms.
+
+        Keyword arguments:
+        platform_list -- list of dictionaries defining the Board Manager platform dependencies
+        """
+        if self.platform_snapshot_path is None or len(platform_list) == 0:
+            return None
+
+        # The version install_arduino_cli() activated, since the cli-version input might be "latest"
+        snapshot_key_data = {"cli_version": self.arduino_cli_version, "platforms": []}
+        for platform in platform_list:
+            version = platform.get(self.dependency_version_key, self.latest_release_indicator)
+            if version == self.latest_release_indicator:
+                # The installed version of the platform would depend on when the snapshot was made
+                self.verbose_print("Not using a platform snapshot because no version is specified for platform:",
+                                   platform[self.dependency_name_key])
+                return None
+
+            snapshot_key_data["platforms"].append(
+                {
+                    key: platform.get(key)
+                    for key in [self.dependency_name_key, self.dependency_version_key, self.dependency_source_url_key]
+                }
+            )
+
+        snapshot_key = hashlib.sha256(json.dumps(obj=snapshot_key_data, sort_keys=True).encode()).hexdigest()
+
+        return self.platform_snapshot_path.joinpath(snapshot_key)
+
+    def save_platform_snapshot(self, snapshot_path):
+        """Save a snapshot of the Arduino CLI data directory.
+
+        Keyword arguments:
+        snapshot_path -- path to save the snapshot to
+        """
+        self.verbose_print("Saving Board Manager platforms snapshot:", snapshot_path)
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        # Copy to a temporary folder, then move it into place so that a partial snapshot is never used
+        temporary_snapshot_path = pathlib.Path(tempfile.mkdtemp(dir=snapshot_path.parent, suffix=".tmp"))
+        copy_arduino_data_directory(source_path=self.arduino_cli_data_directory_path,
+                                    destination_path=temporary_snapshot_path)
+        try:
+            temporary_snapshot_path.rename(snapshot_path)
+        except OSError:
+            # The snapshot was saved by a concurrent run
+            shutil.rmtree(path=temporary_snapshot_path)
+
     def get_manager_dependency_name(self, dependency):
         """Return the appropriate name value for a manager dependency. This allows the NAME@VERSION syntax to be used
         with the special "latest" ref for the sake of consistency (though the documented approach is to use the version
@@ -420,7 +1253,8 @@ class CompileSketches:
 
         return enable_stdout
 
-    def run_arduino_cli_command(self, command, enable_output=RunCommandOutput.ON_FAILURE, exit_on_failure=True):
+    def run_arduino_cli_command(self, command, enable_output=RunCommandOutput.ON_FAILURE, exit_on_failure=True,
+                                environment=None):
         """Run the specified Arduino CLI command and return the object returned by subprocess.run().
 
         Keyword arguments:
@@ -429,6 +1263,8 @@ class CompileSketches:
                          (default RunCommandOutput.ON_FAILURE)
         exit_on_failure -- whether to immediately exit if the Arduino CLI returns a non-zero status
                            (default True)
+        environment -- environment variables for the command. Set to None to use the environment of the script.
+                       (default None)
         """
         debug_output_log_level = "warn"
         full_command = [self.arduino_cli_installation_path.joinpath("arduino-cli")]
@@ -437,11 +1273,12 @@ class CompileSketches:
             full_command.extend(["--log-level", debug_output_log_level, "--verbose"])
         arduino_cli_output = self.run_command(command=full_command,
                                               enable_output=enable_output,
-                                              exit_on_failure=exit_on_failure)
+                                              exit_on_failure=exit_on_failure,
+                                              environment=environment)
 
         return arduino_cli_output
 
-    def run_command(self, command, enable_output=RunCommandOutput.ON_FAILURE, exit_on_failure=True):
+    def run_command(self, command, enable_output=RunCommandOutput.ON_FAILURE, exit_on_failure=True, environment=None):
         """Run a command and return the subprocess.CompletedProcess instance (stdout attribute contains combined stdout
         and stderr).
 
@@ -451,8 +1288,11 @@ class CompileSketches:
                          always printed on failure. (default RunCommandOutput.ON_FAILURE)
                          (RunCommandOutput.NONE, RunCommandOutput.ON_FAILURE, RunCommandOutput.ALWAYS)
         exit_on_failure -- whether to exit the script if the command returns a non-zero exit status (default True)
+        environment -- environment variables for the command. Set to None to use the environment of the script.
+                       (default None)
         """
-        command_data = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        command_data = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                      env=environment)
 
         # Print output if appropriate
         if (enable_output == self.RunCommandOutput.ALWAYS
@@ -519,29 +1359,56 @@ class CompileSketches:
         # Default to installing to the sketchbook
         platform_installation_path.path = self.user_platforms_path.joinpath(platform_vendor, platform_architecture)
 
-        # I have no clue why this is needed, but arduino-cli core list fails if this isn't done first. The 3rd party
-        # platforms are still shown in the list even if their index URLs are not specified to the command via the
-        # --additional-urls option
-        self.run_arduino_cli_command(command=["core", "update-index"])
-        # Use Arduino CLI to get the list of installed platforms
-        command_data = self.run_arduino_cli_command(command=["core", "list", "--format", "json"])
-        installed_platform_list = json.loads(command_data.stdout)
-        for installed_platform in installed_platform_list:
-            if installed_platform["ID"] == platform[self.dependency_name_key]:
-                # The platform has been installed via Board Manager, so do an overwrite
-                platform_installation_path.path = (
-                    self.board_manager_platforms_path.joinpath(platform_vendor,
-                                                               "hardware",
-                                                               platform_architecture,
-                                                               installed_platform["Installed"])
-                )
-                platform_installation_path.is_overwrite = True
-
-                break
+        installed_platforms = self.get_installed_platforms()
+        if platform[self.dependency_name_key] in installed_platforms:
+            # The platform has been installed via Board Manager, so do an overwrite
+            platform_installation_path.path = (
+                self.board_manager_platforms_path.joinpath(platform_vendor,
+                                                           "hardware",
+                                                           platform_architecture,
+                                                           installed_platforms[platform[self.dependency_name_key]])
+            )
+            platform_installation_path.is_overwrite = True
 
         return platform_installation_path
 
-    def install_from_path(self, source_path, destination_parent_path, destination_name=None, force=False):
+    def get_installed_platforms(self):
+        """Return a dictionary of the versions of the platforms installed via Board Manager, keyed by platform ID.
+
+        The dictionary is built from the Board Manager packages folder on the first call and is updated as platforms are
+        installed. The installation of a platform from another source over a Board Manager installation removes the
+        installed.json metadata file, so the dictionary is not rebuilt after that.
+        """
+        if self.installed_platforms is None:
+            self.installed_platforms = {}
+            for architecture_path in self.board_manager_platforms_path.glob("*/hardware/*"):
+                self.index_installed_platform(architecture_path=architecture_path)
+
+        return self.installed_platforms
+
+    def index_installed_platform(self, architecture_path):
+        """Add the Board Manager installation of the platform to the dictionary of installed platforms.
+
+        Keyword arguments:
+        architecture_path -- path of the architecture folder of the platform under the Board Manager packages folder
+                             (e.g., packages/arduino/hardware/avr)
+        """
+        if not architecture_path.is_dir():
+            return
+
+        # Board Manager saves the platform's index data to installed.json in the platform release folder
+        installed_version_list = [
+            release_path.name
+            for release_path in architecture_path.iterdir()
+            if release_path.joinpath("installed.json").is_file() or release_path.joinpath("platform.txt").is_file()
+        ]
+        if len(installed_version_list) > 0:
+            platform_id = architecture_path.parent.parent.name + ":" + architecture_path.name
+            self.installed_platforms[platform_id] = max(installed_version_list,
+                                                        key=lambda version: get_version_key(version=version))
+
+    def install_from_path(self, source_path, destination_parent_path, destination_name=None, force=False,
+                          receipt=None):
         """Create a symlink to the source path in the destination path.
 
         Keyword arguments:
@@ -550,25 +1417,97 @@ class CompileSketches:
         destination_name -- folder or filename name to use for the installation. Set to None to take the name from
                             source_path. (default None)
         force -- replace existing destination if present. (default False)
+        receipt -- dictionary identifying the source of the installation. If provided, the source is copied instead of
+                   linked, so that the installation outlives the temporary clone or download it is installed from, and
+                   the receipt is saved with the installation for is_installed(). (default None)
         """
         if destination_name is None:
             destination_name = source_path.name
 
         destination_path = destination_parent_path.joinpath(destination_name)
 
+        if (
+            receipt is None
+            and destination_path.is_symlink()
+            and pathlib.Path(os.readlink(destination_path)) == source_path
+        ):
+            # Already installed
+            self.path_installations[destination_path] = source_path
+            return
+
         if destination_path.exists():
-            if force:
+            # An installation with a receipt was made by a previous run, so it is replaced the same as a link would be
+            if force or destination_path.joinpath(self.installation_receipt_file_name).is_file():
                 # Clear existing folder
                 self.verbose_print("Overwriting installation at:", destination_path)
-                shutil.rmtree(path=destination_path)
+                if destination_path.is_symlink() or not destination_path.is_dir():
+                    destination_path.unlink()
+                else:
+                    shutil.rmtree(path=destination_path)
             else:
                 print("::error::Installation already exists:", destination_path)
                 sys.exit(1)
+        elif destination_path.is_symlink():
+            # A link to the source of an installation by a previous run, which no longer exists
+            destination_path.unlink()
 
         # Create the parent path if it doesn't already exist
         destination_parent_path.mkdir(parents=True, exist_ok=True)
 
-        destination_path.symlink_to(target=source_path, target_is_directory=source_path.is_dir())
+        if receipt is None:
+            destination_path.symlink_to(target=source_path, target_is_directory=source_path.is_dir())
+        else:
+            copy_installation(source_path=source_path, destination_path=destination_path)
+            if destination_path.is_dir():
+                # The receipt is saved last, so that an incomplete installation is never used
+                with open(file=destination_path.joinpath(self.installation_receipt_file_name),
+                          mode="w",
+                          encoding="utf-8") as receipt_file:
+                    json.dump(obj=dict(receipt, contents=get_path_hash(path=destination_path)), fp=receipt_file)
+        self.path_installations[destination_path] = source_path
+
+    def is_installed(self, destination_path, receipt):
+        """Return whether the destination path holds an installation made by install_from_path() from the source
+        identified by the receipt. The contents of the installation must also be unchanged since it was made.
+
+        Keyword arguments:
+        destination_path -- path of the installation
+        receipt -- dictionary identifying the source of the installation
+        """
+        if destination_path.is_symlink() or not destination_path.is_dir():
+            return False
+
+        try:
+            with open(file=destination_path.joinpath(self.installation_receipt_file_name),
+                      encoding="utf-8") as receipt_file:
+                installation_receipt = json.load(fp=receipt_file)
+        except (OSError, ValueError):
+            return False
+
+        if not isinstance(installation_receipt, dict) or "contents" not in installation_receipt:
+            return False
+        recorded_contents = installation_receipt.pop("contents")
+        # The contents are only hashed if the installation is from the same source
+        return installation_receipt == receipt and recorded_contents == get_path_hash(path=destination_path)
+
+    def has_installation_receipt(self, destination_path):
+        """Return whether the destination path holds an installation with a receipt, made by install_from_path() in
+        this or a previous run. Only such an installation can be reused, so there is no need to look up its source
+        otherwise.
+
+        Keyword arguments:
+        destination_path -- path of the installation
+        """
+        return destination_path.joinpath(self.installation_receipt_file_name).is_file()
+
+    def use_existing_installation(self, destination_path):
+        """Use the installation made by a previous run in place of installing the dependency again.
+
+        Keyword arguments:
+        destination_path -- path of the installation
+        """
+        self.verbose_print("Already installed at:", destination_path)
+        self.path_installations[destination_path] = destination_path
 
     def install_platforms_from_repository(self, platform_list):
         """Install libraries by cloning Git repositories
@@ -593,7 +1532,8 @@ class CompileSketches:
                                          source_path=source_path,
                                          destination_parent_path=destination_path.path.parent,
                                          destination_name=destination_path.path.name,
-                                         force=destination_path.is_overwrite)
+                                         force=destination_path.is_overwrite,
+                                         submodules=self.get_repository_dependency_submodules(dependency=platform))
 
     def get_repository_dependency_ref(self, dependency):
         """Return the appropriate git ref value for a repository dependency
@@ -608,13 +1548,34 @@ class CompileSketches:
 
         return git_ref
 
+    def get_repository_dependency_submodules(self, dependency):
+        """Return the paths of the submodules to update for a repository dependency as a tuple, or None to update all
+        submodules.
+
+        Keyword arguments:
+        dependency -- dictionary defining the repository dependency
+        """
+        submodules = dependency.get(self.dependency_submodules_key, True)
+        if submodules is True:
+            return None
+        if submodules is False:
+            return ()
+        if isinstance(submodules, list) and all(isinstance(submodule, str) for submodule in submodules):
+            return tuple(submodules)
+
+        print("::error::Invalid", self.dependency_submodules_key, "value:", submodules, "for repository:",
+              dependency[self.dependency_source_url_key], "(the supported values are true, false, or a list of",
+              "submodule paths)")
+        sys.exit(1)
+
     def install_from_repository(self,
                                 url,
                                 git_ref,
                                 source_path,
                                 destination_parent_path,
                                 destination_name=None,
-                                force=False):
+                                force=False,
+                                submodules=None):
         """Install by cloning a repository
 
         Keyword arguments:
@@ -625,34 +1586,169 @@ class CompileSketches:
         destination_name -- folder name to use for the installation. Set to None to use the repository name.
                             (default None)
         force -- replace existing destination folder if present. (default False)
+        submodules -- tuple of the paths of the submodules to update. Set to None to update all submodules.
+                      (default None)
         """
         if destination_name is None and source_path.rstrip("/") == ".":
             # Use the repository name
             destination_name = url.rstrip("/").rsplit(sep="/", maxsplit=1)[1].rsplit(sep=".", maxsplit=1)[0]
 
-        # Clone to a temporary folder with script run duration to allow installing from subfolders of repos
-        clone_folder = tempfile.mkdtemp(dir=self.temporary_directory.name, prefix="install_from_repository-")
-        self.clone_repository(url=url, git_ref=git_ref, destination_path=clone_folder)
+        installed_name = pathlib.PurePath(source_path).name if destination_name is None else destination_name
+        destination_path = pathlib.Path(destination_parent_path, installed_name)
+        if installed_name not in ["", ".."] and self.has_installation_receipt(destination_path=destination_path):
+            commit = self.get_repository_commit(url=url, git_ref=git_ref)
+            if commit is not None and self.is_installed(destination_path=destination_path,
+                                                        receipt=get_repository_receipt(url=url,
+                                                                                       source_path=source_path,
+                                                                                       submodules=submodules,
+                                                                                       commit=commit)):
+                self.use_existing_installation(destination_path=destination_path)
+                return
+
+        clone_folder = self.get_repository_clone(url=url,
+                                                 git_ref=git_ref,
+                                                 sparse_path=get_sparse_path(source_path=source_path),
+                                                 submodules=submodules)
+        commit = git.Repo(path=clone_folder).head.commit.hexsha
+        self.repository_commits[(url, git_ref)] = commit
         # Install to the final location
         self.install_from_path(source_path=pathlib.Path(clone_folder, source_path),
                                destination_parent_path=destination_parent_path,
                                destination_name=destination_name,
-                               force=force)
+                               force=force,
+                               receipt=get_repository_receipt(url=url,
+                                                              source_path=source_path,
+                                                              submodules=submodules,
+                                                              commit=commit))
 
-    def clone_repository(self, url, git_ref, destination_path):
+    def get_repository_commit(self, url, git_ref):
+        """Return the hash of the commit the Git ref refers to in the remote repository, or None if it can't be
+        determined without cloning the repository.
+
+        Keyword arguments:
+        url -- URL of the repository
+        git_ref -- the Git ref (e.g., branch, tag, commit hash). Set to None for the default branch.
+        """
+        if (url, git_ref) not in self.repository_commits:
+            if re.fullmatch(pattern="[0-9a-f]{40}", string=str(git_ref)) is not None:
+                commit = git_ref
+            else:
+                try:
+                    remote_refs = self.get_repository_remote_refs(url=url)
+                except git.exc.GitCommandError:
+                    remote_refs = {}
+                commit = remote_refs.get(get_remote_ref(remote_refs=remote_refs,
+                                                        git_ref="HEAD" if git_ref is None else git_ref))
+            self.repository_commits[(url, git_ref)] = commit
+
+        return self.repository_commits[(url, git_ref)]
+
+    def get_repository_remote_refs(self, url):
+        """Return the refs advertised by the remote repository, in the format returned by get_remote_refs(). The refs of
+        each repository are only looked up once per run.
+
+        Keyword arguments:
+        url -- URL of the repository
+        """
+        with self.remote_refs_locks.setdefault(url, threading.Lock()):
+            if url not in self.remote_refs:
+                self.remote_refs[url] = get_remote_refs(url=url)
+
+        return self.remote_refs[url]
+
+    def get_repository_clone(self, url, git_ref, sparse_path=None, submodules=None):
+        """Clone the repository if that was not already done and return the path of the clone.
+
+        Keyword arguments:
+        url -- URL of the repository
+        git_ref -- Git ref to check out. Set to None to leave repository checked out at the tip of the default branch.
+        sparse_path -- path relative to the root of the repository to limit the checkout to, as returned by
+                       get_sparse_path(). Set to None to check out the whole repository. (default None)
+        submodules -- tuple of the paths of the submodules to update. Set to None to update all submodules.
+                      (default None)
+        """
+        fetch_key = ("repository", url, git_ref, sparse_path, submodules)
+        if fetch_key not in self.fetched_dependencies:
+            # Clone to a temporary folder with script run duration to allow installing from subfolders of repos
+            clone_folder = tempfile.mkdtemp(dir=self.temporary_directory.name, prefix="install_from_repository-")
+            if self.repository_cache_path is None:
+                self.clone_repository(url=url,
+                                      git_ref=git_ref,
+                                      destination_path=clone_folder,
+                                      sparse_path=sparse_path,
+                                      submodules=submodules)
+            else:
+                self.clone_repository(url=url,
+                                      git_ref=git_ref,
+                                      destination_path=clone_folder,
+                                      reference_path=self.get_repository_mirror(url=url),
+                                      submodules=submodules)
+            self.fetched_dependencies[fetch_key] = clone_folder
+
+        return self.fetched_dependencies[fetch_key]
+
+    def get_repository_mirror(self, url):
+        """Create or update the bare mirror of the repository in the repository cache and return its path. Each mirror
+        is only updated once per run.
+
+        Keyword arguments:
+        url -- URL of the repository
+        """
+        mirror_path = pathlib.Path(self.repository_cache_path, hashlib.sha256(url.encode()).hexdigest())
+        with self.repository_mirror_locks.setdefault(url, threading.Lock()):
+            if url not in self.updated_repository_mirrors:
+                if mirror_path.exists():
+                    try:
+                        mirror_repository = git.Repo(path=mirror_path)
+                    except git.exc.InvalidGitRepositoryError:
+                        # The cache entry is unusable (e.g., from an interrupted run), so replace it
+                        self.verbose_print("Replacing invalid repository cache entry for", url)
+                        shutil.rmtree(path=mirror_path)
+                    else:
+                        self.verbose_print("Updating cached mirror of repository:", url)
+                        # The mirror's refspec updates all refs, including tags, to match the remote
+                        mirror_repository.git.fetch("--prune")
+
+                if not mirror_path.exists():
+                    self.verbose_print("Creating cached mirror of repository:", url)
+                    git.Repo.clone_from(url=url, to_path=mirror_path, mirror=True)
+
+                self.updated_repository_mirrors.add(url)
+
+        return mirror_path
+
+    def clone_repository(self, url, git_ref, destination_path, reference_path=None, sparse_path=None, submodules=None):
         """Clone a Git repository to a specified location and check out the specified ref
 
         Keyword arguments:
         git_ref -- Git ref to check out. Set to None to leave repository checked out at the tip of the default branch.
         destination_path -- destination for the cloned repository. This is the full path of the repository, not the
                             parent path.
+        reference_path -- path of a local repository to borrow objects from, so that only the objects missing from it
+                          are fetched. Set to None to fetch all objects. (default None)
+        sparse_path -- path relative to the root of the repository to limit the checkout to. Only the file contents
+                       under this path are downloaded. Not used when reference_path is set. Set to None to check out the
+                       whole repository. (default None)
+        submodules -- tuple of the paths of the submodules to update. Set to None to update all submodules.
+                      (default None)
         """
+        if reference_path is None and (git_ref is not None or sparse_path is not None):
+            if self.clone_repository_ref(url=url,
+                                         git_ref="HEAD" if git_ref is None else git_ref,
+                                         destination_path=destination_path,
+                                         sparse_path=sparse_path,
+                                         submodules=submodules):
+                return
+
         if git_ref is None:
             # Shallow clone is only possible if using the tip of the branch
-            # Use `None` as value for `git clone` options with no argument
-            clone_arguments = {"depth": 1, "shallow-submodules": None, "recurse-submodules": True}
+            clone_arguments = {"depth": 1}
         else:
             clone_arguments = {}
+        if reference_path is not None:
+            # The objects are already available locally, so a shallow clone would only add work
+            clone_arguments.pop("depth", None)
+            clone_arguments["reference"] = str(reference_path)
         cloned_repository = git.Repo.clone_from(url=url, to_path=destination_path, **clone_arguments)
         if git_ref is not None:
             if git_ref == self.latest_release_indicator:
@@ -666,13 +1762,119 @@ class CompileSketches:
 
             # checkout ref
             cloned_repository.git.checkout(git_ref)
-            cloned_repository.git.submodule("update", "--init", "--recursive", "--recommend-shallow")
 
-    def install_platforms_from_download(self, platform_list):
-        """Install libraries by downloading them
+        self.update_submodules(repository=cloned_repository, submodules=submodules)
+
+    def update_submodules(self, repository, submodules=None, sparse_path=None):
+        """Initialize and update the submodules of the repository recursively, fetching up to the jobs input number of
+        submodules concurrently.
 
         Keyword arguments:
-        platform_list -- list of dictionaries defining the dependencies
+        repository -- git.Repo object of the repository
+        submodules -- tuple of the paths of the submodules to update. Set to None to update all submodules.
+                      (default None)
+        sparse_path -- path relative to the root of the repository the checkout is limited to. When all submodules are
+                       updated, only the submodules under this path are updated. (default None)
+        """
+        if submodules is None:
+            pathspec = [] if sparse_path is None else [sparse_path]
+        elif len(submodules) == 0:
+            return
+        else:
+            pathspec = list(submodules)
+
+        # The submodules are only shallow if recommended by the .gitmodules file, since the commit of a submodule might
+        # not be at the tip of its branch
+        repository.git.submodule("update", "--init", "--recursive", "--jobs", str(self.jobs), "--recommend-shallow",
+                                 "--", *pathspec)
+
+    def clone_repository_ref(self, url, git_ref, destination_path, sparse_path=None, submodules=None):
+        """Make a shallow clone of only the commit of the Git ref and return whether that was possible. The ref is
+        resolved from the refs advertised by the remote, so only refs (e.g., branches, tags) and full commit hashes can
+        be cloned this way.
+
+        Keyword arguments:
+        url -- URL of the repository
+        git_ref -- Git ref to check out
+        destination_path -- destination for the cloned repository. This is the full path of the repository, not the
+                            parent path.
+        sparse_path -- path relative to the root of the repository to limit the checkout to. Set to None to check out
+                       the whole repository. (default None)
+        submodules -- tuple of the paths of the submodules to update. Set to None to update all submodules.
+                      (default None)
+        """
+        if re.fullmatch(pattern="[0-9a-f]{40}", string=str(git_ref)) is not None:
+            # A full commit hash, such as from a lockfile, is fetched without looking up the remote refs
+            remote_ref = git_ref
+        else:
+            remote_refs = self.get_repository_remote_refs(url=url)
+            if git_ref == self.latest_release_indicator and get_remote_ref(remote_refs=remote_refs,
+                                                                           git_ref=git_ref) is None:
+                # There is no real ref named "latest", so use the latest tag
+                git_ref = self.get_latest_tag(url=url, remote_refs=remote_refs)
+                if git_ref is None:
+                    return False
+
+            remote_ref = get_remote_ref(remote_refs=remote_refs, git_ref=git_ref)
+            if remote_ref is None:
+                return False
+
+        cloned_repository = git.Repo.init(path=destination_path)
+        cloned_repository.create_remote(name="origin", url=url)
+        fetch_arguments = ["--depth", "1"]
+        if sparse_path is not None:
+            # Make a partial clone without any file contents. The contents of the files under the sparse path are
+            # fetched on demand by the checkout.
+            with cloned_repository.config_writer() as config_writer:
+                config_writer.set_value("core", "repositoryformatversion", 1)
+                config_writer.set_value("extensions", "partialClone", "origin")
+                config_writer.set_value('remote "origin"', "promisor", True)
+                config_writer.set_value('remote "origin"', "partialCloneFilter", "blob:none")
+                config_writer.set_value("core", "sparseCheckout", True)
+            sparse_checkout_file_path = pathlib.Path(cloned_repository.git_dir, "info", "sparse-checkout")
+            sparse_checkout_file_path.parent.mkdir(parents=True, exist_ok=True)
+            sparse_checkout_file_path.write_text("/" + sparse_path + "\n")
+            fetch_arguments.append("--filter=blob:none")
+
+        try:
+            cloned_repository.git.fetch(*fetch_arguments, "origin", remote_ref)
+        except git.exc.GitCommandError:
+            # The server doesn't allow fetching the commit by its hash
+            self.verbose_print("Unable to make a shallow clone of", url, "at", str(git_ref) + ", making a full clone")
+            shutil.rmtree(path=destination_path)
+            return False
+
+        cloned_repository.git.checkout("FETCH_HEAD")
+        self.update_submodules(repository=cloned_repository, submodules=submodules, sparse_path=sparse_path)
+
+        return True
+
+    def get_latest_tag(self, url, remote_refs):
+        """Return the name of the tag associated with the most recent commit, or None if the repository has no tags.
+
+        Keyword arguments:
+        url -- URL of the repository
+        remote_refs -- dictionary of the commit hashes of the repository's refs, as returned by get_remote_refs()
+        """
+        if not any(ref_name.startswith("refs/tags/") for ref_name in remote_refs):
+            return None
+
+        with tempfile.TemporaryDirectory(dir=self.temporary_directory.name, prefix="latest_tag-") as tags_folder:
+            tags_repository = git.Repo.init(path=tags_folder, bare=True)
+            tags_repository.create_remote(name="origin", url=url)
+            # Only the tagged commits are needed to determine the latest tag, so make a partial clone without trees
+            with tags_repository.config_writer() as config_writer:
+                config_writer.set_value("core", "repositoryformatversion", 1)
+                config_writer.set_value("extensions", "partialClone", "origin")
+            tags_repository.git.fetch("--depth", "1", "--filter=tree:0", "origin", "+refs/tags/*:refs/tags/*")
+
+            return sorted(tags_repository.tags, key=lambda tag: tag.commit.committed_date)[-1].name
+
+    def install_platforms_from_download(self, platform_list):
+        """Install libraries by downloading them
+
+        Keyword arguments:
+        platform_list -- list of dictionaries defining the dependencies
         """
         for platform in platform_list:
             self.verbose_print("Installing platform from download URL:", platform[self.dependency_source_url_key])
@@ -687,14 +1889,17 @@ class CompileSketches:
                                        source_path=source_path,
                                        destination_parent_path=destination_path.path.parent,
                                        destination_name=destination_path.path.name,
-                                       force=destination_path.is_overwrite)
+                                       force=destination_path.is_overwrite,
+                                       checksum=platform.get(self.dependency_checksum_key))
 
     def install_libraries(self):
         """Install Arduino libraries."""
         libraries = get_list_from_multiformat_input(input_value=self.libraries)
 
         library_list = self.Dependencies()
-        if libraries.was_yaml_list:
+        if self.lockfile is not None and self.lockfile_libraries_key in self.lockfile:
+            library_list = self.sort_dependency_list(self.lockfile[self.lockfile_libraries_key])
+        elif libraries.was_yaml_list:
             # libraries input is YAML
             library_list = self.sort_dependency_list(libraries.value)
         else:
@@ -705,21 +1910,239 @@ class CompileSketches:
             # The original behavior of the action was to assume the root of the repo is a library to be installed, so
             # that behavior is retained when using the old input syntax
             library_list.path = [{self.dependency_source_path_key: os.environ["GITHUB_WORKSPACE"]}]
+        self.library_dependencies = library_list
 
         # Dependencies of Library Manager sourced libraries (as defined by the library's metadata file) are
         # automatically installed. For this reason, LM-sources must be installed first so the library dependencies from
         # other sources which were explicitly defined won't be replaced.
-        if len(library_list.manager) > 0:
-            self.install_libraries_from_library_manager(library_list=library_list.manager)
+        self.run_task_graph(
+            task_list=self.get_dependency_installation_task_list(
+                dependency_list=library_list,
+                install_from_manager=lambda dependency_list: self.install_libraries_from_library_manager(
+                    library_list=dependency_list
+                ),
+                installers={
+                    "path": lambda dependency_list: self.install_libraries_from_path(library_list=dependency_list),
+                    "repository": lambda dependency_list: self.install_libraries_from_repository(
+                        library_list=dependency_list
+                    ),
+                    "download": lambda dependency_list: self.install_libraries_from_download(
+                        library_list=dependency_list
+                    )
+                },
+                get_destination_key=self.get_library_destination_name,
+                is_dependency_installed=self.is_library_dependency_installed
+            )
+        )
+
+    def is_library_dependency_installed(self, dependency, source_type):
+        """Return whether the library dependency is already installed from the same source.
+
+        Keyword arguments:
+        dependency -- dictionary defining the library dependency
+        source_type -- source type of the dependency ("path", "repository", "download")
+        """
+        destination_name = self.get_library_destination_name(dependency=dependency, source_type=source_type)
+        if destination_name is None or not self.has_installation_receipt(
+            destination_path=self.libraries_path.joinpath(destination_name)
+        ):
+            return False
+
+        source_path = dependency.get(self.dependency_source_path_key, ".")
+        url = dependency[self.dependency_source_url_key]
+        if source_type == "repository":
+            commit = self.get_repository_commit(url=url,
+                                                git_ref=self.get_repository_dependency_ref(dependency=dependency))
+            if commit is None:
+                return False
+            receipt = get_repository_receipt(
+                url=url,
+                source_path=source_path,
+                submodules=self.get_repository_dependency_submodules(dependency=dependency),
+                commit=commit
+            )
+        elif source_type == "download" and self.dependency_checksum_key in dependency:
+            expected_hash = self.get_expected_download_hash(url=url,
+                                                            checksum=dependency[self.dependency_checksum_key])
+            receipt = get_download_receipt(url=url, source_path=source_path, checksum="SHA-256:" + expected_hash)
+        else:
+            return False
+
+        return self.is_installed(destination_path=self.libraries_path.joinpath(destination_name), receipt=receipt)
+
+    def get_library_destination_name(self, dependency, source_type):
+        """Return the name of the folder the library will be installed to, or None if it can't be determined before
+        the installation.
+
+        Keyword arguments:
+        dependency -- dictionary defining the library dependency
+        source_type -- source type of the dependency ("path", "repository", "download")
+        """
+        if self.dependency_destination_name_key in dependency:
+            return dependency[self.dependency_destination_name_key]
+
+        if source_type == "path":
+            source_path = absolute_path(dependency[self.dependency_source_path_key])
+            if source_path == absolute_path(os.environ["GITHUB_WORKSPACE"]):
+                return os.environ["GITHUB_REPOSITORY"].split(sep="/")[1]
+            return source_path.name
+
+        if source_type == "repository":
+            source_path = dependency.get(self.dependency_source_path_key, ".")
+            if source_path.rstrip("/") == ".":
+                # The repository name is used
+                url = dependency[self.dependency_source_url_key]
+                return url.rstrip("/").rsplit(sep="/", maxsplit=1)[1].rsplit(sep=".", maxsplit=1)[0]
+            if pathlib.PurePath(source_path).name not in ["", ".."]:
+                return pathlib.PurePath(source_path).name
+
+        # The name of an archive's root folder is not known until it has been extracted
+        return None
+
+    def get_dependency_installation_task_list(self, dependency_list, install_from_manager, installers,
+                                              get_destination_key, is_dependency_installed=None):
+        """Return a list of tasks for run_task_graph() which installs the dependencies with the same result as
+        installing them one at a time in the order of manager, path, repository, and download sources.
+
+        The installations from sources other than the manager are done after the manager installation, so that they
+        override the manager installations. Each repository clone or archive download is a separate task, which can run
+        concurrently with all other tasks. An installation is only done before a later installation if they might have
+        the same destination, so that the later installation overrides the earlier one.
+
+        Keyword arguments:
+        dependency_list -- Dependencies object containing lists of dictionaries defining dependencies of each source
+                           type
+        install_from_manager -- function to install a list of manager dependencies
+        installers -- dictionary of functions to install a list of dependencies of the source type, keyed by source type
+                      ("path", "repository", "download")
+        get_destination_key -- function taking a dependency and its source type, which returns a value identifying the
+                               installation destination, or None if the destination can't be determined in advance
+        is_dependency_installed -- function taking a dependency and its source type, which returns whether it is
+                                   already installed from the same source, so there is no need to fetch it in advance.
+                                   It is called by the fetch task, so that any lookups run concurrently. The installer
+                                   still checks the installation when it runs. Set to None to always fetch the
+                                   dependencies in advance. (default None)
+        """
+        task_list = []
+        installation_dependencies = []
+        if len(dependency_list.manager) > 0:
+            task_list.append({"function": functools.partial(install_from_manager, dependency_list.manager),
+                              "dependencies": []})
+            installation_dependencies.append(len(task_list) - 1)
+
+        fetch_task_indices = {}
+        # The dependencies installed from each fetch, with their source types, keyed by fetch key
+        fetched_dependency_lists = {}
+        installation_task_list = []
+        for source_type, source_dependency_list in [("path", dependency_list.path),
+                                                    ("repository", dependency_list.repository),
+                                                    ("download", dependency_list.download)]:
+            for dependency in source_dependency_list:
+                task_dependencies = installation_dependencies.copy()
+
+                fetch_key = self.get_fetch_key(dependency=dependency, source_type=source_type)
+                if fetch_key is not None:
+                    if fetch_key not in fetch_task_indices:
+                        fetched_dependency_lists[fetch_key] = []
+                        task_list.append({"function": functools.partial(self.fetch_uninstalled_dependency,
+                                                                        fetch_key,
+                                                                        fetched_dependency_lists[fetch_key],
+                                                                        is_dependency_installed),
+                                          "dependencies": []})
+                        fetch_task_indices[fetch_key] = len(task_list) - 1
+                    fetched_dependency_lists[fetch_key].append((dependency, source_type))
+                    task_dependencies.append(fetch_task_indices[fetch_key])
+
+                destination_key = get_destination_key(dependency, source_type)
+                for previous_destination_key, previous_task_index in installation_task_list:
+                    if destination_key is None or previous_destination_key is None or (
+                        destination_key == previous_destination_key
+                    ):
+                        task_dependencies.append(previous_task_index)
+
+                task_list.append({"function": functools.partial(installers[source_type], [dependency]),
+                                  "dependencies": task_dependencies})
+                installation_task_list.append((destination_key, len(task_list) - 1))
+
+        return task_list
+
+    def get_fetch_key(self, dependency, source_type):
+        """Return the key identifying the clone or download of the dependency, or None if it doesn't need to be fetched.
+
+        Keyword arguments:
+        dependency -- dictionary defining the dependency
+        source_type -- source type of the dependency ("path", "repository", "download")
+        """
+        if source_type == "repository":
+            return ("repository",
+                    dependency[self.dependency_source_url_key],
+                    self.get_repository_dependency_ref(dependency=dependency),
+                    get_sparse_path(source_path=dependency.get(self.dependency_source_path_key, ".")),
+                    self.get_repository_dependency_submodules(dependency=dependency))
+        if source_type == "download":
+            return ("download",
+                    dependency[self.dependency_source_url_key],
+                    dependency.get(self.dependency_checksum_key),
+                    get_sparse_path(source_path=dependency.get(self.dependency_source_path_key, ".")))
+
+        return None
+
+    def fetch_dependency(self, fetch_key):
+        """Clone or download the dependency identified by the key returned by get_fetch_key().
+
+        Keyword arguments:
+        fetch_key -- tuple returned by get_fetch_key()
+        """
+        if fetch_key[0] == "repository":
+            _, url, git_ref, sparse_path, submodules = fetch_key
+            self.get_repository_clone(url=url, git_ref=git_ref, sparse_path=sparse_path, submodules=submodules)
+        else:
+            _, url, checksum, sparse_path = fetch_key
+            self.get_extracted_download(url=url, checksum=checksum, sparse_path=sparse_path)
+
+    def fetch_uninstalled_dependency(self, fetch_key, dependency_list, is_dependency_installed):
+        """Clone or download the dependency identified by the key returned by get_fetch_key(), unless all the
+        dependencies installed from it are already installed from the same source.
+
+        Keyword arguments:
+        fetch_key -- tuple returned by get_fetch_key()
+        dependency_list -- list of tuples of the dictionary defining each dependency installed from the fetch and its
+                           source type
+        is_dependency_installed -- function taking a dependency and its source type, which returns whether it is
+                                   already installed from the same source. None to always fetch.
+        """
+        if is_dependency_installed is not None and all(
+            is_dependency_installed(dependency, source_type) for dependency, source_type in dependency_list
+        ):
+            return
 
-        if len(library_list.path) > 0:
-            self.install_libraries_from_path(library_list=library_list.path)
+        self.fetch_dependency(fetch_key)
 
-        if len(library_list.repository) > 0:
-            self.install_libraries_from_repository(library_list=library_list.repository)
+    def run_task_graph(self, task_list):
+        """Run the tasks concurrently, with each task only started after the tasks it depends on have completed.
 
-        if len(library_list.download) > 0:
-            self.install_libraries_from_download(library_list=library_list.download)
+        Keyword arguments:
+        task_list -- list of dictionaries defining the tasks, with the keys:
+                     function -- function to call with no arguments
+                     dependencies -- list of the indices of the earlier tasks in task_list the task depends on
+        """
+        pending_task_dependencies = {index: set(task["dependencies"]) for index, task in enumerate(task_list)}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            running_tasks = {}
+            while pending_task_dependencies or running_tasks:
+                for index, task_dependencies in list(pending_task_dependencies.items()):
+                    if not task_dependencies:
+                        del pending_task_dependencies[index]
+                        running_tasks[executor.submit(task_list[index]["function"])] = index
+
+                completed_tasks, _ = concurrent.futures.wait(running_tasks,
+                                                             return_when=concurrent.futures.FIRST_COMPLETED)
+                for completed_task in completed_tasks:
+                    completed_task_index = running_tasks.pop(completed_task)
+                    # Raise any exception from the task, including the SystemExit of a failed installation
+                    completed_task.result()
+                    for task_dependencies in pending_task_dependencies.values():
+                        task_dependencies.discard(completed_task_index)
 
     def install_libraries_from_library_manager(self, library_list):
         """Install libraries using the Arduino Library Manager
@@ -727,6 +2150,19 @@ class CompileSketches:
         Keyword arguments:
         library_list -- list of dictionaries defining the dependencies
         """
+        if self.lockfile is not None and self.lockfile_library_manager_releases_key in self.lockfile:
+            # The dependencies were already resolved when the lockfile was written
+            library_release_list = self.lockfile[self.lockfile_library_manager_releases_key]
+        else:
+            library_release_list = self.resolve_library_manager_dependencies(library_list=library_list)
+        if library_release_list is not None:
+            self.library_manager_releases = library_release_list
+            self.install_library_manager_releases(library_release_list=library_release_list)
+            return
+
+        # The dependencies could not be resolved from the index, so leave it to Arduino CLI
+        self.verbose_print("Unable to resolve the library dependencies from the Library Manager index, installing with",
+                           "Arduino CLI")
         lib_install_base_command = ["lib", "install"]
         # `arduino-cli lib install` fails if one of the libraries in the list has a dependency on another, but an
         # earlier version of the dependency is specified in the list. The solution is to install one library at a time
@@ -737,6 +2173,100 @@ class CompileSketches:
             lib_install_command.append(self.get_manager_dependency_name(library))
             self.run_arduino_cli_command(command=lib_install_command, enable_output=self.get_run_command_output_level())
 
+    def get_library_index(self):
+        """Update the Library Manager index and return a dictionary of the lists of releases of each library in the
+        index, keyed by library name.
+        """
+        self.run_arduino_cli_command(command=["lib", "update-index"], enable_output=self.get_run_command_output_level())
+        with open(file=self.arduino_cli_data_directory_path.joinpath("library_index.json"),
+                  encoding="utf-8") as library_index_file:
+            library_index = json.load(fp=library_index_file)
+
+        library_releases = {}
+        for library_release in library_index["libraries"]:
+            library_releases.setdefault(library_release["name"], []).append(library_release)
+
+        return library_releases
+
+    def resolve_library_manager_dependencies(self, library_list):
+        """Return the list of Library Manager index entries for the library releases which result from installing the
+        libraries and their dependencies, or None if they can't be resolved from the index.
+
+        Installing each library with `arduino-cli lib install` also installs the latest release of each of its
+        dependencies, replacing any previously installed release. So a library from later in the list overrides the
+        release installed for an earlier library, which allows the user to control which release is installed.
+
+        Keyword arguments:
+        library_list -- list of dictionaries defining the dependencies
+        """
+        library_releases = self.get_library_index()
+
+        resolved_releases = {}
+        for library in library_list:
+            name, _, version = self.get_manager_dependency_name(library).partition("@")
+            # The releases resolved for this library, including its dependencies
+            library_resolved_releases = {}
+            pending_list = [(name, version)]
+            while pending_list:
+                pending_name, pending_version = pending_list.pop(0)
+                if pending_name in library_resolved_releases:
+                    # The version of the library which was specified or resolved first takes precedence
+                    continue
+
+                release = get_library_release(library_releases=library_releases.get(pending_name, []),
+                                              version=pending_version)
+                if release is None:
+                    return None
+
+                library_resolved_releases[pending_name] = release
+                for dependency in release.get("dependencies", []):
+                    dependency_version = dependency.get("version", "").strip()
+                    if dependency_version.startswith("="):
+                        dependency_version = dependency_version[1:].strip()
+                    if re.search(pattern=r"[<>^~ |&]", string=dependency_version) is not None:
+                        # Version constraints are not supported
+                        return None
+                    pending_list.append((dependency["name"], dependency_version))
+
+            resolved_releases.update(library_resolved_releases)
+
+        return list(resolved_releases.values())
+
+    def install_library_manager_releases(self, library_release_list):
+        """Download the library releases concurrently, verifying them against the checksums from the index, and install
+        them the same as Arduino CLI's Library Manager does.
+
+        Keyword arguments:
+        library_release_list -- list of Library Manager index entries for the library releases to install
+        """
+        def fetch_library_release(library_release):
+            self.verbose_print("Downloading library from Library Manager:",
+                               library_release["name"] + "@" + library_release["version"])
+            return self.get_extracted_download(url=library_release["url"], checksum=library_release["checksum"])
+
+        pending_library_release_list = []
+        for library_release in library_release_list:
+            destination_path = self.libraries_path.joinpath(get_library_manager_folder_name(library_release))
+            if self.is_installed(destination_path=destination_path,
+                                 receipt=get_download_receipt(url=library_release["url"],
+                                                              source_path=".",
+                                                              checksum=library_release["checksum"])):
+                self.use_existing_installation(destination_path=destination_path)
+            else:
+                pending_library_release_list.append(library_release)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            archive_root_path_list = list(executor.map(fetch_library_release, pending_library_release_list))
+
+        for library_release, archive_root_path in zip(pending_library_release_list, archive_root_path_list):
+            self.install_from_path(source_path=pathlib.Path(archive_root_path),
+                                   destination_parent_path=self.libraries_path,
+                                   destination_name=get_library_manager_folder_name(library_release),
+                                   force=True,
+                                   receipt=get_download_receipt(url=library_release["url"],
+                                                                source_path=".",
+                                                                checksum=library_release["checksum"]))
+
     def install_libraries_from_path(self, library_list):
         """Install libraries from local paths
 
@@ -799,7 +2329,8 @@ class CompileSketches:
                                          source_path=source_path,
                                          destination_parent_path=self.libraries_path,
                                          destination_name=destination_name,
-                                         force=True)
+                                         force=True,
+                                         submodules=self.get_repository_dependency_submodules(dependency=library))
 
     def install_libraries_from_download(self, library_list):
         """Install libraries by downloading them
@@ -823,7 +2354,8 @@ class CompileSketches:
                                        source_path=source_path,
                                        destination_parent_path=self.libraries_path,
                                        destination_name=destination_name,
-                                       force=True)
+                                       force=True,
+                                       checksum=library.get(self.dependency_checksum_key))
 
     def find_sketches(self):
         """Return a list of all sketches under the paths specified in the sketch paths list recursively."""
@@ -864,239 +2396,1111 @@ class CompileSketches:
 
         return sketch_list
 
-    def compile_sketch(self, sketch_path, clean_build_cache):
+    def compile_sketch_list(self, compilation_list, clean_build_cache, replay_core_warnings=False, environment=None,
+                            jobs=None):
+        """Compile the sketches concurrently and return the list of objects returned by compile_sketch(), in the same
+        order as compilation_list.
+
+        Keyword arguments:
+        compilation_list -- list of dictionaries defining the compilations, with the keys:
+                            sketch_path -- path of the sketch to compile
+                            fqbn -- fully qualified board name of the board to compile for
+        clean_build_cache -- whether to delete cached compiled from previous compilations before compiling
+        replay_core_warnings -- whether to compile each sketch in a clean build folder, reusing the compiled core and
+                                adding the warnings from its compilation to the output (default False)
+        environment -- environment variables for Arduino CLI. Set to None to use the environment of the script.
+                       (default None)
+        jobs -- maximum number of concurrent compilations. Set to None to use the jobs input. (default None)
+        """
+        if jobs is None:
+            jobs = self.jobs
+
+        # Each worker has a dedicated build folder, so concurrent compilations can't interfere with each other's build
+        # files or cache. The folders are handed from one compilation to the next via the queue.
+        build_folder_queue = queue.SimpleQueue()
+        for _ in range(jobs):
+            build_folder_queue.put(
+                pathlib.Path(tempfile.mkdtemp(dir=self.temporary_directory.name, prefix="compile_sketch_list-"))
+            )
+
+        def compile_sketch_in_build_folder(compilation):
+            build_folder = build_folder_queue.get()
+            try:
+                return self.compile_sketch(sketch_path=compilation["sketch_path"],
+                                           fqbn=compilation["fqbn"],
+                                           clean_build_cache=clean_build_cache,
+                                           replay_core_warnings=replay_core_warnings,
+                                           build_path=build_folder.joinpath("build"),
+                                           build_cache_path=build_folder.joinpath("build-cache"),
+                                           environment=environment)
+            finally:
+                build_folder_queue.put(build_folder)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            # map() returns the results in the order of the input list, regardless of the order of completion
+            compilation_result_list = list(executor.map(compile_sketch_in_build_folder, compilation_list))
+
+        return compilation_result_list
+
+    def compile_sketch(self, sketch_path, fqbn, clean_build_cache, replay_core_warnings=False, build_path=None,
+                       build_cache_path=None, environment=None):
         """Compile the specified sketch and returns an object containing the result:
         sketch -- the sketch path relative to the workspace
+        fqbn -- fully qualified board name of the board the sketch was compiled for
         success -- the success of the compilation (True, False)
         output -- stdout from Arduino CLI
 
         Keyword arguments:
         sketch_path -- path of the sketch to compile
+        fqbn -- fully qualified board name of the board to compile for
         clean_build_cache -- whether to delete cached compiled from previous compilations before compiling
+        replay_core_warnings -- whether to compile in a clean build folder, reusing the compiled core from the build
+                                cache and adding the warnings from its compilation to the output. Requires build_path
+                                and build_cache_path. (default False)
+        build_path -- folder to use for the build files. Set to None to use Arduino CLI's default location.
+                      (default None)
+        build_cache_path -- folder to use for the cache of the compiled core. Set to None to use Arduino CLI's default
+                            location. (default None)
+        environment -- environment variables for Arduino CLI. Set to None to use the environment of the script.
+                       (default None)
         """
-        compilation_command = ["compile", "--warnings", "all", "--fqbn", self.fqbn, sketch_path]
-
-        if clean_build_cache:
-            for cache_path in pathlib.Path("/tmp").glob(pattern="arduino*"):
-                shutil.rmtree(path=cache_path)
+        class CompilationResult:
+            def __init__(self, success, output):
+                self.sketch = sketch_path
+                self.fqbn = fqbn
+                self.success = success
+                self.output = output
+
+        # A sketch added by the changes doesn't exist at the deltas base ref, so it has no contents to key the cache on.
+        # The compilation reports its absence as usual.
+        use_compilation_cache = self.compilation_cache_path is not None and absolute_path(path=sketch_path).exists()
+        if use_compilation_cache:
+            compilation_cache_key = self.get_compilation_cache_key(sketch_path=sketch_path,
+                                                                   fqbn=fqbn,
+                                                                   clean_build_cache=clean_build_cache,
+                                                                   replay_core_warnings=replay_core_warnings,
+                                                                   environment=environment)
+            cached_compilation_result = self.get_cached_compilation_result(compilation_cache_key=compilation_cache_key)
+            if cached_compilation_result is not None:
+                self.verbose_print("Using cached compilation result for sketch:",
+                                   path_relative_to_workspace(path=sketch_path), "for board:", fqbn)
+                return CompilationResult(success=cached_compilation_result["success"],
+                                         output=cached_compilation_result["output"])
+
+        compilation_command = ["compile", "--warnings", "all", "--fqbn", fqbn]
+        if build_path is not None:
+            compilation_command.extend(["--build-path", build_path])
+        if build_cache_path is not None:
+            compilation_command.extend(["--build-cache-path", build_cache_path])
+        compilation_command.append(sketch_path)
+
+        self.clean_build_folders(clean_build_cache=clean_build_cache,
+                                 replay_core_warnings=replay_core_warnings,
+                                 build_path=build_path,
+                                 build_cache_path=build_cache_path)
+
+        if replay_core_warnings:
+            core_archive_states = get_core_archive_states(build_cache_path=build_cache_path)
 
         compilation_data = self.run_arduino_cli_command(
-            command=compilation_command, enable_output=self.RunCommandOutput.NONE, exit_on_failure=False)
-        # Group compilation output to make the log easy to read
-        # https://github.com/actions/toolkit/blob/master/docs/commands.md#group-and-ungroup-log-lines
-        print("::group::Compiling sketch:", path_relative_to_workspace(path=sketch_path))
-        print(compilation_data.stdout)
-        print("::endgroup::")
-
-        class CompilationResult:
-            sketch = sketch_path
-            success = compilation_data.returncode == 0
-            output = compilation_data.stdout
+            command=compilation_command, enable_output=self.RunCommandOutput.NONE, exit_on_failure=False,
+            environment=environment)
+
+        compilation_result = CompilationResult(success=compilation_data.returncode == 0, output=compilation_data.stdout)
+
+        if replay_core_warnings:
+            compilation_result.output = self.replay_core_warnings(
+                build_cache_path=build_cache_path,
+                fqbn=fqbn,
+                compilation_output=compilation_result.output,
+                # Arduino CLI writes the core archive to the build cache when it compiles the core
+                core_compiled=get_core_archive_states(build_cache_path=build_cache_path) != core_archive_states,
+                success=compilation_result.success
+            )
 
-        if not CompilationResult.success:
-            print("::error::Compilation failed")
+        # Failed compilations are not cached so that their output is always fresh
+        if use_compilation_cache and compilation_result.success:
+            self.cache_compilation_result(compilation_cache_key=compilation_cache_key,
+                                          compilation_result=compilation_result)
 
-        return CompilationResult()
+        return compilation_result
 
-    def get_sketch_report(self, compilation_result):
-        """Return a dictionary containing data on the sketch.
+    def clean_build_folders(self, clean_build_cache, replay_core_warnings, build_path, build_cache_path):
+        """Delete the files from previous compilations as needed for the compilation.
 
         Keyword arguments:
-        compilation_result -- object returned by compile_sketch()
+        clean_build_cache -- whether to delete cached compiled from previous compilations
+        replay_core_warnings -- whether to delete the build folder while keeping the build cache
+        build_path -- folder used for the build files. None for Arduino CLI's default location.
+        build_cache_path -- folder used for the cache of the compiled core. None for Arduino CLI's default location.
         """
-        current_sizes = self.get_sizes_from_output(compilation_result=compilation_result)
-        if self.enable_warnings_report:
-            current_warning_count = self.get_warning_count_from_output(compilation_result=compilation_result)
-        else:
-            current_warning_count = None
-        previous_sizes = None
-        previous_warning_count = None
-        if self.do_deltas_report(compilation_result=compilation_result,
-                                 current_sizes=current_sizes,
-                                 current_warnings=current_warning_count):
-            # Get data for the sketch at the base ref
-            # Get the head ref
-            repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
-            original_git_ref = repository.head.object.hexsha
-
-            # git checkout the base ref
-            self.checkout_deltas_base_ref()
-
-            # Compile the sketch again
-            print("Compiling previous version of sketch to determine memory usage change")
-            previous_compilation_result = self.compile_sketch(sketch_path=compilation_result.sketch,
-                                                              clean_build_cache=self.enable_warnings_report)
-
-            # git checkout the head ref to return the repository to its previous state
-            repository.git.checkout(original_git_ref, recurse_submodules=True)
+        if clean_build_cache:
+            if build_path is None and build_cache_path is None:
+                cache_paths = pathlib.Path("/tmp").glob(pattern="arduino*")
+            else:
+                # Only the dedicated folders are cleaned, since other compilations might be using the default location
+                cache_paths = [path for path in [build_path, build_cache_path] if path is not None and path.exists()]
+            for cache_path in cache_paths:
+                shutil.rmtree(path=cache_path)
+        elif replay_core_warnings and build_path.exists():
+            # The library objects are in the build folder, so a clean build folder results in their warnings being in
+            # the output. Only the core is cached.
+            shutil.rmtree(path=build_path)
 
-            previous_sizes = self.get_sizes_from_output(compilation_result=previous_compilation_result)
-            if self.enable_warnings_report:
-                previous_warning_count = (
-                    self.get_warning_count_from_output(compilation_result=previous_compilation_result)
-                )
+    def get_compilation_cache_key(self, sketch_path, fqbn, clean_build_cache, replay_core_warnings=False,
+                                  environment=None):
+        """Return the key of the compilation in the compilation cache. The key changes whenever anything that might
+        affect the compilation result changes.
 
-        # Add global data for sketch to report
-        sketch_report = {
-            self.ReportKeys.name: str(path_relative_to_workspace(path=compilation_result.sketch)),
-            self.ReportKeys.compilation_success: compilation_result.success,
-            self.ReportKeys.sizes: self.get_sizes_report(current_sizes=current_sizes,
-                                                         previous_sizes=previous_sizes),
+        Keyword arguments:
+        sketch_path -- path of the sketch to compile
+        fqbn -- fully qualified board name of the board to compile for
+        clean_build_cache -- whether the cached compiled core is deleted before compiling, which affects the warnings
+                             in the output
+        replay_core_warnings -- whether the warnings from the compilation of the cached core are added to the output
+        environment -- environment variables for Arduino CLI. Set to None to use the environment of the script.
+                       (default None)
+        """
+        key_data = {
+            # The sketch is identified by its contents rather than its path, so the result is also valid for the
+            # same sketch at the deltas base ref
+            "sketch_name": pathlib.PurePath(sketch_path).name,
+            "sketch": get_path_hash(path=sketch_path),
+            "fqbn": fqbn,
+            "clean_build_cache": clean_build_cache,
+            "replay_core_warnings": replay_core_warnings,
+            # Arduino CLI is not a path installation, so it is identified by the version install_arduino_cli() activated
+            "arduino_cli_version": self.arduino_cli_version,
+            "dependencies": self.get_dependencies_fingerprint(environment=environment)
         }
-        if self.enable_warnings_report:
-            sketch_report[self.ReportKeys.warnings] = (
-                self.get_warnings_report(current_warnings=current_warning_count,
-                                         previous_warnings=previous_warning_count)
-            )
 
-        return sketch_report
+        return hashlib.sha256(json.dumps(obj=key_data, sort_keys=True).encode()).hexdigest()
 
-    def get_sizes_from_output(self, compilation_result):
-        """Parse the stdout from the compilation process and return a list containing memory usage data.
+    def replay_core_warnings(self, build_cache_path, fqbn, compilation_output, core_compiled, success):
+        """Return the compilation output with the warnings from the compilation of the core added if the core was
+        reused from the build cache. If the core was compiled, its warnings are recorded for replay in later
+        compilations.
 
         Keyword arguments:
-        compilation_result -- object returned by compile_sketch()
+        build_cache_path -- folder used for the cache of the compiled core
+        fqbn -- fully qualified board name of the board the sketch was compiled for
+        compilation_output -- stdout from Arduino CLI
+        core_compiled -- whether the compilation compiled the core rather than reusing it from the build cache
+        success -- whether the compilation was successful. A failed compilation might have stopped before the core was
+                   reused, so the warnings are not added to its output.
         """
-        memory_types = [
-            {
-                "name": "flash",
-                # Use capturing parentheses to identify the location of the data in the regular expression
-                "regex": {
-                    # The regular expression for the absolute memory usage
-                    self.ReportKeys.absolute: r"Sketch uses ([0-9]+) bytes .*of program storage space\.",
-                    # The regular expression for the total memory
-                    self.ReportKeys.maximum: (
-                        r"Sketch uses [0-9]+ bytes .*of program storage space\. Maximum is ([0-9]+) bytes."
-                    )
-                }
-            },
-            {
-                "name": "RAM for global variables",
-                "regex": {
-                    self.ReportKeys.absolute: r"Global variables use ([0-9]+) bytes .*of dynamic memory",
-                    self.ReportKeys.maximum: (
-                        r"Global variables use [0-9]+ bytes .*of dynamic memory.*\. Maximum is ([0-9]+) bytes."
-                    )
-                }
-            }
-        ]
+        core_warnings_key = (build_cache_path, fqbn)
+        if core_compiled:
+            self.core_warnings[core_warnings_key] = get_core_warnings_from_output(compilation_output=compilation_output)
+            return compilation_output
 
-        sizes = []
-        for memory_type in memory_types:
-            size = {
-                self.ReportKeys.name: memory_type["name"],
-                # Set default memory usage value, to be used if memory usage can't be determined
-                self.ReportKeys.absolute: self.not_applicable_indicator,
-                self.ReportKeys.maximum: self.not_applicable_indicator,
-                self.ReportKeys.relative: self.not_applicable_indicator
-            }
+        # The warnings are unknown if the core was compiled by a compilation in a previous run
+        if not success or not self.core_warnings.get(core_warnings_key):
+            return compilation_output
 
-            if compilation_result.success is True:
-                # Determine memory usage of the sketch by parsing Arduino CLI's output
-                size_data = self.get_size_data_from_output(compilation_output=compilation_result.output,
-                                                           memory_type=memory_type,
-                                                           size_data_type=self.ReportKeys.absolute)
-                if size_data:
-                    size[self.ReportKeys.absolute] = size_data
+        return "\n".join([compilation_output.rstrip("\n"),
+                          "Warnings from the compilation of the cached core:",
+                          *self.core_warnings[core_warnings_key]])
 
-                    size_data = self.get_size_data_from_output(compilation_output=compilation_result.output,
-                                                               memory_type=memory_type,
-                                                               size_data_type=self.ReportKeys.maximum)
-                    if size_data:
-                        size[self.ReportKeys.maximum] = size_data
+    def get_dependencies_fingerprint(self, environment=None):
+        """Return a hash of the installed platforms and libraries.
 
-                        size[self.ReportKeys.relative] = round(
-                            (100 * size[self.ReportKeys.absolute] / size[self.ReportKeys.maximum]),
-                            self.relative_size_report_decimal_places
-                        )
+        Keyword arguments:
+        environment -- environment variables for Arduino CLI. Set to None to use the environment of the script.
+                       (default None)
+        """
+        if environment is None:
+            environment = os.environ
+
+        directory_paths = {
+            self.arduino_cli_user_directory_path: pathlib.Path(
+                environment.get("ARDUINO_DIRECTORIES_USER", self.arduino_cli_user_directory_path)
+            ),
+            self.arduino_cli_data_directory_path: pathlib.Path(
+                environment.get("ARDUINO_DIRECTORIES_DATA", self.arduino_cli_data_directory_path)
+            )
+        }
+        fingerprint_key = tuple(directory_paths.values())
+
+        # The fingerprint is determined only once per environment, by whichever compilation needs it first
+        with self.dependencies_fingerprints_lock:
+            if fingerprint_key not in self.dependencies_fingerprints:
+                fingerprint = hashlib.sha256()
+                # Dependencies installed via Boards Manager and Library Manager are identified by their versions
+                for command in [["core", "list", "--format", "json"], ["lib", "list", "--format", "json"]]:
+                    fingerprint.update(
+                        self.run_arduino_cli_command(command=command,
+                                                     enable_output=self.RunCommandOutput.NONE,
+                                                     environment=environment).stdout.encode()
+                    )
 
-            sizes.append(size)
+                # The contents of the path installations might change without a version change, so they are identified
+                # by their contents
+                for destination_path in sorted(self.path_installations):
+                    installation_path = destination_path
+                    for directory_path, environment_directory_path in directory_paths.items():
+                        if directory_path in destination_path.parents:
+                            # Use the equivalent path in the environment's directory, which might be an overlay
+                            installation_path = environment_directory_path.joinpath(
+                                destination_path.relative_to(directory_path)
+                            )
+                            break
+                    fingerprint.update(str(destination_path).encode())
+                    fingerprint.update(
+                        self.get_path_installation_hash(destination_path=destination_path,
+                                                        installation_path=installation_path).encode()
+                    )
 
-        return sizes
+                self.dependencies_fingerprints[fingerprint_key] = fingerprint.hexdigest()
 
-    def get_size_data_from_output(self, compilation_output, memory_type, size_data_type):
-        """Parse the stdout from the compilation process for a specific datum and return it, or None if not found.
+            return self.dependencies_fingerprints[fingerprint_key]
+
+    def get_path_installation_hash(self, destination_path, installation_path):
+        """Return a hash of the contents of a path installation. Only the files of a library which might be compiled are
+        hashed, so that changes to the rest of a library installed from the workspace (e.g., the documentation) don't
+        invalidate the compilation cache.
 
         Keyword arguments:
-        compilation_output -- stdout from the compilation process
-        memory_type -- dictionary defining a memory type
-        size_data_type -- the type of size data to get
+        destination_path -- path the dependency is installed to
+        installation_path -- path of the installation in the environment of the compilation
         """
-        size_data = None
-        regex_match = re.search(pattern=memory_type["regex"][size_data_type], string=compilation_output)
-        if regex_match:
-            size_data = int(regex_match.group(1))
+        installation_path = installation_path.resolve()
+        if self.libraries_path in destination_path.parents:
+            file_filter = functools.partial(self.is_library_compilation_path, installation_path)
         else:
-            # If any of the following:
-            # - recipe.size.regex is not defined in platform.txt
-            # - upload.maximum_size is not defined in boards.txt
-            # flash usage will not be reported in the Arduino CLI output
-            # If any of the following:
-            # - recipe.size.regex.data is not defined in platform.txt (e.g., Arduino SAM Boards)
-            # - recipe.size.regex is not defined in platform.txt
-            # - upload.maximum_size is not defined in boards.txt
-            # RAM usage will not be reported in the Arduino CLI output
-            self.verbose_print(
-                "::warning::Unable to determine the: \"" + size_data_type + "\" value for memory type: \""
-                + memory_type["name"]
-                + "\". The board's platform may not have been configured to provide this information."
-            )
+            file_filter = None
 
-        return size_data
+        return get_path_hash(
+            path=installation_path,
+            # A dependency installed from the workspace might contain the action's own output
+            excluded_paths=[self.compilation_cache_path, absolute_path(path=self.sketches_report_path)],
+            file_filter=file_filter
+        )
 
-    def get_warning_count_from_output(self, compilation_result):
-        """Parse the stdout from the compilation process and return the number of compiler warnings. Since the
-        information is likely not relevant in that case, "N/A" is returned if compilation failed.
+    def get_cached_compilation_result(self, compilation_cache_key):
+        """Return the dictionary of compilation result data stored in the compilation cache under the given key, or None
+        if there is no such entry.
 
         Keyword arguments:
-        compilation_result -- object returned by compile_sketch()
+        compilation_cache_key -- key returned by get_compilation_cache_key()
         """
-        if compilation_result.success is True:
-            compiler_warning_regex = ":[0-9]+:[0-9]+: warning:"
-            warning_count = len(re.findall(pattern=compiler_warning_regex, string=compilation_result.output))
-        else:
-            warning_count = self.not_applicable_indicator
+        cache_entry_path = pathlib.Path(self.compilation_cache_path, compilation_cache_key + ".json")
+        try:
+            with open(file=cache_entry_path, encoding="utf-8") as cache_entry_file:
+                cached_compilation_result = json.load(fp=cache_entry_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
 
-        return warning_count
+        # The modification time is used to determine which entries were least recently used
+        os.utime(path=cache_entry_path)
 
-    def do_deltas_report(self, compilation_result, current_sizes, current_warnings):
-        """Return whether size deltas reporting is enabled.
+        return cached_compilation_result
+
+    def cache_compilation_result(self, compilation_cache_key, compilation_result):
+        """Store the compilation result in the compilation cache. The sizes and warnings data are determined from the
+        output, so only the success and output need to be stored.
 
         Keyword arguments:
+        compilation_cache_key -- key returned by get_compilation_cache_key()
         compilation_result -- object returned by compile_sketch()
-        current_sizes -- memory usage data from the compilation
-        current_warnings -- compiler warning count
         """
-        return (
-            self.enable_deltas_report
-            and compilation_result.success
-            and (
-                any(size.get(self.ReportKeys.absolute) != self.not_applicable_indicator for
-                    size in current_sizes)
-                or (
-                    current_warnings is not None
-                    and current_warnings != self.not_applicable_indicator
-                )
+        compilation_cache_path = pathlib.Path(self.compilation_cache_path)
+        compilation_cache_path.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file, then move it into place so that a partially written entry is never read
+        file_descriptor, temporary_entry_path = tempfile.mkstemp(dir=compilation_cache_path, suffix=".tmp")
+        with open(file=file_descriptor, mode="w", encoding="utf-8") as cache_entry_file:
+            json.dump(obj={"success": compilation_result.success, "output": compilation_result.output},
+                      fp=cache_entry_file)
+        os.replace(src=temporary_entry_path, dst=compilation_cache_path.joinpath(compilation_cache_key + ".json"))
+
+    def prune_compilation_cache(self):
+        """Delete the least recently used entries from the compilation cache until it is within the size limit."""
+        if self.compilation_cache_path is None or not pathlib.Path(self.compilation_cache_path).exists():
+            return
+
+        cache_entry_list = []
+        for cache_entry_path in pathlib.Path(self.compilation_cache_path).glob(pattern="*.json"):
+            cache_entry_stat = cache_entry_path.stat()
+            cache_entry_list.append(
+                {"path": cache_entry_path, "size": cache_entry_stat.st_size, "used": cache_entry_stat.st_mtime}
             )
-        )
 
-    def checkout_deltas_base_ref(self):
-        """git checkout the base ref of the deltas comparison"""
-        repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
+        cache_size = sum(cache_entry["size"] for cache_entry in cache_entry_list)
+        maximum_cache_size = self.compilation_cache_size * 1024 * 1024
+        for cache_entry in sorted(cache_entry_list, key=lambda entry: entry["used"]):
+            if cache_size <= maximum_cache_size:
+                break
 
-        # git fetch the deltas base ref
-        origin_remote = repository.remotes["origin"]
-        origin_remote.fetch(refspec=self.deltas_base_ref,
-                            verbose=self.verbose,
-                            no_tags=True,
-                            prune=True,
-                            depth=1,
-                            recurse_submodules=True)
+            self.verbose_print("Removing least recently used compilation cache entry:", cache_entry["path"].name)
+            cache_entry["path"].unlink()
+            cache_size -= cache_entry["size"]
 
-        # git checkout the deltas base ref
-        repository.git.checkout(self.deltas_base_ref, recurse_submodules=True)
+    def print_compilation_result(self, compilation_result):
+        """Print the output from the compilation to the log.
 
-    def get_sizes_report(self, current_sizes, previous_sizes):
+        Keyword arguments:
+        compilation_result -- object returned by compile_sketch()
+        """
+        # Group compilation output to make the log easy to read
+        # https://github.com/actions/toolkit/blob/master/docs/commands.md#group-and-ungroup-log-lines
+        print("::group::Compiling sketch:", path_relative_to_workspace(path=compilation_result.sketch), "for board:",
+              compilation_result.fqbn)
+        print(compilation_result.output)
+        print("::endgroup::")
+
+        if not compilation_result.success:
+            print("::error::Compilation failed")
+
+    def get_previous_sketch_report_list(self, compilation_list):
+        """Return the list of the sketch reports which provide the data of the sketches at the deltas base ref, in the
+        same order as compilation_list. The list contains None for each sketch which must be compiled at the deltas base
+        ref to get the data.
+
+        Keyword arguments:
+        compilation_list -- list of dictionaries defining the compilations, in the format used by compile_sketch_list()
+        """
+        previous_sketch_report_list = [None for _ in compilation_list]
+        if not self.enable_deltas_report or (self.baseline_report_path is None and self.result_store_path is None):
+            return previous_sketch_report_list
+
+        key_list = [(compilation["fqbn"], str(path_relative_to_workspace(path=compilation["sketch_path"])))
+                    for compilation in compilation_list]
+        sketch_reports = {}
+        if self.result_store_path is not None:
+            sketch_reports.update(self.get_stored_sketch_reports(commit_hash=self.fetch_deltas_base_ref(),
+                                                                 key_list=key_list))
+        if self.baseline_report_path is not None:
+            sketch_reports.update(self.get_baseline_sketch_reports())
+
+        for index, key in enumerate(key_list):
+            sketch_report = sketch_reports.get(key)
+            # The warning count is only in the report if the warnings report was enabled when it was made
+            if sketch_report is not None and (
+                not self.enable_warnings_report or self.ReportKeys.warnings in sketch_report
+            ):
+                previous_sketch_report_list[index] = sketch_report
+
+        return previous_sketch_report_list
+
+    def get_baseline_sketch_reports(self):
+        """Return the sketch reports from the baseline report files which were made at the commit of the deltas base
+        ref, keyed by FQBN and sketch name. Files made at any other commit are stale, so their data is not used.
+        """
+        if self.baseline_report_path.is_dir():
+            baseline_report_file_paths = sorted(self.baseline_report_path.glob(pattern="*.json"))
+        else:
+            baseline_report_file_paths = [self.baseline_report_path]
+
+        deltas_base_commit = self.fetch_deltas_base_ref()
+        baseline_sketch_reports = {}
+        for baseline_report_file_path in baseline_report_file_paths:
+            sketches_report = self.read_sketches_report_file(path=baseline_report_file_path)
+            if sketches_report is None:
+                print("::warning::Unable to read baseline report:", baseline_report_file_path)
+                continue
+            if sketches_report[self.ReportKeys.commit_hash] != deltas_base_commit:
+                print("Baseline report", baseline_report_file_path, "was made at commit",
+                      sketches_report[self.ReportKeys.commit_hash], "rather than at the deltas base ref commit",
+                      deltas_base_commit + ", so it is not used")
+                continue
+
+            for board_report in sketches_report[self.ReportKeys.boards]:
+                for sketch_report in board_report[self.ReportKeys.sketches]:
+                    baseline_sketch_reports[(board_report[self.ReportKeys.board],
+                                             sketch_report[self.ReportKeys.name])] = sketch_report
+
+        return baseline_sketch_reports
+
+    def get_result_store_connection(self):
+        """Return the connection to the result store database. The database is connected and created if it doesn't
+        exist on the first call.
+        """
+        if self.result_store_connection is None:
+            pathlib.Path(self.result_store_path).parent.mkdir(parents=True, exist_ok=True)
+            # Runs on the same machine may use the store at the same time, so wait for their transactions to finish.
+            # The connection is never used by multiple threads at the same time.
+            connection = sqlite3.connect(database=str(self.result_store_path), timeout=60, check_same_thread=False)
+            with connection:
+                # The primary key indexes the lookups by commit, FQBN, and sketch
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS sketch_results ("
+                    "commit_hash TEXT NOT NULL, "
+                    "fqbn TEXT NOT NULL, "
+                    "sketch TEXT NOT NULL, "
+                    "compilation_success INTEGER NOT NULL, "
+                    "sizes TEXT NOT NULL, "
+                    "warnings TEXT, "
+                    "stored REAL NOT NULL, "
+                    "PRIMARY KEY (commit_hash, fqbn, sketch))"
+                )
+                connection.execute("CREATE INDEX IF NOT EXISTS sketch_results_stored ON sketch_results (stored)")
+            self.result_store_connection = connection
+
+        return self.result_store_connection
+
+    def store_sketch_report(self, fqbn, sketch_report):
+        """Queue the current data of the sketch report for addition to the result store by save_result_store().
+
+        Keyword arguments:
+        fqbn -- fully qualified board name of the board the sketch was compiled for
+        sketch_report -- report on the sketch, in the format returned by get_sketch_report()
+        """
+        sizes = [
+            {
+                self.ReportKeys.name: size_report[self.ReportKeys.name],
+                self.ReportKeys.maximum: size_report[self.ReportKeys.maximum],
+                self.ReportKeys.current: size_report[self.ReportKeys.current]
+            }
+            for size_report in sketch_report[self.ReportKeys.sizes]
+        ]
+        if self.ReportKeys.warnings in sketch_report:
+            warnings = json.dumps(obj=sketch_report[self.ReportKeys.warnings][self.ReportKeys.current][
+                self.ReportKeys.absolute])
+        else:
+            warnings = None
+
+        self.result_store_rows.append((fqbn, sketch_report[self.ReportKeys.name],
+                                       sketch_report[self.ReportKeys.compilation_success], json.dumps(obj=sizes),
+                                       warnings))
+
+    def get_stored_sketch_reports(self, commit_hash, key_list):
+        """Return the reports on the sketches at the commit from the result store, keyed by FQBN and sketch name. The
+        reports only contain the current data of the sketches.
+
+        Keyword arguments:
+        commit_hash -- hash of the commit
+        key_list -- list of tuples of the FQBN and sketch name of each sketch to look up
+        """
+        stored_sketch_reports = {}
+        connection = self.get_result_store_connection()
+        for fqbn, sketch in key_list:
+            row = connection.execute(
+                "SELECT compilation_success, sizes, warnings FROM sketch_results "
+                "WHERE commit_hash = ? AND fqbn = ? AND sketch = ?",
+                (commit_hash, fqbn, sketch)
+            ).fetchone()
+            if row is None:
+                continue
+
+            compilation_success, sizes, warnings = row
+            sketch_report = {
+                self.ReportKeys.name: sketch,
+                self.ReportKeys.compilation_success: bool(compilation_success),
+                self.ReportKeys.sizes: json.loads(sizes)
+            }
+            if warnings is not None:
+                sketch_report[self.ReportKeys.warnings] = {
+                    self.ReportKeys.current: {self.ReportKeys.absolute: json.loads(warnings)}
+                }
+            stored_sketch_reports[(fqbn, sketch)] = sketch_report
+
+        self.verbose_print("Found", len(stored_sketch_reports), "of", len(key_list),
+                           "sketches in the result store at commit", commit_hash)
+
+        return stored_sketch_reports
+
+    def save_result_store(self):
+        """Add the data of the sketches queued by store_sketch_report() to the result store, as the data of the sketches
+        at the commit of the sketches report, and delete the data stored longer ago than the retention time. The
+        connection to the result store is closed afterwards.
+        """
+        if self.result_store_path is None:
+            return
+
+        stored = time.time()
+        # The commit matches the commit_hash of the sketches report, so the data can be found by later runs which use
+        # this commit as their deltas base ref
+        commit_hash = get_head_commit_hash()
+        connection = self.get_result_store_connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO sketch_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(commit_hash, *row, stored) for row in self.result_store_rows]
+            )
+            pruned_row_count = connection.execute(
+                "DELETE FROM sketch_results WHERE stored < ?",
+                (stored - self.result_store_retention * 24 * 60 * 60,)
+            ).rowcount
+        connection.close()
+        self.result_store_connection = None
+        self.result_store_rows = []
+
+        self.verbose_print("Removed", pruned_row_count, "expired entries from the result store")
+
+    def read_sketches_report_file(self, path):
+        """Return the contents of a sketches report file, or None if the file doesn't exist or is not a valid report.
+
+        Keyword arguments:
+        path -- path of the report file
+        """
+        try:
+            with open(file=path, encoding="utf-8") as report_file:
+                sketches_report = json.load(fp=report_file)
+        except (OSError, ValueError):
+            return None
+
+        if (
+            not isinstance(sketches_report, dict)
+            or self.ReportKeys.commit_hash not in sketches_report
+            or not isinstance(sketches_report.get(self.ReportKeys.boards), list)
+        ):
+            return None
+
+        return sketches_report
+
+    def get_previous_compilation_result_list(self, compilation_result_list, previous_sketch_report_list):
+        """Compile the sketches at the deltas base ref and return the list of objects returned by compile_sketch(), in
+        the same order as compilation_result_list. The list contains None for each sketch that doesn't need a deltas
+        base ref compilation.
+
+        Keyword arguments:
+        compilation_result_list -- list of objects returned by compile_sketch() for the compilations at the head ref
+        previous_sketch_report_list -- list returned by get_previous_sketch_report_list(). The sketches which have a
+                                       previous sketch report are not compiled.
+        """
+        previous_compilation_result_list = [None for _ in compilation_result_list]
+        if not self.enable_deltas_report:
+            return previous_compilation_result_list
+
+        deltas_index_list = []
+        for index, compilation_result in enumerate(compilation_result_list):
+            # There is no use in comparing against a failed compilation
+            if not compilation_result.success or previous_sketch_report_list[index] is not None:
+                continue
+
+            if self.is_affected_by_deltas_changes(sketch_path=compilation_result.sketch, fqbn=compilation_result.fqbn):
+                deltas_index_list.append(index)
+            else:
+                # The compilation at the deltas base ref would be the same as at the head ref
+                previous_compilation_result_list[index] = compilation_result
+        if not deltas_index_list:
+            return previous_compilation_result_list
+
+        deltas_base_compilation_result_list = self.compile_deltas_base_sketch_list(
+            compilation_list=[{"sketch_path": compilation_result_list[index].sketch,
+                               "fqbn": compilation_result_list[index].fqbn}
+                              for index in deltas_index_list]
+        )
+        for index, previous_compilation_result in zip(deltas_index_list, deltas_base_compilation_result_list):
+            previous_compilation_result_list[index] = previous_compilation_result
+
+        return previous_compilation_result_list
+
+    def compile_sketch_list_with_deltas_base(self, compilation_list, previous_sketch_report_list):
+        """Compile the sketches at the head ref and the deltas base ref at the same time, each with half of the jobs and
+        its own build folders. Return a tuple of the list of objects returned by compile_sketch() for the head ref
+        compilations and the list of the previous compilation results in the format returned by
+        get_previous_compilation_result_list(), both in the same order as compilation_list.
+
+        Unlike get_previous_compilation_result_list(), this compiles the sketches at the base ref even when they fail to
+        compile at the head ref, since the results are not known in advance.
+
+        Keyword arguments:
+        compilation_list -- list of dictionaries defining the compilations, in the format used by compile_sketch_list()
+        previous_sketch_report_list -- list returned by get_previous_sketch_report_list(). The sketches which have a
+                                       previous sketch report are not compiled at the deltas base ref.
+        """
+        deltas_index_list = []
+        unaffected_index_list = []
+        for index, compilation in enumerate(compilation_list):
+            if previous_sketch_report_list[index] is not None:
+                continue
+
+            if self.is_affected_by_deltas_changes(sketch_path=compilation["sketch_path"], fqbn=compilation["fqbn"]):
+                deltas_index_list.append(index)
+            else:
+                unaffected_index_list.append(index)
+
+        if not deltas_index_list:
+            # All the data of the deltas base ref is already available, so the head ref gets all the jobs
+            compilation_result_list = self.compile_sketch_list(
+                compilation_list=compilation_list,
+                clean_build_cache=self.enable_warnings_report and not self.reuse_core_build_cache,
+                replay_core_warnings=self.enable_warnings_report and self.reuse_core_build_cache
+            )
+            return compilation_result_list, self.get_unaffected_compilation_result_list(
+                compilation_result_list=compilation_result_list,
+                unaffected_index_list=unaffected_index_list
+            )
+
+        deltas_base_jobs = self.jobs // 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            deltas_base_future = executor.submit(self.compile_deltas_base_sketch_list,
+                                                 compilation_list=[compilation_list[index]
+                                                                   for index in deltas_index_list],
+                                                 jobs=deltas_base_jobs)
+            compilation_result_list = self.compile_sketch_list(
+                compilation_list=compilation_list,
+                clean_build_cache=self.enable_warnings_report and not self.reuse_core_build_cache,
+                replay_core_warnings=self.enable_warnings_report and self.reuse_core_build_cache,
+                jobs=self.jobs - deltas_base_jobs
+            )
+            deltas_base_compilation_result_list = deltas_base_future.result()
+
+        previous_compilation_result_list = self.get_unaffected_compilation_result_list(
+            compilation_result_list=compilation_result_list,
+            unaffected_index_list=unaffected_index_list
+        )
+        for index, previous_compilation_result in zip(deltas_index_list, deltas_base_compilation_result_list):
+            # There is no use in comparing against a failed compilation
+            if compilation_result_list[index].success:
+                previous_compilation_result_list[index] = previous_compilation_result
+
+        return compilation_result_list, previous_compilation_result_list
+
+    def get_unaffected_compilation_result_list(self, compilation_result_list, unaffected_index_list):
+        """Return the list of the previous compilation results in the format returned by
+        get_previous_compilation_result_list(), with the head ref compilation result as the previous compilation result
+        of each successful compilation of a sketch which is not affected by the changes since the deltas base ref.
+
+        Keyword arguments:
+        compilation_result_list -- list of objects returned by compile_sketch() for the compilations at the head ref
+        unaffected_index_list -- indexes in compilation_result_list of the compilations which are not affected by the
+                                 changes
+        """
+        previous_compilation_result_list = [None for _ in compilation_result_list]
+        for index in unaffected_index_list:
+            # There is no use in comparing against a failed compilation
+            if compilation_result_list[index].success:
+                previous_compilation_result_list[index] = compilation_result_list[index]
+
+        return previous_compilation_result_list
+
+    def get_deltas_changed_paths(self):
+        """Return the set of paths, relative to the workspace, of the files which differ between the deltas base ref and
+        the workspace. The paths are only determined on the first call.
+        """
+        if self.deltas_changed_paths is None:
+            repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
+            # Only the trees are compared, so the contents of the files at the base ref are not needed. Renames are
+            # listed as a deletion and an addition, since their detection would require the contents.
+            diff = repository.git.diff("--name-only", "--no-renames", self.fetch_deltas_base_ref())
+            self.deltas_changed_paths = {pathlib.PurePath(changed_path) for changed_path in diff.splitlines()}
+
+        return self.deltas_changed_paths
+
+    def is_affected_by_deltas_changes(self, sketch_path, fqbn):
+        """Return whether the compilation of the sketch might differ between the deltas base ref and the head ref. This
+        is the case if any file in the sketch folder, or in the source of a dependency installed from a path in the
+        workspace, has changed. Only the files of a library source which might be compiled are considered. The decision
+        is logged, so it can be audited.
+
+        Keyword arguments:
+        sketch_path -- path of the sketch
+        fqbn -- fully qualified board name of the board the sketch is compiled for
+        """
+        sketch_folder_path = absolute_path(path=sketch_path)
+        if sketch_folder_path.is_file():
+            sketch_folder_path = sketch_folder_path.parent
+
+        # Each source is paired with whether it is the source of a library
+        source_paths = [(path_relative_to_workspace(path=sketch_folder_path), False)]
+        for destination_path, source_path in self.path_installations.items():
+            source_paths.append((path_relative_to_workspace(path=source_path),
+                                 self.libraries_path in destination_path.parents))
+        for changed_path in sorted(self.get_deltas_changed_paths()):
+            for source_path, is_library in source_paths:
+                # Sources outside the workspace are the same at both refs
+                if not source_path.is_absolute() and (
+                    changed_path == source_path or source_path in changed_path.parents
+                ) and (
+                    not is_library or self.is_library_compilation_path(library_path=source_path,
+                                                                       file_path=changed_path)
+                ):
+                    print("Sketch:", path_relative_to_workspace(path=sketch_path), "for board:", fqbn,
+                          "is affected by the change to:", changed_path,
+                          "so it will be compiled at the deltas base ref")
+                    return True
+
+        print("Sketch:", path_relative_to_workspace(path=sketch_path), "for board:", fqbn,
+              "is not affected by the changes since the deltas base ref, so its data at the head ref is used for the "
+              "base ref")
+        return False
+
+    def is_library_compilation_path(self, library_path, file_path):
+        """Return whether the file might affect the compilation of the library installed from a path. The
+        documentation, the CI configuration, and the example sketches of the library are not compiled along with it.
+        This matters for the common installation of the repository root as a library, where any change would otherwise
+        affect every sketch.
+
+        Keyword arguments:
+        library_path -- path of the library source. Relative paths are relative to the workspace.
+        file_path -- path of the file in the library, relative to the workspace if library_path is relative
+        """
+        relative_path = file_path.relative_to(library_path)
+        if relative_path == pathlib.PurePath("library.properties") or relative_path.parts[:1] == ("src",):
+            return True
+
+        # The compilation of a sketch is not affected by the other sketches. The parents exclude the library root.
+        for parent_path in list(relative_path.parents)[:-1]:
+            if path_is_sketch(path=absolute_path(path=library_path.joinpath(parent_path))):
+                return False
+
+        return relative_path.suffix in self.library_source_file_extensions
+
+    def compile_deltas_base_sketch_list(self, compilation_list, jobs=None):
+        """Compile the sketches at the deltas base ref and return the list of objects returned by compile_sketch(), in
+        the same order as compilation_list. The results are identified by the sketch paths in the workspace.
+
+        Keyword arguments:
+        compilation_list -- list of dictionaries defining the compilations, in the format used by compile_sketch_list(),
+                            with the sketch paths in the workspace
+        jobs -- maximum number of concurrent compilations. Set to None to use the jobs input. (default None)
+        """
+        # All compilations at the base ref are done in a separate worktree, so the head ref tree is never touched
+        worktree_path = self.create_deltas_base_worktree()
+        try:
+            deltas_base_compilation_result_list = self.compile_sketch_list(
+                compilation_list=[
+                    {
+                        "sketch_path": path_in_worktree(path=compilation["sketch_path"], worktree_path=worktree_path),
+                        "fqbn": compilation["fqbn"]
+                    }
+                    for compilation in compilation_list
+                ],
+                clean_build_cache=self.enable_warnings_report and not self.reuse_core_build_cache,
+                replay_core_warnings=self.enable_warnings_report and self.reuse_core_build_cache,
+                environment=self.get_deltas_base_environment(worktree_path=worktree_path),
+                jobs=jobs
+            )
+        finally:
+            self.remove_deltas_base_worktree(worktree_path=worktree_path)
+
+        for compilation, deltas_base_compilation_result in zip(compilation_list, deltas_base_compilation_result_list):
+            # Identify the result by the sketch path in the workspace rather than the temporary worktree path
+            deltas_base_compilation_result.sketch = compilation["sketch_path"]
+
+        return deltas_base_compilation_result_list
+
+    def create_deltas_base_worktree(self):
+        """Check out the base ref of the deltas comparison to a Git worktree and return its path."""
+        repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
+
+        worktree_path = pathlib.Path(tempfile.mkdtemp(dir=self.temporary_directory.name, prefix="deltas-base-"))
+        deltas_base_commit = self.fetch_deltas_base_ref()
+        # The file contents omitted by the partial fetch are fetched from origin on demand by the checkout
+        self.enable_workspace_partial_clone(repository=repository)
+        try:
+            repository.git.worktree("add", "--detach", worktree_path, deltas_base_commit)
+            git.Repo(path=worktree_path).git.submodule("update", "--init", "--recursive", "--jobs", str(self.jobs))
+        finally:
+            self.restore_workspace_git_config()
+
+        return worktree_path
+
+    def fetch_deltas_base_ref(self):
+        """Fetch the base ref of the deltas comparison from the origin remote and return the hash of its commit. The ref
+        is only fetched on the first call.
+        """
+        if self.deltas_base_commit is None:
+            repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
+            # Make a partial fetch without any file contents. The contents of the files are fetched on demand by the
+            # checkout of the worktree.
+            self.enable_workspace_partial_clone(repository=repository)
+            fetch_arguments = ["--depth", "1", "--filter=blob:none", "--no-tags", "--recurse-submodules=no"]
+            if self.verbose:
+                fetch_arguments.append("--verbose")
+            repository.git.fetch(*fetch_arguments, "origin", self.deltas_base_ref)
+            # The ref is resolved from the fetch, because a local branch of the same name may be out of date
+            self.deltas_base_commit = repository.rev_parse("FETCH_HEAD").hexsha
+
+        return self.deltas_base_commit
+
+    def enable_workspace_partial_clone(self, repository):
+        """Configure the workspace repository for partial fetches from the origin remote. The original configuration is
+        saved, so that restore_workspace_git_config() can restore it once the fetched files have been checked out.
+
+        Keyword arguments:
+        repository -- git.Repo object of the workspace repository
+        """
+        config_path = get_git_config_path(repository=repository)
+        if self.workspace_git_config is None:
+            self.workspace_git_config = config_path.read_bytes()
+        # Git before 2.25 only fetches the omitted file contents on demand if the extension is set in the configuration
+        # file of the repository, so the configuration can't be passed via the command line
+        with repository.config_writer() as config_writer:
+            config_writer.set_value("core", "repositoryformatversion", 1)
+            config_writer.set_value("extensions", "partialClone", "origin")
+
+    def restore_workspace_git_config(self):
+        """Restore the configuration of the workspace repository saved by enable_workspace_partial_clone(), so that the
+        configuration for partial fetches is not left behind in the workspace.
+        """
+        if self.workspace_git_config is None:
+            return
+
+        repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
+        get_git_config_path(repository=repository).write_bytes(self.workspace_git_config)
+        self.workspace_git_config = None
+
+    def remove_deltas_base_worktree(self, worktree_path):
+        """Remove the worktree created by create_deltas_base_worktree().
+
+        Keyword arguments:
+        worktree_path -- path of the worktree
+        """
+        repository = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
+        repository.git.worktree("remove", "--force", worktree_path)
+
+    def get_deltas_base_environment(self, worktree_path):
+        """Return the environment variables for running Arduino CLI at the deltas base ref. Dependencies installed from
+        paths in the workspace are replaced by the equivalent paths in the worktree by running Arduino CLI with overlays
+        of the user and data directories.
+
+        Keyword arguments:
+        worktree_path -- path of the worktree the deltas base ref is checked out to
+        """
+        replacement_paths = {}
+        for destination_path, source_path in self.path_installations.items():
+            worktree_source_path = path_in_worktree(path=source_path, worktree_path=worktree_path)
+            if worktree_source_path != source_path:
+                replacement_paths[destination_path] = worktree_source_path
+
+        environment = os.environ.copy()
+        for environment_variable, directory_path in [
+            ("ARDUINO_DIRECTORIES_USER", self.arduino_cli_user_directory_path),
+            ("ARDUINO_DIRECTORIES_DATA", self.arduino_cli_data_directory_path)
+        ]:
+            directory_replacement_paths = {
+                destination_path: source_path for destination_path, source_path in replacement_paths.items()
+                if directory_path in destination_path.parents
+            }
+            if directory_replacement_paths:
+                overlay_path = pathlib.Path(tempfile.mkdtemp(dir=self.temporary_directory.name,
+                                                             prefix="deltas-base-overlay-"))
+                create_overlay(source_path=directory_path,
+                               overlay_path=overlay_path,
+                               replacement_paths=directory_replacement_paths)
+                environment[environment_variable] = str(overlay_path)
+
+        return environment
+
+    def get_sketch_report(self, compilation_result, previous_compilation_result=None, previous_sketch_report=None):
+        """Return a dictionary containing data on the sketch.
+
+        Keyword arguments:
+        compilation_result -- object returned by compile_sketch()
+        previous_compilation_result -- object returned by compile_sketch() for the compilation at the deltas base ref,
+                                       or None if the sketch was not compiled at the base ref (default None)
+        previous_sketch_report -- report on the sketch at the deltas base ref, in the format returned by this function,
+                                  which is used in place of previous_compilation_result. None if there is no such
+                                  report. (default None)
+        """
+        current_sizes = self.get_sizes_from_output(compilation_result=compilation_result)
+        if self.enable_warnings_report:
+            current_warning_count = self.get_warning_count_from_output(compilation_result=compilation_result)
+        else:
+            current_warning_count = None
+        previous_sizes = None
+        previous_warning_count = None
+        if (
+            previous_sketch_report is not None
+            and self.do_deltas_report(compilation_result=compilation_result,
+                                      current_sizes=current_sizes,
+                                      current_warnings=current_warning_count)
+        ):
+            print("Using the report on the previous version of sketch to determine memory usage change")
+            previous_sizes = self.get_sizes_from_sketch_report(sketch_report=previous_sketch_report,
+                                                               current_sizes=current_sizes)
+            if self.enable_warnings_report:
+                previous_warning_count = (
+                    previous_sketch_report[self.ReportKeys.warnings][self.ReportKeys.current][self.ReportKeys.absolute]
+                )
+        elif (
+            previous_compilation_result is not None
+            and self.do_deltas_report(compilation_result=compilation_result,
+                                      current_sizes=current_sizes,
+                                      current_warnings=current_warning_count)
+        ):
+            # Get data for the sketch at the base ref
+            if previous_compilation_result is compilation_result:
+                print("The sketch is not affected by the changes, so the memory usage is unchanged")
+            else:
+                print("Compiling previous version of sketch to determine memory usage change")
+                self.print_compilation_result(compilation_result=previous_compilation_result)
+
+            previous_sizes = self.get_sizes_from_output(compilation_result=previous_compilation_result)
+            if self.enable_warnings_report:
+                previous_warning_count = (
+                    self.get_warning_count_from_output(compilation_result=previous_compilation_result)
+                )
+
+        # Add global data for sketch to report
+        sketch_report = {
+            self.ReportKeys.name: str(path_relative_to_workspace(path=compilation_result.sketch)),
+            self.ReportKeys.compilation_success: compilation_result.success,
+            self.ReportKeys.sizes: self.get_sizes_report(current_sizes=current_sizes,
+                                                         previous_sizes=previous_sizes),
+        }
+        if self.enable_warnings_report:
+            sketch_report[self.ReportKeys.warnings] = (
+                self.get_warnings_report(current_warnings=current_warning_count,
+                                         previous_warnings=previous_warning_count)
+            )
+
+        if self.result_store_path is not None:
+            self.store_sketch_report(fqbn=compilation_result.fqbn, sketch_report=sketch_report)
+
+        return sketch_report
+
+    def get_sizes_from_output(self, compilation_result):
+        """Parse the stdout from the compilation process and return a list containing memory usage data.
+
+        Keyword arguments:
+        compilation_result -- object returned by compile_sketch()
+        """
+        memory_types = [
+            {
+                "name": "flash",
+                # Use capturing parentheses to identify the location of the data in the regular expression
+                "regex": {
+                    # The regular expression for the absolute memory usage
+                    self.ReportKeys.absolute: r"Sketch uses ([0-9]+) bytes .*of program storage space\.",
+                    # The regular expression for the total memory
+                    self.ReportKeys.maximum: (
+                        r"Sketch uses [0-9]+ bytes .*of program storage space\. Maximum is ([0-9]+) bytes."
+                    )
+                }
+            },
+            {
+                "name": "RAM for global variables",
+                "regex": {
+                    self.ReportKeys.absolute: r"Global variables use ([0-9]+) bytes .*of dynamic memory",
+                    self.ReportKeys.maximum: (
+                        r"Global variables use [0-9]+ bytes .*of dynamic memory.*\. Maximum is ([0-9]+) bytes."
+                    )
+                }
+            }
+        ]
+
+        sizes = []
+        for memory_type in memory_types:
+            size = {
+                self.ReportKeys.name: memory_type["name"],
+                # Set default memory usage value, to be used if memory usage can't be determined
+                self.ReportKeys.absolute: self.not_applicable_indicator,
+                self.ReportKeys.maximum: self.not_applicable_indicator,
+                self.ReportKeys.relative: self.not_applicable_indicator
+            }
+
+            if compilation_result.success is True:
+                # Determine memory usage of the sketch by parsing Arduino CLI's output
+                size_data = self.get_size_data_from_output(compilation_output=compilation_result.output,
+                                                           memory_type=memory_type,
+                                                           size_data_type=self.ReportKeys.absolute)
+                if size_data:
+                    size[self.ReportKeys.absolute] = size_data
+
+                    size_data = self.get_size_data_from_output(compilation_output=compilation_result.output,
+                                                               memory_type=memory_type,
+                                                               size_data_type=self.ReportKeys.maximum)
+                    if size_data:
+                        size[self.ReportKeys.maximum] = size_data
+
+                        size[self.ReportKeys.relative] = round(
+                            (100 * size[self.ReportKeys.absolute] / size[self.ReportKeys.maximum]),
+                            self.relative_size_report_decimal_places
+                        )
+
+            sizes.append(size)
+
+        return sizes
+
+    def get_size_data_from_output(self, compilation_output, memory_type, size_data_type):
+        """Parse the stdout from the compilation process for a specific datum and return it, or None if not found.
+
+        Keyword arguments:
+        compilation_output -- stdout from the compilation process
+        memory_type -- dictionary defining a memory type
+        size_data_type -- the type of size data to get
+        """
+        size_data = None
+        regex_match = re.search(pattern=memory_type["regex"][size_data_type], string=compilation_output)
+        if regex_match:
+            size_data = int(regex_match.group(1))
+        else:
+            # If any of the following:
+            # - recipe.size.regex is not defined in platform.txt
+            # - upload.maximum_size is not defined in boards.txt
+            # flash usage will not be reported in the Arduino CLI output
+            # If any of the following:
+            # - recipe.size.regex.data is not defined in platform.txt (e.g., Arduino SAM Boards)
+            # - recipe.size.regex is not defined in platform.txt
+            # - upload.maximum_size is not defined in boards.txt
+            # RAM usage will not be reported in the Arduino CLI output
+            self.verbose_print(
+                "::warning::Unable to determine the: \"" + size_data_type + "\" value for memory type: \""
+                + memory_type["name"]
+                + "\". The board's platform may not have been configured to provide this information."
+            )
+
+        return size_data
+
+    def get_sizes_from_sketch_report(self, sketch_report, current_sizes):
+        """Return the memory usage data from the current data of a sketch report, in the format and order of
+        current_sizes. The data of memory types which are not in the report are "N/A".
+
+        Keyword arguments:
+        sketch_report -- report on the sketch, in the format returned by get_sketch_report()
+        current_sizes -- memory usage data from the compilation at the head ref
+        """
+        size_reports = {size_report[self.ReportKeys.name]: size_report
+                        for size_report in sketch_report[self.ReportKeys.sizes]}
+        sizes = []
+        for current_size in current_sizes:
+            size = {
+                self.ReportKeys.name: current_size[self.ReportKeys.name],
+                self.ReportKeys.absolute: self.not_applicable_indicator,
+                self.ReportKeys.maximum: self.not_applicable_indicator,
+                self.ReportKeys.relative: self.not_applicable_indicator
+            }
+            if current_size[self.ReportKeys.name] in size_reports:
+                size_report = size_reports[current_size[self.ReportKeys.name]]
+                size[self.ReportKeys.absolute] = size_report[self.ReportKeys.current][self.ReportKeys.absolute]
+                size[self.ReportKeys.maximum] = size_report[self.ReportKeys.maximum]
+                size[self.ReportKeys.relative] = size_report[self.ReportKeys.current][self.ReportKeys.relative]
+            sizes.append(size)
+
+        return sizes
+
+    def get_warning_count_from_output(self, compilation_result):
+        """Parse the stdout from the compilation process and return the number of compiler warnings. Since the
+        information is likely not relevant in that case, "N/A" is returned if compilation failed.
+
+        Keyword arguments:
+        compilation_result -- object returned by compile_sketch()
+        """
+        if compilation_result.success is True:
+            compiler_warning_regex = ":[0-9]+:[0-9]+: warning:"
+            warning_count = len(re.findall(pattern=compiler_warning_regex, string=compilation_result.output))
+        else:
+            warning_count = self.not_applicable_indicator
+
+        return warning_count
+
+    def do_deltas_report(self, compilation_result, current_sizes, current_warnings):
+        """Return whether size deltas reporting is enabled.
+
+        Keyword arguments:
+        compilation_result -- object returned by compile_sketch()
+        current_sizes -- memory usage data from the compilation
+        current_warnings -- compiler warning count
+        """
+        return (
+            self.enable_deltas_report
+            and compilation_result.success
+            and (
+                any(size.get(self.ReportKeys.absolute) != self.not_applicable_indicator for
+                    size in current_sizes)
+                or (
+                    current_warnings is not None
+                    and current_warnings != self.not_applicable_indicator
+                )
+            )
+        )
+
+    def get_sizes_report(self, current_sizes, previous_sizes):
         """Return a list containing all memory usage data assembled.
 
         Keyword arguments:
@@ -1206,11 +3610,33 @@ class CompileSketches:
 
         return warnings_report
 
-    def get_sketches_report(self, sketch_report_list):
+    def get_board_report(self, fqbn, sketch_report_list):
+        """Return the dictionary containing data on all sketch compilations for a board
+
+        Keyword arguments:
+        fqbn -- fully qualified board name of the board the sketches were compiled for
+        sketch_report_list -- list of reports from each sketch compilation for the board
+        """
+        board_report = {
+            self.ReportKeys.board: fqbn,
+            self.ReportKeys.sketches: sketch_report_list
+        }
+
+        sizes_summary_report = self.get_sizes_summary_report(sketch_report_list=sketch_report_list)
+        if sizes_summary_report:
+            board_report[self.ReportKeys.sizes] = sizes_summary_report
+
+        warnings_summary_report = self.get_warnings_summary_report(sketch_report_list=sketch_report_list)
+        if warnings_summary_report:
+            board_report[self.ReportKeys.warnings] = warnings_summary_report
+
+        return board_report
+
+    def get_sketches_report(self, board_report_list):
         """Return the dictionary containing data on all sketch compilations for each board
 
         Keyword arguments:
-        sketch_report_list -- list of reports from each sketch compilation
+        board_report_list -- list of reports from get_board_report() for each board
         """
         current_git_ref = get_head_commit_hash()
 
@@ -1220,25 +3646,9 @@ class CompileSketches:
                                          + os.environ["GITHUB_REPOSITORY"]
                                          + "/commit/"
                                          + current_git_ref),
-            # The action is currently designed to only compile for one board per run, so the boards list will only have
-            # a single element, but this provides a report format that can accommodate the possible addition of multiple
-            # boards support
-            self.ReportKeys.boards: [
-                {
-                    self.ReportKeys.board: self.fqbn,
-                    self.ReportKeys.sketches: sketch_report_list
-                }
-            ]
+            self.ReportKeys.boards: board_report_list
         }
 
-        sizes_summary_report = self.get_sizes_summary_report(sketch_report_list=sketch_report_list)
-        if sizes_summary_report:
-            sketches_report[self.ReportKeys.boards][0][self.ReportKeys.sizes] = sizes_summary_report
-
-        warnings_summary_report = self.get_warnings_summary_report(sketch_report_list=sketch_report_list)
-        if warnings_summary_report:
-            sketches_report[self.ReportKeys.boards][0][self.ReportKeys.warnings] = warnings_summary_report
-
         return sketches_report
 
     def get_sizes_summary_report(self, sketch_report_list):
@@ -1397,8 +3807,14 @@ class CompileSketches:
         # Create the report folder
         sketches_report_path.mkdir(parents=True, exist_ok=True)
 
-        # Write the memory usage data to a file named according to the FQBN
-        with open(file=sketches_report_path.joinpath(self.fqbn.replace(":", "-") + ".json"), mode="w",
+        if len(self.boards) == 1:
+            # Write the memory usage data to a file named according to the FQBN
+            sketches_report_file_name = self.boards[0]["fqbn"].replace(":", "-") + ".json"
+        else:
+            # The report contains the data for all the boards
+            sketches_report_file_name = self.multiple_boards_sketches_report_file_name
+
+        with open(file=sketches_report_path.joinpath(sketches_report_file_name), mode="w",
                   encoding="utf-8") as report_file:
             json.dump(obj=sketches_report, fp=report_file, indent=2)
 
@@ -1435,6 +3851,81 @@ def parse_fqbn_arg_input(fqbn_arg):
     return {"fqbn": fqbn, "additional_url": additional_url}
 
 
+def parse_jobs_input(jobs_input):
+    """Return the number of concurrent jobs specified by the string input, or None if the input is invalid.
+
+    Keyword arguments:
+    jobs_input -- a string representing a positive integer. Set to "" to use the number of CPUs.
+    """
+    if jobs_input == "":
+        # os.cpu_count() returns None if the number of CPUs can't be determined
+        return os.cpu_count() or 1
+
+    try:
+        jobs = int(jobs_input)
+    except ValueError:
+        return None
+
+    if jobs < 1:
+        return None
+
+    return jobs
+
+
+def parse_size_input(size_input):
+    """Return the size in megabytes specified by the string input, or None if the input is invalid.
+
+    Keyword arguments:
+    size_input -- a string representing a non-negative integer
+    """
+    try:
+        size = int(size_input)
+    except ValueError:
+        return None
+
+    if size < 0:
+        return None
+
+    return size
+
+
+def parse_duration_input(duration_input):
+    """Return the duration specified by the string input, in the unit of the input, or None if the input is invalid.
+
+    Keyword arguments:
+    duration_input -- a string representing a non-negative integer
+    """
+    try:
+        duration = int(duration_input)
+    except ValueError:
+        return None
+
+    if duration < 0:
+        return None
+
+    return duration
+
+
+def parse_fqbn_input(fqbn_input):
+    """Parse the fqbn input and return a list of dictionaries in the format returned by parse_fqbn_arg_input(), one for
+    each board.
+
+    Keyword arguments:
+    fqbn_input -- either a single FQBN argument in the format accepted by parse_fqbn_arg_input() or a YAML-format list
+                  of them
+    """
+    try:
+        processed_fqbn_input = yaml.load(stream=fqbn_input, Loader=yaml.SafeLoader)
+    except yaml.YAMLError:
+        # The input value was not valid YAML, which occurs when the FQBN and Boards Manager URL are individually quoted
+        processed_fqbn_input = None
+
+    if type(processed_fqbn_input) is list:
+        return [parse_fqbn_arg_input(fqbn_arg=str(fqbn_arg)) for fqbn_arg in processed_fqbn_input]
+
+    return [parse_fqbn_arg_input(fqbn_arg=fqbn_input)]
+
+
 def parse_boolean_input(boolean_input):
     """Return the Boolean value of a string representation.
 
@@ -1451,6 +3942,37 @@ def parse_boolean_input(boolean_input):
     return parsed_boolean_input
 
 
+def parse_required_boolean_input(boolean_input, input_name):
+    """Return the Boolean value of the input, or exit if it is not valid. Inputs with a default value should always be
+    either "true" or "false".
+
+    Keyword arguments:
+    boolean_input -- a string representing a boolean value, case insensitive
+    input_name -- name of the input, for the error message
+    """
+    parsed_boolean_input = parse_boolean_input(boolean_input=boolean_input)
+    if parsed_boolean_input is None:
+        print("::error::Invalid value for", input_name, "input")
+        sys.exit(1)
+
+    return parsed_boolean_input
+
+
+def parse_required_duration_input(duration_input, input_name):
+    """Return the duration specified by the input, in the unit of the input, or exit if it is not valid.
+
+    Keyword arguments:
+    duration_input -- a string representing a non-negative integer
+    input_name -- name of the input, for the error message
+    """
+    duration = parse_duration_input(duration_input=duration_input)
+    if duration is None:
+        print("::error::Invalid value for", input_name, "input")
+        sys.exit(1)
+
+    return duration
+
+
 def get_parent_commit_ref():
     """Return the Git ref of the immediate parent commit."""
     repository_object = git.Repo(path=os.environ["GITHUB_WORKSPACE"])
@@ -1474,6 +3996,622 @@ def path_relative_to_workspace(path):
     return relative_path
 
 
+def get_git_config_path(repository):
+    """Return the path of the configuration file of the repository, which is shared by all its worktrees.
+
+    Keyword arguments:
+    repository -- git.Repo object of the repository
+    """
+    return pathlib.Path(repository.working_dir, repository.git.rev_parse("--git-common-dir"), "config")
+
+
+def path_in_worktree(path, worktree_path):
+    """Return the equivalent of a path in the workspace in a worktree of the repository. Paths outside the workspace are
+    returned unchanged.
+
+    Keyword arguments:
+    path -- the path in the workspace
+    worktree_path -- path of the worktree
+    """
+    relative_path = path_relative_to_workspace(path=path)
+    if relative_path.is_absolute():
+        # Path is outside workspace
+        return path
+
+    return pathlib.Path(worktree_path, relative_path)
+
+
+def create_overlay(source_path, overlay_path, replacement_paths):
+    """Populate the overlay folder with symlinks to the contents of the source folder, except for the paths under the
+    source folder in replacement_paths, which are symlinked to the associated replacement instead. The overlay can then
+    be used in place of the source folder without modifying the source folder.
+
+    Keyword arguments:
+    source_path -- path of the folder to overlay
+    overlay_path -- path of the overlay folder
+    replacement_paths -- dictionary of replacement paths, keyed by the path under source_path they replace
+    """
+    overlay_path.mkdir(parents=True, exist_ok=True)
+    for source_child_path in source_path.iterdir():
+        overlay_child_path = overlay_path.joinpath(source_child_path.name)
+        if source_child_path in replacement_paths:
+            replacement_path = replacement_paths[source_child_path]
+            overlay_child_path.symlink_to(target=replacement_path, target_is_directory=replacement_path.is_dir())
+        elif any(source_child_path in replaced_path.parents for replaced_path in replacement_paths):
+            # Only the folders containing replacements are recreated, everything else is linked
+            create_overlay(source_path=source_child_path,
+                           overlay_path=overlay_child_path,
+                           replacement_paths=replacement_paths)
+        else:
+            overlay_child_path.symlink_to(target=source_child_path, target_is_directory=source_child_path.is_dir())
+
+
+def parse_checksum(checksum):
+    """Return the lowercase hexadecimal hash from the checksum, or None if the checksum is invalid.
+
+    Keyword arguments:
+    checksum -- a string in the format "SHA-256:<hash>", the same format used by the Arduino package indexes
+    """
+    match = re.fullmatch(pattern=r"SHA-256:([0-9a-fA-F]{64})", string=str(checksum).strip())
+    if match is None:
+        return None
+
+    return match.group(1).lower()
+
+
+def get_library_manager_folder_name(library_release):
+    """Return the name of the folder Arduino CLI's Library Manager installs the library release to.
+
+    Keyword arguments:
+    library_release -- Library Manager index entry for the library release
+    """
+    return re.sub(pattern=r"[^a-zA-Z0-9_.-]", repl="_", string=library_release["name"])
+
+
+def get_repository_receipt(url, source_path, submodules, commit):
+    """Return the receipt identifying an installation from a repository.
+
+    Keyword arguments:
+    url -- URL of the repository
+    source_path -- path relative to the root of the repository the installation is from
+    submodules -- tuple of the paths of the updated submodules, or None if all submodules were updated
+    commit -- hash of the commit the installation is from
+    """
+    return {"source-url": url,
+            "source-path": source_path,
+            "submodules": None if submodules is None else list(submodules),
+            "commit": commit}
+
+
+def get_download_receipt(url, source_path, checksum):
+    """Return the receipt identifying an installation from an archive download.
+
+    Keyword arguments:
+    url -- URL of the archive
+    source_path -- path relative to the root folder of the archive the installation is from
+    checksum -- checksum of the archive in the format "SHA-256:<hash>", or None if it is not known
+    """
+    return {"source-url": url, "source-path": source_path, "checksum": checksum}
+
+
+def copy_installation(source_path, destination_path):
+    """Copy the file or folder, hard linking the files where possible. The Git metadata of a repository is not copied.
+
+    Keyword arguments:
+    source_path -- path of the file or folder to copy
+    destination_path -- path to copy to
+    """
+    if not source_path.is_dir():
+        link_or_copy_file(source_file_path=source_path, destination_file_path=destination_path)
+        return
+
+    shutil.copytree(src=source_path,
+                    dst=destination_path,
+                    symlinks=True,
+                    ignore=lambda folder, names: [".git"] if pathlib.Path(folder) == source_path else [],
+                    copy_function=lambda source_file_path, destination_file_path: link_or_copy_file(
+                        source_file_path=source_file_path,
+                        destination_file_path=destination_file_path
+                    ))
+
+
+def link_or_copy_file(source_file_path, destination_file_path):
+    """Hard link the file, or copy it if that is not possible (e.g., the paths are on different file systems), and
+    return the destination path.
+
+    Keyword arguments:
+    source_file_path -- path of the file
+    destination_file_path -- path to link or copy the file to
+    """
+    try:
+        os.link(src=source_file_path, dst=destination_file_path)
+    except OSError:
+        shutil.copy2(src=source_file_path, dst=destination_file_path)
+
+    return destination_file_path
+
+
+def copy_arduino_data_directory(source_path, destination_path):
+    """Copy the Arduino CLI data directory, except for the downloaded archives, replacing existing files. The files of
+    the installed packages are never modified in place, so they are hard linked where possible, while the index files
+    are copied.
+
+    Keyword arguments:
+    source_path -- path of the data directory to copy
+    destination_path -- path to copy the data directory to
+    """
+    packages_path = source_path.joinpath("packages")
+
+    def copy_file(source_file_path, destination_file_path):
+        # Replace, rather than write to, the destination file, which may be a hard link to the source of a snapshot
+        if os.path.lexists(destination_file_path):
+            os.remove(destination_file_path)
+        if packages_path in pathlib.Path(source_file_path).parents:
+            return link_or_copy_file(source_file_path=source_file_path, destination_file_path=destination_file_path)
+        return shutil.copy2(src=source_file_path, dst=destination_file_path)
+
+    shutil.copytree(src=source_path,
+                    dst=destination_path,
+                    symlinks=True,
+                    ignore=lambda folder, names: ["staging"] if pathlib.Path(folder) == source_path else [],
+                    copy_function=copy_file,
+                    dirs_exist_ok=True)
+
+
+def write_response_to_file(response, file_path):
+    """Write the body of the response to the file, computing its SHA-256 hash while it is written, and return the hash.
+
+    Keyword arguments:
+    response -- the response returned by urllib.request.urlopen()
+    file_path -- path to write the file to
+    """
+    file_hash = hashlib.sha256()
+    # https://stackoverflow.com/a/38358646
+    with open(file=str(file_path), mode="wb") as out_file:
+        block_size = 1024 * 1024
+        while True:
+            block = response.read(block_size)
+            if not block:
+                break
+            out_file.write(block)
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def get_board_manager_index_file_name(url):
+    """Return the name of the file Arduino CLI saves the Board Manager index from the URL to.
+
+    Keyword arguments:
+    url -- URL of the Board Manager index
+    """
+    return pathlib.PurePosixPath(urllib.parse.urlparse(url).path).name
+
+
+def get_url_validators(url, validators=None):
+    """Return a dictionary of the ETag and Last-Modified validators of the current version of the file at the URL, or
+    None if the server reports that the file hasn't changed since the version identified by the validators.
+
+    Keyword arguments:
+    url -- URL of the file
+    validators -- dictionary of validators previously returned for the URL. Set to None to get the validators
+                  unconditionally. (default None)
+    """
+    request = urllib.request.Request(url=url, method="HEAD")
+    if validators is not None:
+        if validators.get("etag") is not None:
+            request.add_header(key="If-None-Match", val=validators["etag"])
+        if validators.get("last_modified") is not None:
+            request.add_header(key="If-Modified-Since", val=validators["last_modified"])
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    except urllib.error.HTTPError as exception:
+        if exception.code == 304:
+            return None
+        raise
+
+
+def get_range_validator(headers):
+    """Return the value to use for the If-Range header of range requests for the file, or None if the response headers
+    don't provide a suitable validator.
+
+    Keyword arguments:
+    headers -- headers of the response to the download request
+    """
+    etag = headers.get("ETag")
+    # Weak ETags can't be used with If-Range
+    if etag is not None and not etag.startswith("W/"):
+        return etag
+
+    return headers.get("Last-Modified")
+
+
+def download_ranges(url, validator, file_path, file_size, range_count):
+    """Download the file in byte ranges, concurrently, and return whether all ranges were downloaded successfully.
+
+    Keyword arguments:
+    url -- URL to download the file from
+    validator -- ETag or Last-Modified value of the file, used to make sure all ranges are from the same version of the
+                 file
+    file_path -- path to write the file to
+    file_size -- size of the file in bytes
+    range_count -- number of ranges to split the file into
+    """
+    range_size = -(-file_size // range_count)
+    # Preallocate the file so that each range can be written in place
+    with open(file=str(file_path), mode="wb") as out_file:
+        out_file.truncate(file_size)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=range_count) as executor:
+        futures = [
+            executor.submit(download_range,
+                            url=url,
+                            validator=validator,
+                            file_path=file_path,
+                            first_byte=first_byte,
+                            last_byte=min(first_byte + range_size, file_size) - 1)
+            for first_byte in range(0, file_size, range_size)
+        ]
+
+    return all(future.result() for future in futures)
+
+
+def download_range(url, validator, file_path, first_byte, last_byte):
+    """Download the byte range of the file to the same position in the file at file_path and return whether it was
+    successful.
+
+    Keyword arguments:
+    url -- URL to download the file from
+    validator -- ETag or Last-Modified value of the file
+    file_path -- path of the preallocated file to write the range to
+    first_byte -- position of the first byte of the range
+    last_byte -- position of the last byte of the range
+    """
+    request = urllib.request.Request(url=url, headers={"Range": "bytes={}-{}".format(first_byte, last_byte),
+                                                       "If-Range": validator})
+    try:
+        with contextlib.closing(thing=urllib.request.urlopen(url=request)) as file_pointer:
+            # The server responds with the whole file if it ignores the range or the file has changed
+            if (file_pointer.status != 206
+                    or not file_pointer.headers.get("Content-Range", "").startswith(
+                        "bytes {}-{}/".format(first_byte, last_byte))):
+                return False
+
+            with open(file=str(file_path), mode="r+b") as out_file:
+                out_file.seek(first_byte)
+                remaining_size = last_byte + 1 - first_byte
+                while remaining_size > 0:
+                    block = file_pointer.read(min(1024 * 1024, remaining_size))
+                    if not block:
+                        return False
+                    out_file.write(block)
+                    remaining_size -= len(block)
+    except (OSError, http.client.HTTPException):
+        return False
+
+    return True
+
+
+class HashingReader:
+    """Wrapper for a file object which computes the SHA-256 hash of the data read from it.
+
+    Keyword arguments:
+    file_object -- the file object to read from
+    """
+
+    def __init__(self, file_object):
+        self.file_object = file_object
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file_object.read(size)
+        self.hash.update(data)
+        return data
+
+    def read_to_end(self):
+        """Read the remaining data from the file object."""
+        while self.read(1024 * 1024):
+            pass
+
+    def hexdigest(self):
+        """Return the SHA-256 hash of the data read so far."""
+        return self.hash.hexdigest()
+
+
+def is_tar_archive_url(url):
+    """Return whether the file name of the download URL has the extension of a tar archive.
+
+    Keyword arguments:
+    url -- URL of the download
+    """
+    return urllib.parse.urlparse(url).path.lower().endswith(
+        (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+    )
+
+
+def extract_archive(archive_path, extract_path, sparse_path=None):
+    """Extract the archive and return the path of its root folder.
+
+    Keyword arguments:
+    archive_path -- path of the archive file
+    extract_path -- path to extract the archive to
+    sparse_path -- path relative to the root folder of the archive to limit the extraction to. Set to None to extract
+                   the whole archive. (default None)
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(file=archive_path) as archive:
+            member_list = []
+            selected_member_list = []
+            for member in archive.infolist():
+                member_parts = pathlib.PurePosixPath(member.filename).parts
+                if len(member_parts) > 0:
+                    member_list.append((member_parts, member.is_dir()))
+                    if is_sparse_archive_member(member_parts=member_parts, sparse_path=sparse_path):
+                        selected_member_list.append(member)
+            archive.extractall(path=extract_path, members=selected_member_list)
+
+        return get_archive_member_root_path(member_list=member_list, extract_path=extract_path)
+
+    if tarfile.is_tarfile(str(archive_path)):
+        with tarfile.open(name=archive_path) as archive:
+            return extract_tar_archive(archive=archive, extract_path=extract_path, sparse_path=sparse_path)
+
+    shutil.unpack_archive(filename=str(archive_path), extract_dir=str(extract_path))
+    return get_archive_root_path(extract_path)
+
+
+def extract_tar_archive(archive, extract_path, sparse_path=None):
+    """Extract the tar archive, reading it sequentially so that it can be extracted from a stream, and return the path
+    of its root folder.
+
+    Keyword arguments:
+    archive -- tarfile.TarFile object of the archive
+    extract_path -- path to extract the archive to
+    sparse_path -- path relative to the root folder of the archive to limit the extraction to. Set to None to extract
+                   the whole archive. (default None)
+    """
+    member_list = []
+
+    def get_selected_members():
+        for member in archive:
+            member_parts = pathlib.PurePosixPath(member.name).parts
+            if len(member_parts) == 0:
+                continue
+            if member_parts[0] == "/" or ".." in member_parts:
+                # Don't allow extracting outside the extraction folder
+                continue
+            member_list.append((member_parts, member.isdir()))
+            if is_sparse_archive_member(member_parts=member_parts, sparse_path=sparse_path):
+                yield member
+
+    archive.extractall(path=extract_path, members=get_selected_members())
+
+    return get_archive_member_root_path(member_list=member_list, extract_path=extract_path)
+
+
+def is_sparse_archive_member(member_parts, sparse_path):
+    """Return whether the archive member is under the sparse path. Whether the archive has a root folder is only known
+    once all the members have been listed, so members under the sparse path relative to either the root of the archive
+    or the archive's top level folder are selected.
+
+    Keyword arguments:
+    member_parts -- tuple of the components of the archive member's path
+    sparse_path -- path relative to the root folder of the archive to limit the extraction to. Set to None to extract
+                   the whole archive.
+    """
+    if sparse_path is None:
+        return True
+
+    sparse_path_parts = pathlib.PurePosixPath(sparse_path).parts
+    return (
+        member_parts[:len(sparse_path_parts)] == sparse_path_parts
+        or member_parts[1:len(sparse_path_parts) + 1] == sparse_path_parts
+    )
+
+
+def get_archive_member_root_path(member_list, extract_path):
+    """Return the path of the archive's root folder, determined from the list of its members the same way as
+    get_archive_root_path() does from the extracted archive.
+
+    Keyword arguments:
+    member_list -- list of tuples of the components of each archive member's path and whether it is a folder
+    extract_path -- path the archive was extracted to
+    """
+    top_level_folder_names = set()
+    for member_parts, is_dir in member_list:
+        if len(member_parts) == 1 and not is_dir:
+            # There is a file in the root of the archive
+            return extract_path
+        if member_parts[0] != "__MACOSX":
+            top_level_folder_names.add(member_parts[0])
+
+    if len(top_level_folder_names) == 1:
+        return extract_path.joinpath(top_level_folder_names.pop())
+
+    return extract_path
+
+
+def get_file_hash(path):
+    """Return the SHA-256 hash of the file.
+
+    Keyword arguments:
+    path -- path of the file to hash
+    """
+    file_hash = hashlib.sha256()
+    with open(file=path, mode="rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def get_library_release(library_releases, version):
+    """Return the Library Manager index entry for the library release, or None if there is no such release.
+
+    Keyword arguments:
+    library_releases -- list of index entries for the releases of the library
+    version -- version of the release. Set to "" or None for the latest release.
+    """
+    if not version:
+        if not library_releases:
+            return None
+        return max(library_releases, key=lambda library_release: get_version_key(version=library_release["version"]))
+
+    for library_release in library_releases:
+        if library_release["version"] == version:
+            return library_release
+
+    return None
+
+
+def get_version_key(version):
+    """Return a key for sorting versions in the style of semantic versioning, where pre-release versions are sorted
+    before the associated release.
+
+    Keyword arguments:
+    version -- the version string (e.g., "1.2.3", "1.2.3-beta")
+    """
+    match = re.match(pattern=r"v?([0-9]+)(?:\.([0-9]+))?(?:\.([0-9]+))?(.*)", string=version)
+    if match is None:
+        return (-1, -1, -1, False, version)
+
+    major, minor, patch, pre_release = match.groups()
+    return (int(major), int(minor or 0), int(patch or 0), pre_release == "", pre_release)
+
+
+def get_remote_refs(url):
+    """Return a dictionary of the commit hashes of the refs advertised by the remote repository, keyed by ref name.
+
+    Keyword arguments:
+    url -- URL of the repository
+    """
+    remote_refs = {}
+    for line in git.Git().ls_remote(url).splitlines():
+        commit_hash, ref_name = line.split(sep="\t")
+        if ref_name.endswith("^{}"):
+            # Annotated tags are resolved to the tagged commit
+            remote_refs[ref_name[:-len("^{}")]] = commit_hash
+        else:
+            remote_refs.setdefault(ref_name, commit_hash)
+
+    return remote_refs
+
+
+def get_remote_ref(remote_refs, git_ref):
+    """Return the name of the remote ref matching the Git ref, the Git ref itself if it is a full commit hash, or None
+    if it can't be resolved from the remote refs. The ref names are resolved in the same order of precedence as
+    `git checkout` does in a clone.
+
+    Keyword arguments:
+    remote_refs -- dictionary of the commit hashes of the repository's refs, as returned by get_remote_refs()
+    git_ref -- the Git ref (e.g., branch, tag, commit hash)
+    """
+    git_ref = str(git_ref)
+    for ref_name in [git_ref, "refs/" + git_ref, "refs/tags/" + git_ref, "refs/heads/" + git_ref]:
+        if ref_name in remote_refs:
+            return ref_name
+
+    if re.fullmatch(pattern="[0-9a-f]{40}", string=git_ref) is not None:
+        # Servers may allow fetching commits by their full hash
+        return git_ref
+
+    return None
+
+
+def get_sparse_path(source_path):
+    """Return the path relative to the root of the repository or archive to limit the checkout or extraction to when
+    installing from the source path, or None if the whole repository or archive is needed.
+
+    Keyword arguments:
+    source_path -- path relative to the root of the repository or archive to install from
+    """
+    sparse_path = os.path.normpath(str(source_path)).replace(os.sep, "/")
+    if (
+        sparse_path == "."
+        or sparse_path == ".."
+        or sparse_path.startswith("../")
+        or sparse_path.startswith("/")
+        # Characters with special meaning in sparse checkout patterns
+        or re.search(pattern=r"[*?\[\]\\!#]", string=sparse_path) is not None
+    ):
+        return None
+
+    return sparse_path
+
+
+def get_core_warnings_from_output(compilation_output):
+    """Return the list of compiler warning lines from the compilation output which are for the files of the core or the
+    board variant.
+
+    Keyword arguments:
+    compilation_output -- stdout from Arduino CLI
+    """
+    compiler_warning_regex = ":[0-9]+:[0-9]+: warning:"
+    return [line for line in compilation_output.splitlines()
+            if re.search(pattern=compiler_warning_regex, string=line)
+            and ("/cores/" in line or "/variants/" in line)]
+
+
+def get_core_archive_states(build_cache_path):
+    """Return a dictionary of the modification times of the compiled core archives in the build cache, by path.
+
+    Keyword arguments:
+    build_cache_path -- folder used for the cache of the compiled core
+    """
+    return {path: path.stat().st_mtime_ns for path in pathlib.Path(build_cache_path).rglob(pattern="*.a")}
+
+
+def get_path_hash(path, excluded_paths=(), file_filter=None):
+    """Return a hash of the contents of the file or folder. Hidden files and folders are ignored, since they are not
+    used in compilation and may contain volatile data (e.g. the .git folder).
+
+    Keyword arguments:
+    path -- path of the file or folder to hash
+    excluded_paths -- paths of files or folders under path to ignore (default ())
+    file_filter -- function which takes the path of a file under path and returns whether it is hashed. Set to None to
+                   hash all files. (default None)
+    """
+    path = pathlib.Path(path)
+    excluded_paths = [pathlib.Path(excluded_path) for excluded_path in excluded_paths if excluded_path is not None]
+    path_hash = hashlib.sha256()
+    if path.is_dir():
+        file_path_list = sorted(
+            file_path for file_path in path.rglob(pattern="*")
+            if file_path.is_file()
+            and not any(part.startswith(".") for part in file_path.relative_to(path).parts)
+            and not any(excluded_path == file_path or excluded_path in file_path.parents
+                        for excluded_path in excluded_paths)
+            and (file_filter is None or file_filter(file_path))
+        )
+    else:
+        file_path_list = [path]
+
+    for file_path in file_path_list:
+        # The file paths are included so that renaming a file changes the hash
+        path_hash.update(file_path.relative_to(path).as_posix().encode() if file_path != path else b"")
+        path_hash.update(b"\0")
+        with open(file=file_path, mode="rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                path_hash.update(block)
+        path_hash.update(b"\0")
+
+    return path_hash.hexdigest()
+
+
+def parse_optional_path_input(path_input):
+    """Return the absolute path from an input for an optional file or folder, or None if the input is empty.
+
+    Keyword arguments:
+    path_input -- the raw path input. "" disables the feature the path is for.
+    """
+    if path_input == "":
+        return None
+
+    return absolute_path(path=path_input)
+
+
 def absolute_path(path):
     """Returns the absolute path equivalent. Relative paths are assumed to be relative to the workspace of the action's
     Docker container (the root of the repository).
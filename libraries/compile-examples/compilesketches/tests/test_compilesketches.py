@@ -1,16 +1,27 @@
 import filecmp
+import functools
+import hashlib
+import http.server
+import io
 import json
 import os
 import pathlib
+import re
 import shutil
+import sqlite3
 import subprocess
+import sys
 import tarfile
 import tempfile
+import threading
+import time
 import unittest.mock
+import zipfile
 
 import git
 import github
 import pytest
+import yaml
 
 import compilesketches
 
@@ -31,7 +42,21 @@ def get_compilesketches_object(
     deltas_base_ref="foodeltasbaseref",
     enable_deltas_report="false",
     enable_warnings_report="false",
-    sketches_report_path="foo report_folder_name"
+    sketches_report_path="foo report_folder_name",
+    jobs="1",
+    compilation_cache_path="",
+    compilation_cache_size="100",
+    reuse_core_build_cache="false",
+    download_cache_path="",
+    repository_cache_path="",
+    ranged_download_threshold="64",
+    platform_snapshot_path="",
+    lockfile_path="",
+    board_manager_index_ttl="0",
+    concurrent_deltas="false",
+    baseline_report_path="",
+    result_store_path="",
+    result_store_retention="30"
 ):
     with unittest.mock.patch("compilesketches.CompileSketches.get_deltas_base_ref",
                              autospec=True,
@@ -45,18 +70,33 @@ def get_compilesketches_object(
                                                                  github_token=github_token,
                                                                  enable_deltas_report=enable_deltas_report,
                                                                  enable_warnings_report=enable_warnings_report,
-                                                                 sketches_report_path=sketches_report_path)
+                                                                 sketches_report_path=sketches_report_path,
+                                                                 jobs=jobs,
+                                                                 compilation_cache_path=compilation_cache_path,
+                                                                 compilation_cache_size=compilation_cache_size,
+                                                                 reuse_core_build_cache=reuse_core_build_cache,
+                                                                 download_cache_path=download_cache_path,
+                                                                 repository_cache_path=repository_cache_path,
+                                                                 ranged_download_threshold=ranged_download_threshold,
+                                                                 platform_snapshot_path=platform_snapshot_path,
+                                                                 lockfile_path=lockfile_path,
+                                                                 board_manager_index_ttl=board_manager_index_ttl,
+                                                                 concurrent_deltas=concurrent_deltas,
+                                                                 baseline_report_path=baseline_report_path,
+                                                                 result_store_path=result_store_path,
+                                                                 result_store_retention=result_store_retention)
 
     compilesketches_object.github_api = github_api
 
     return compilesketches_object
 
 
-def directories_are_same(left_directory, right_directory):
-    """Check recursively whether two directories contain the same files.
+def directories_are_same(left_directory, right_directory, ignore=None):
+    """Check recursively whether two directories contain the same files, other than those with names in the ignore
+    list.
     Based on https://stackoverflow.com/a/24860799
     """
-    directory_comparison = filecmp.dircmp(a=left_directory, b=right_directory)
+    directory_comparison = filecmp.dircmp(a=left_directory, b=right_directory, ignore=ignore)
     if (
         directory_comparison.left_only
         or directory_comparison.right_only
@@ -65,7 +105,9 @@ def directories_are_same(left_directory, right_directory):
     ):
         return False
     for subdirectory in directory_comparison.common_dirs:
-        if not directories_are_same(left_directory.joinpath(subdirectory), right_directory.joinpath(subdirectory)):
+        if not directories_are_same(left_directory.joinpath(subdirectory),
+                                    right_directory.joinpath(subdirectory),
+                                    ignore=ignore):
             return False
     return True
 
@@ -96,6 +138,20 @@ def setup_action_inputs(monkeypatch):
         enable_warnings_report = "FooEnableWarningsReport"
         sketches_report_path = "FooSketchesReportPath"
         size_deltas_report_folder_name = "FooSizeDeltasReportFolderName"
+        jobs = "FooJobs"
+        compilation_cache_path = "FooCompilationCachePath"
+        compilation_cache_size = "FooCompilationCacheSize"
+        reuse_core_build_cache = "FooReuseCoreBuildCache"
+        download_cache_path = "FooDownloadCachePath"
+        repository_cache_path = "FooRepositoryCachePath"
+        ranged_download_threshold = "FooRangedDownloadThreshold"
+        platform_snapshot_path = "FooPlatformSnapshotPath"
+        lockfile_path = "FooLockfilePath"
+        board_manager_index_ttl = "FooBoardManagerIndexTTL"
+        concurrent_deltas = "FooConcurrentDeltas"
+        baseline_report_path = "FooBaselineReportPath"
+        result_store_path = "FooResultStorePath"
+        result_store_retention = "FooResultStoreRetention"
 
     monkeypatch.setenv("INPUT_CLI-VERSION", ActionInputs.cli_version)
     monkeypatch.setenv("INPUT_FQBN", ActionInputs.fqbn_arg)
@@ -107,6 +163,20 @@ def setup_action_inputs(monkeypatch):
     monkeypatch.setenv("INPUT_ENABLE-DELTAS-REPORT", ActionInputs.enable_deltas_report)
     monkeypatch.setenv("INPUT_ENABLE-WARNINGS-REPORT", ActionInputs.enable_warnings_report)
     monkeypatch.setenv("INPUT_SKETCHES-REPORT-PATH", ActionInputs.sketches_report_path)
+    monkeypatch.setenv("INPUT_JOBS", ActionInputs.jobs)
+    monkeypatch.setenv("INPUT_COMPILATION-CACHE-PATH", ActionInputs.compilation_cache_path)
+    monkeypatch.setenv("INPUT_COMPILATION-CACHE-SIZE", ActionInputs.compilation_cache_size)
+    monkeypatch.setenv("INPUT_REUSE-CORE-BUILD-CACHE", ActionInputs.reuse_core_build_cache)
+    monkeypatch.setenv("INPUT_DOWNLOAD-CACHE-PATH", ActionInputs.download_cache_path)
+    monkeypatch.setenv("INPUT_REPOSITORY-CACHE-PATH", ActionInputs.repository_cache_path)
+    monkeypatch.setenv("INPUT_RANGED-DOWNLOAD-THRESHOLD", ActionInputs.ranged_download_threshold)
+    monkeypatch.setenv("INPUT_PLATFORM-SNAPSHOT-PATH", ActionInputs.platform_snapshot_path)
+    monkeypatch.setenv("INPUT_LOCKFILE-PATH", ActionInputs.lockfile_path)
+    monkeypatch.setenv("INPUT_BOARD-MANAGER-INDEX-TTL", ActionInputs.board_manager_index_ttl)
+    monkeypatch.setenv("INPUT_CONCURRENT-DELTAS", ActionInputs.concurrent_deltas)
+    monkeypatch.setenv("INPUT_BASELINE-REPORT-PATH", ActionInputs.baseline_report_path)
+    monkeypatch.setenv("INPUT_RESULT-STORE-PATH", ActionInputs.result_store_path)
+    monkeypatch.setenv("INPUT_RESULT-STORE-RETENTION", ActionInputs.result_store_retention)
 
     return ActionInputs()
 
@@ -231,7 +301,21 @@ def test_main(mocker, setup_action_inputs):
         github_token=setup_action_inputs.github_token,
         enable_deltas_report=setup_action_inputs.enable_deltas_report,
         enable_warnings_report=setup_action_inputs.enable_warnings_report,
-        sketches_report_path=setup_action_inputs.sketches_report_path
+        sketches_report_path=setup_action_inputs.sketches_report_path,
+        jobs=setup_action_inputs.jobs,
+        compilation_cache_path=setup_action_inputs.compilation_cache_path,
+        compilation_cache_size=setup_action_inputs.compilation_cache_size,
+        reuse_core_build_cache=setup_action_inputs.reuse_core_build_cache,
+        download_cache_path=setup_action_inputs.download_cache_path,
+        repository_cache_path=setup_action_inputs.repository_cache_path,
+        ranged_download_threshold=setup_action_inputs.ranged_download_threshold,
+        platform_snapshot_path=setup_action_inputs.platform_snapshot_path,
+        lockfile_path=setup_action_inputs.lockfile_path,
+        board_manager_index_ttl=setup_action_inputs.board_manager_index_ttl,
+        concurrent_deltas=setup_action_inputs.concurrent_deltas,
+        baseline_report_path=setup_action_inputs.baseline_report_path,
+        result_store_path=setup_action_inputs.result_store_path,
+        result_store_retention=setup_action_inputs.result_store_retention
     )
 
     CompileSketches.compile_sketches.assert_called_once()
@@ -252,6 +336,20 @@ def test_compilesketches():
     enable_deltas_report = "true"
     enable_warnings_report = "true"
     sketches_report_path = "FooSketchesReportFolder"
+    jobs = "42"
+    compilation_cache_path = "FooCompilationCachePath"
+    compilation_cache_size = "12"
+    reuse_core_build_cache = "true"
+    download_cache_path = "FooDownloadCachePath"
+    repository_cache_path = "FooRepositoryCachePath"
+    ranged_download_threshold = "32"
+    platform_snapshot_path = "FooPlatformSnapshotPath"
+    lockfile_path = "FooLockfilePath"
+    board_manager_index_ttl = "60"
+    concurrent_deltas = "true"
+    baseline_report_path = "FooBaselineReportPath"
+    result_store_path = "FooResultStorePath"
+    result_store_retention = "7"
 
     with unittest.mock.patch("compilesketches.CompileSketches.get_deltas_base_ref",
                              autospec=True,
@@ -266,12 +364,25 @@ def test_compilesketches():
             github_token=github_token,
             enable_deltas_report=enable_deltas_report,
             enable_warnings_report=enable_warnings_report,
-            sketches_report_path=sketches_report_path
+            sketches_report_path=sketches_report_path,
+            jobs=jobs,
+            compilation_cache_path=compilation_cache_path,
+            compilation_cache_size=compilation_cache_size,
+            reuse_core_build_cache=reuse_core_build_cache,
+            download_cache_path=download_cache_path,
+            repository_cache_path=repository_cache_path,
+            ranged_download_threshold=ranged_download_threshold,
+            platform_snapshot_path=platform_snapshot_path,
+            lockfile_path=lockfile_path,
+            board_manager_index_ttl=board_manager_index_ttl,
+            concurrent_deltas=concurrent_deltas,
+            baseline_report_path=baseline_report_path,
+            result_store_path=result_store_path,
+            result_store_retention=result_store_retention
         )
 
     assert compile_sketches.cli_version == cli_version
-    assert compile_sketches.fqbn == expected_fqbn
-    assert compile_sketches.additional_url == expected_additional_url
+    assert compile_sketches.boards == [{"fqbn": expected_fqbn, "additional_url": expected_additional_url}]
     assert compile_sketches.platforms == platforms
     assert compile_sketches.libraries == libraries
     assert compile_sketches.sketch_paths == expected_sketch_paths_list
@@ -280,6 +391,22 @@ def test_compilesketches():
     assert compile_sketches.enable_deltas_report is True
     assert compile_sketches.enable_warnings_report is True
     assert compile_sketches.sketches_report_path == pathlib.PurePath(sketches_report_path)
+    assert compile_sketches.jobs == 42
+    assert compile_sketches.compilation_cache_path == compilesketches.absolute_path(path=compilation_cache_path)
+    assert compile_sketches.compilation_cache_size == 12
+    assert compile_sketches.reuse_core_build_cache is True
+    assert compile_sketches.download_cache_path == compilesketches.absolute_path(path=download_cache_path)
+    assert compile_sketches.repository_cache_path == compilesketches.absolute_path(path=repository_cache_path)
+    assert compile_sketches.ranged_download_threshold == 32
+    assert compile_sketches.platform_snapshot_path == compilesketches.absolute_path(path=platform_snapshot_path)
+    assert compile_sketches.lockfile_path == compilesketches.absolute_path(path=lockfile_path)
+    assert compile_sketches.board_manager_index_ttl == 60
+    assert compile_sketches.concurrent_deltas is True
+    assert compile_sketches.baseline_report_path == compilesketches.absolute_path(path=baseline_report_path)
+    assert compile_sketches.result_store_path == compilesketches.absolute_path(path=result_store_path)
+    assert compile_sketches.result_store_retention == 7
+    # The lockfile doesn't exist yet
+    assert compile_sketches.lockfile is None
 
     # Test invalid enable_deltas_report value
     with pytest.raises(expected_exception=SystemExit, match="1"):
@@ -289,6 +416,49 @@ def test_compilesketches():
     with pytest.raises(expected_exception=SystemExit, match="1"):
         get_compilesketches_object(enable_warnings_report="fooInvalidEnableWarningsReportBoolean")
 
+    # Test invalid jobs value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(jobs="fooInvalidJobs")
+
+    # Test invalid compilation_cache_size value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(compilation_cache_size="fooInvalidCompilationCacheSize")
+
+    # Test invalid ranged_download_threshold value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(ranged_download_threshold="fooInvalidRangedDownloadThreshold")
+
+    # Test invalid board_manager_index_ttl value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(board_manager_index_ttl="fooInvalidBoardManagerIndexTTL")
+
+    # Test invalid result_store_retention value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(result_store_retention="fooInvalidResultStoreRetention")
+
+    # Test invalid concurrent_deltas value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(concurrent_deltas="fooInvalidConcurrentDeltasBoolean")
+
+    # Test invalid reuse_core_build_cache value
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        get_compilesketches_object(reuse_core_build_cache="fooInvalidReuseCoreBuildCacheBoolean")
+
+    # Test disabled compilation cache
+    assert get_compilesketches_object(compilation_cache_path="").compilation_cache_path is None
+
+    # Test disabled download cache
+    assert get_compilesketches_object(download_cache_path="").download_cache_path is None
+
+    # Test disabled repository cache
+    assert get_compilesketches_object(repository_cache_path="").repository_cache_path is None
+
+    # Test disabled platform snapshots
+    assert get_compilesketches_object(platform_snapshot_path="").platform_snapshot_path is None
+
+    # Test disabled lockfile
+    assert get_compilesketches_object(lockfile_path="").lockfile_path is None
+
     # Test deltas_base_ref when size deltas report is disabled
     compile_sketches = get_compilesketches_object(enable_deltas_report="false")
     assert compile_sketches.deltas_base_ref is None
@@ -361,35 +531,60 @@ def test_get_parent_commit_ref(mocker):
     git.Repo.assert_called_once_with(path=os.environ["GITHUB_WORKSPACE"])
 
 
-@pytest.mark.parametrize("enable_warnings_report, expected_clean_build_cache",
-                         [("true", True),
-                          ("false", False)])
+@pytest.mark.parametrize("enable_warnings_report, reuse_core_build_cache, expected_clean_build_cache, "
+                         "expected_replay_core_warnings",
+                         [("true", "false", True, False),
+                          ("true", "true", False, True),
+                          ("false", "false", False, False),
+                          ("false", "true", False, False)])
 @pytest.mark.parametrize("compilation_success_list, expected_success",
                          [([True, True, True], True),
                           ([False, True, True], False),
                           ([True, False, True], False),
                           ([True, True, False], False)])
-def test_compile_sketches(mocker, enable_warnings_report, expected_clean_build_cache, compilation_success_list,
-                          expected_success):
+def test_compile_sketches(mocker, enable_warnings_report, reuse_core_build_cache, expected_clean_build_cache,
+                          expected_replay_core_warnings, compilation_success_list, expected_success):
+    fqbn_list = ["foo:bar:baz", "qux:quux:corge"]
     sketch_list = [unittest.mock.sentinel.sketch1, unittest.mock.sentinel.sketch2, unittest.mock.sentinel.sketch3]
 
     compilation_result_list = []
-    for success in compilation_success_list:
-        compilation_result_list.append(type("CompilationResult", (), {"success": success}))
+    previous_compilation_result_list = []
+    for fqbn in fqbn_list:
+        for success in compilation_success_list:
+            compilation_result_list.append(type("CompilationResult", (), {"fqbn": fqbn, "success": success}))
+            previous_compilation_result_list.append(
+                type("CompilationResult", (), {"fqbn": fqbn, "success": success}) if success else None
+            )
+    previous_sketch_report_list = [None for _ in compilation_result_list]
+    previous_sketch_report_list[0] = unittest.mock.sentinel.previous_sketch_report
     sketch_report = unittest.mock.sentinel.sketch_report
+    board_report = unittest.mock.sentinel.board_report
     sketches_report = unittest.mock.sentinel.sketch_report_from_sketches_report
 
-    compile_sketches = get_compilesketches_object(enable_warnings_report=enable_warnings_report)
+    # Repeated boards are only compiled for once
+    compile_sketches = get_compilesketches_object(fqbn_arg="- " + fqbn_list[0] + "\n- " + fqbn_list[1] + "\n- "
+                                                  + fqbn_list[0] + " https://example.com/package_foo_index.json",
+                                                  enable_warnings_report=enable_warnings_report,
+                                                  reuse_core_build_cache=reuse_core_build_cache)
 
     mocker.patch("compilesketches.CompileSketches.install_arduino_cli", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_platforms", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_libraries", autospec=True)
     mocker.patch("compilesketches.CompileSketches.find_sketches", autospec=True, return_value=sketch_list)
-    mocker.patch("compilesketches.CompileSketches.compile_sketch", autospec=True, side_effect=compilation_result_list)
+    mocker.patch("compilesketches.CompileSketches.get_previous_sketch_report_list", autospec=True,
+                 return_value=previous_sketch_report_list)
+    mocker.patch("compilesketches.CompileSketches.compile_sketch_list", autospec=True,
+                 return_value=compilation_result_list)
+    mocker.patch("compilesketches.CompileSketches.get_previous_compilation_result_list", autospec=True,
+                 return_value=previous_compilation_result_list)
+    mocker.patch("compilesketches.CompileSketches.print_compilation_result", autospec=True)
     mocker.patch("compilesketches.CompileSketches.get_sketch_report", autospec=True, return_value=sketch_report)
+    mocker.patch("compilesketches.CompileSketches.get_board_report", autospec=True, return_value=board_report)
     mocker.patch("compilesketches.CompileSketches.get_sketches_report", autospec=True,
                  return_value=sketches_report)
     mocker.patch("compilesketches.CompileSketches.create_sketches_report_file", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.prune_compilation_cache", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.save_result_store", autospec=True)
 
     if expected_success:
         compile_sketches.compile_sketches()
@@ -401,65 +596,160 @@ def test_compile_sketches(mocker, enable_warnings_report, expected_clean_build_c
     compile_sketches.install_platforms.assert_called_once()
     compile_sketches.install_libraries.assert_called_once()
     compile_sketches.find_sketches.assert_called_once()
+    compilation_list = [{"sketch_path": sketch, "fqbn": fqbn} for fqbn in fqbn_list for sketch in sketch_list]
+    compile_sketches.get_previous_sketch_report_list.assert_called_once_with(compile_sketches,
+                                                                             compilation_list=compilation_list)
+    compile_sketches.compile_sketch_list.assert_called_once_with(
+        compile_sketches,
+        compilation_list=compilation_list,
+        clean_build_cache=expected_clean_build_cache,
+        replay_core_warnings=expected_replay_core_warnings
+    )
+    compile_sketches.get_previous_compilation_result_list.assert_called_once_with(
+        compile_sketches,
+        compilation_result_list=compilation_result_list,
+        previous_sketch_report_list=previous_sketch_report_list
+    )
 
-    compile_sketch_calls = []
+    print_compilation_result_calls = []
     get_sketch_report_calls = []
-    sketch_report_list = []
-    for sketch, compilation_result in zip(sketch_list, compilation_result_list):
-        compile_sketch_calls.append(unittest.mock.call(compile_sketches,
-                                                       sketch_path=sketch,
-                                                       clean_build_cache=expected_clean_build_cache))
+    for compilation_result, previous_compilation_result, previous_sketch_report in zip(
+        compilation_result_list,
+        previous_compilation_result_list,
+        previous_sketch_report_list
+    ):
+        print_compilation_result_calls.append(unittest.mock.call(compile_sketches,
+                                                                 compilation_result=compilation_result))
         get_sketch_report_calls.append(unittest.mock.call(compile_sketches,
-                                                          compilation_result=compilation_result))
-        sketch_report_list.append(sketch_report)
-    compile_sketches.compile_sketch.assert_has_calls(calls=compile_sketch_calls)
-    compile_sketches.get_sketch_report.assert_has_calls(calls=get_sketch_report_calls)
+                                                          compilation_result=compilation_result,
+                                                          previous_compilation_result=previous_compilation_result,
+                                                          previous_sketch_report=previous_sketch_report))
+    assert compile_sketches.print_compilation_result.call_args_list == print_compilation_result_calls
+    assert compile_sketches.get_sketch_report.call_args_list == get_sketch_report_calls
+
+    get_board_report_calls = []
+    for fqbn in fqbn_list:
+        get_board_report_calls.append(unittest.mock.call(compile_sketches,
+                                                         fqbn=fqbn,
+                                                         sketch_report_list=[sketch_report for _ in sketch_list]))
+    assert compile_sketches.get_board_report.call_args_list == get_board_report_calls
 
     compile_sketches.get_sketches_report.assert_called_once_with(compile_sketches,
-                                                                 sketch_report_list=sketch_report_list)
+                                                                 board_report_list=[board_report for _ in fqbn_list])
 
     compile_sketches.create_sketches_report_file.assert_called_once_with(
         compile_sketches,
         sketches_report=sketches_report
     )
 
+    compile_sketches.prune_compilation_cache.assert_called_once_with(compile_sketches)
+    compile_sketches.save_result_store.assert_called_once_with(compile_sketches)
 
-def test_install_arduino_cli(mocker):
-    cli_version = "1.2.3"
-    arduino_cli_installation_path = unittest.mock.sentinel.arduino_cli_installation_path
+
+@pytest.mark.parametrize("cli_version", ["1.2.3", "latest"])
+def test_install_arduino_cli(mocker, tmp_path, cli_version):
+    arduino_cli_installation_path = tmp_path.joinpath("bin")
     arduino_cli_data_directory_path = pathlib.PurePath("/foo/arduino_cli_data_directory_path")
     arduino_cli_user_directory_path = pathlib.PurePath("/foo/arduino_cli_user_directory_path")
+    archive_root_path = tmp_path.joinpath("archive")
+    archive_root_path.mkdir()
+    archive_root_path.joinpath("arduino-cli").write_text("foo executable")
 
     compile_sketches = get_compilesketches_object(cli_version=cli_version)
     compile_sketches.arduino_cli_installation_path = arduino_cli_installation_path
     compile_sketches.arduino_cli_user_directory_path = arduino_cli_user_directory_path
     compile_sketches.arduino_cli_data_directory_path = arduino_cli_data_directory_path
 
-    mocker.patch("compilesketches.CompileSketches.install_from_download", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.get_extracted_download",
+                 autospec=True,
+                 return_value=archive_root_path)
+    mocker.patch("compilesketches.CompileSketches.get_arduino_cli_version", autospec=True, return_value="1.2.3")
+
+    # An executable installed by a previous version of the action is replaced
+    arduino_cli_installation_path.mkdir()
+    arduino_cli_installation_path.joinpath("arduino-cli").write_text("bar executable")
 
     compile_sketches.install_arduino_cli()
 
-    compile_sketches.install_from_download.assert_called_once_with(
+    compile_sketches.get_extracted_download.assert_called_once_with(
         compile_sketches,
         url="https://downloads.arduino.cc/arduino-cli/arduino-cli_" + cli_version + "_Linux_64bit.tar.gz",
-        source_path="arduino-cli",
-        destination_parent_path=arduino_cli_installation_path,
-        force=False
+        sparse_path="arduino-cli"
     )
+    assert os.readlink(arduino_cli_installation_path.joinpath("arduino-cli")) == "arduino-cli-1.2.3/arduino-cli"
+    assert arduino_cli_installation_path.joinpath("arduino-cli").read_text() == "foo executable"
+    if cli_version == "latest":
+        compile_sketches.get_arduino_cli_version.assert_called_once_with(
+            compile_sketches,
+            executable_path=archive_root_path.joinpath("arduino-cli")
+        )
+        assert compile_sketches.get_arduino_cli_latest_version() == "1.2.3"
+    else:
+        compile_sketches.get_arduino_cli_version.assert_not_called()
 
     assert os.environ["ARDUINO_DIRECTORIES_USER"] == str(arduino_cli_user_directory_path)
     assert os.environ["ARDUINO_DIRECTORIES_DATA"] == str(arduino_cli_data_directory_path)
     del os.environ["ARDUINO_DIRECTORIES_USER"]
     del os.environ["ARDUINO_DIRECTORIES_DATA"]
 
+    # The stored version is reused
+    compile_sketches.get_extracted_download.reset_mock()
+    shutil.rmtree(path=archive_root_path)
+    compile_sketches.install_arduino_cli()
+    compile_sketches.get_extracted_download.assert_not_called()
+    assert arduino_cli_installation_path.joinpath("arduino-cli").read_text() == "foo executable"
+    del os.environ["ARDUINO_DIRECTORIES_USER"]
+    del os.environ["ARDUINO_DIRECTORIES_DATA"]
+
+
+def test_get_arduino_cli_latest_version(tmp_path):
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.arduino_cli_installation_path = tmp_path
+    latest_version_path = tmp_path.joinpath(compile_sketches.arduino_cli_latest_version_file_name)
+
+    # Not resolved yet
+    assert compile_sketches.get_arduino_cli_latest_version() is None
+
+    latest_version_path.write_text(json.dumps({"version": "1.2.3"}))
+    assert compile_sketches.get_arduino_cli_latest_version() == "1.2.3"
+
+    # Resolved longer ago than the TTL
+    resolution_time = time.time() - compile_sketches.arduino_cli_latest_version_ttl - 60
+    os.utime(path=latest_version_path, times=(resolution_time, resolution_time))
+    assert compile_sketches.get_arduino_cli_latest_version() is None
+
+    latest_version_path.write_text("foo")
+    assert compile_sketches.get_arduino_cli_latest_version() is None
+
+
+def test_get_arduino_cli_version(capsys, tmp_path):
+    compile_sketches = get_compilesketches_object()
+    executable_path = tmp_path.joinpath("arduino-cli")
+    executable_path.write_text("#!/bin/sh\necho 'arduino-cli  Version: 0.11.0 Commit: 0296f4df'\n")
+    executable_path.chmod(0o755)
+
+    assert compile_sketches.get_arduino_cli_version(executable_path=executable_path) == "0.11.0"
+
+    executable_path.write_text("#!/bin/sh\necho 'foo'\n")
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.get_arduino_cli_version(executable_path=executable_path)
+    assert capsys.readouterr().out.strip() == (
+        "::error::Unable to determine the version of Arduino CLI from its output: foo"
+    )
+
 
 @pytest.mark.parametrize("platforms", ["", "foo"])
 def test_install_platforms(mocker, platforms):
-    fqbn_platform_dependency = unittest.mock.sentinel.fqbn_platform_dependency
-    dependency_list_manager = [unittest.mock.sentinel.manager]
-    dependency_list_path = [unittest.mock.sentinel.path]
-    dependency_list_repository = [unittest.mock.sentinel.repository]
-    dependency_list_download = [unittest.mock.sentinel.download]
+    fqbn_platform_dependency = {compilesketches.CompileSketches.dependency_name_key: "foo:bar"}
+    dependency_list_manager = [{compilesketches.CompileSketches.dependency_name_key: "foo:manager"}]
+    dependency_list_path = [{compilesketches.CompileSketches.dependency_source_path_key: "foo/path1"},
+                            {compilesketches.CompileSketches.dependency_source_path_key: "foo/path2"}]
+    dependency_list_repository = [
+        {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.git"}
+    ]
+    dependency_list_download = [
+        {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.zip"}
+    ]
 
     dependency_list = compilesketches.CompileSketches.Dependencies()
     dependency_list.manager = dependency_list_manager
@@ -479,6 +769,7 @@ def test_install_platforms(mocker, platforms):
     mocker.patch("compilesketches.CompileSketches.install_platforms_from_path", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_platforms_from_repository", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_platforms_from_download", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.fetch_dependency", autospec=True)
 
     compile_sketches.install_platforms()
 
@@ -495,10 +786,10 @@ def test_install_platforms(mocker, platforms):
             compile_sketches,
             platform_list=dependency_list_manager
         )
-        compile_sketches.install_platforms_from_path.assert_called_once_with(
-            compile_sketches,
-            platform_list=dependency_list_path
-        )
+        # Each platform is installed individually
+        assert compile_sketches.install_platforms_from_path.call_args_list == [
+            unittest.mock.call(compile_sketches, platform_list=[platform]) for platform in dependency_list_path
+        ]
         compile_sketches.install_platforms_from_repository.assert_called_once_with(
             compile_sketches,
             platform_list=dependency_list_repository
@@ -507,6 +798,33 @@ def test_install_platforms(mocker, platforms):
             compile_sketches,
             platform_list=dependency_list_download
         )
+        assert compile_sketches.fetch_dependency.call_args_list == [
+            unittest.mock.call(compile_sketches, ("repository", "https://example.com/foo.git", None, None, None)),
+            unittest.mock.call(compile_sketches, ("download", "https://example.com/foo.zip", None, None))
+        ]
+
+
+def test_install_platforms_multiple_boards(mocker):
+    compile_sketches = get_compilesketches_object(
+        fqbn_arg=("- arduino:avr:uno\n"
+                  "- arduino:avr:mega\n"
+                  "- '\"foo:bar:baz\" \"https://example.com/package_foo_index.json\"'"),
+        platforms=""
+    )
+
+    mocker.patch("compilesketches.CompileSketches.install_platforms_from_board_manager", autospec=True)
+
+    compile_sketches.install_platforms()
+
+    # The platform dependency of boards of the same platform is only installed once
+    compile_sketches.install_platforms_from_board_manager.assert_called_once_with(
+        compile_sketches,
+        platform_list=[
+            {compilesketches.CompileSketches.dependency_name_key: "arduino:avr"},
+            {compilesketches.CompileSketches.dependency_name_key: "foo:bar",
+             compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/package_foo_index.json"}
+        ]
+    )
 
 
 @pytest.mark.parametrize(
@@ -519,9 +837,11 @@ def test_install_platforms(mocker, platforms):
      ("arduino:avr:nano:cpu=atmega328old", "arduino:avr", None)]
 )
 def test_get_fqbn_platform_dependency(fqbn_arg, expected_platform, expected_additional_url):
-    compile_sketches = get_compilesketches_object(fqbn_arg=fqbn_arg)
+    compile_sketches = get_compilesketches_object()
 
-    fqbn_platform_dependency = compile_sketches.get_fqbn_platform_dependency()
+    fqbn_platform_dependency = compile_sketches.get_fqbn_platform_dependency(
+        board=compilesketches.parse_fqbn_arg_input(fqbn_arg=fqbn_arg)
+    )
 
     assert fqbn_platform_dependency[compilesketches.CompileSketches.dependency_name_key] == expected_platform
     if expected_additional_url is not None:
@@ -561,26 +881,28 @@ def test_sort_dependency_list(dependency_list, expected_dependency_type_list):
 
 
 @pytest.mark.parametrize(
-    "platform_list, expected_core_update_index_command_list, expected_core_install_command_list",
+    "platform_list, expected_additional_urls, expected_core_install_command_list",
     [(
         [{compilesketches.CompileSketches.dependency_name_key: "Foo"},
          {compilesketches.CompileSketches.dependency_name_key: "Bar"}],
-        [["core", "update-index"], ["core", "update-index"]],
+        [],
         [["core", "install", "Foo"], ["core", "install", "Bar"]]
     ), (
         # Additional Board Manager URL
         [{compilesketches.CompileSketches.dependency_name_key: "Foo",
           compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/package_foo_index.json"},
          {compilesketches.CompileSketches.dependency_name_key: "Bar",
-          compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/package_bar_index.json"}],
-        [["core", "update-index", "--additional-urls", "https://example.com/package_foo_index.json"],
-         ["core", "update-index", "--additional-urls", "https://example.com/package_bar_index.json"]],
+          compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/package_bar_index.json"},
+         {compilesketches.CompileSketches.dependency_name_key: "Baz",
+          compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/package_foo_index.json"}],
+        ["https://example.com/package_foo_index.json", "https://example.com/package_bar_index.json"],
         [["core", "install", "--additional-urls", "https://example.com/package_foo_index.json", "Foo"],
-         ["core", "install", "--additional-urls", "https://example.com/package_bar_index.json", "Bar"]]
+         ["core", "install", "--additional-urls", "https://example.com/package_bar_index.json", "Bar"],
+         ["core", "install", "--additional-urls", "https://example.com/package_foo_index.json", "Baz"]]
     )])
 def test_install_platforms_from_board_manager(mocker,
                                               platform_list,
-                                              expected_core_update_index_command_list,
+                                              expected_additional_urls,
                                               expected_core_install_command_list):
     run_command_output_level = unittest.mock.sentinel.run_command_output_level
 
@@ -589,24 +911,337 @@ def test_install_platforms_from_board_manager(mocker,
     mocker.patch("compilesketches.CompileSketches.get_run_command_output_level", autospec=True,
                  return_value=run_command_output_level)
     mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.update_board_manager_index", autospec=True)
 
     compile_sketches.install_platforms_from_board_manager(platform_list=platform_list)
 
-    run_arduino_cli_command_calls = []
-    for expected_core_update_index_command, expected_core_install_command in zip(
-        expected_core_update_index_command_list,
-        expected_core_install_command_list
-    ):
-        run_arduino_cli_command_calls.extend([
-            unittest.mock.call(compile_sketches,
-                               command=expected_core_update_index_command,
-                               enable_output=run_command_output_level),
-            unittest.mock.call(compile_sketches,
-                               command=expected_core_install_command,
-                               enable_output=run_command_output_level)
-        ])
+    # The indexes of all the platforms are updated at once
+    compile_sketches.update_board_manager_index.assert_called_once_with(compile_sketches,
+                                                                        additional_urls=expected_additional_urls)
+    assert compile_sketches.run_arduino_cli_command.call_args_list == [
+        unittest.mock.call(compile_sketches,
+                           command=expected_core_install_command,
+                           enable_output=run_command_output_level)
+        for expected_core_install_command in expected_core_install_command_list
+    ]
 
-    compile_sketches.run_arduino_cli_command.assert_has_calls(calls=run_arduino_cli_command_calls)
+
+def test_install_platforms_from_board_manager_installed_platforms(mocker, tmp_path):
+    board_manager_platforms_path = tmp_path.joinpath("packages")
+
+    def run_arduino_cli_command(self, command, enable_output):
+        if command[:2] == ["core", "install"]:
+            board_manager_platforms_path.joinpath("arduino", "hardware", "avr", "1.8.3").mkdir(parents=True,
+                                                                                               exist_ok=True)
+            board_manager_platforms_path.joinpath("arduino", "hardware", "avr", "1.8.3", "installed.json").touch()
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.board_manager_platforms_path = board_manager_platforms_path
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 side_effect=run_arduino_cli_command)
+    mocker.patch("compilesketches.CompileSketches.update_board_manager_index", autospec=True)
+
+    assert compile_sketches.get_installed_platforms() == {}
+
+    compile_sketches.install_platforms_from_board_manager(
+        platform_list=[{compilesketches.CompileSketches.dependency_name_key: "arduino:avr"}]
+    )
+
+    # The index of installed platforms is updated by the installation
+    assert compile_sketches.get_installed_platforms() == {"arduino:avr": "1.8.3"}
+
+    # Platforms already installed at the pinned version are not installed again
+    compile_sketches.run_arduino_cli_command.reset_mock()
+    compile_sketches.install_platforms_from_board_manager(
+        platform_list=[{compilesketches.CompileSketches.dependency_name_key: "arduino:avr",
+                        compilesketches.CompileSketches.dependency_version_key: "1.8.3"}]
+    )
+    compile_sketches.run_arduino_cli_command.assert_not_called()
+
+    # A release overwritten by the installation of the platform from another source is installed again
+    board_manager_platforms_path.joinpath("arduino", "hardware", "avr", "1.8.3", "installed.json").unlink()
+    board_manager_platforms_path.joinpath("arduino", "hardware", "avr", "1.8.3", "platform.txt").touch()
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.board_manager_platforms_path = board_manager_platforms_path
+    assert compile_sketches.get_installed_platforms() == {"arduino:avr": "1.8.3"}
+    compile_sketches.install_platforms_from_board_manager(
+        platform_list=[{compilesketches.CompileSketches.dependency_name_key: "arduino:avr",
+                        compilesketches.CompileSketches.dependency_version_key: "1.8.3"}]
+    )
+    compile_sketches.run_arduino_cli_command.assert_called_once_with(
+        compile_sketches,
+        command=["core", "install", "arduino:avr@1.8.3"],
+        enable_output=compile_sketches.get_run_command_output_level()
+    )
+
+
+def test_update_board_manager_index(mocker, tmp_path):
+    arduino_cli_data_directory_path = tmp_path.joinpath("arduino15")
+    additional_urls = ["https://example.com/package_foo_index.json", "https://example.com/package_bar_index.json"]
+    # URLs of the index files which have changed on the server since they were last updated
+    changed_urls = set()
+
+    def run_arduino_cli_command(self, command, enable_output):
+        arduino_cli_data_directory_path.mkdir(exist_ok=True)
+        arduino_cli_data_directory_path.joinpath("package_index.json").touch()
+        arduino_cli_data_directory_path.joinpath("package_foo_index.json").touch()
+        arduino_cli_data_directory_path.joinpath("package_bar_index.json").touch()
+        changed_urls.clear()
+
+    def get_url_validators(url, validators=None):
+        if validators is None or url in changed_urls:
+            return {"etag": '"' + url + '"', "last_modified": None}
+        return None
+
+    def get_object(board_manager_index_ttl="0"):
+        compile_sketches_object = get_compilesketches_object(board_manager_index_ttl=board_manager_index_ttl)
+        compile_sketches_object.arduino_cli_data_directory_path = arduino_cli_data_directory_path
+        return compile_sketches_object
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 side_effect=run_arduino_cli_command)
+    mocker.patch("compilesketches.get_url_validators", autospec=True, side_effect=get_url_validators)
+
+    # All the indexes are updated with a single command
+    compile_sketches = get_object()
+    compile_sketches.update_board_manager_index(additional_urls=additional_urls)
+    compile_sketches.run_arduino_cli_command.assert_called_once_with(
+        compile_sketches,
+        command=["core", "update-index", "--additional-urls", ",".join(additional_urls)],
+        enable_output=compile_sketches.get_run_command_output_level()
+    )
+
+    # The indexes haven't changed since they were updated
+    compile_sketches.run_arduino_cli_command.reset_mock()
+    compilesketches.get_url_validators.reset_mock()
+    get_object().update_board_manager_index(additional_urls=additional_urls)
+    compile_sketches.run_arduino_cli_command.assert_not_called()
+    compilesketches.get_url_validators.assert_any_call(
+        url=additional_urls[1],
+        validators={"etag": '"' + additional_urls[1] + '"', "last_modified": None}
+    )
+
+    # One of the indexes has changed
+    changed_urls.add(additional_urls[1])
+    get_object().update_board_manager_index(additional_urls=additional_urls)
+    compile_sketches.run_arduino_cli_command.assert_called_once()
+
+    # The indexes are not checked within the TTL
+    compile_sketches.run_arduino_cli_command.reset_mock()
+    compilesketches.get_url_validators.reset_mock()
+    get_object(board_manager_index_ttl="60").update_board_manager_index(additional_urls=additional_urls)
+    compilesketches.get_url_validators.assert_not_called()
+    compile_sketches.run_arduino_cli_command.assert_not_called()
+
+    # Unless the index file is missing
+    arduino_cli_data_directory_path.joinpath("package_foo_index.json").unlink()
+    get_object(board_manager_index_ttl="60").update_board_manager_index(additional_urls=additional_urls)
+    compilesketches.get_url_validators.assert_called_once_with(url=additional_urls[0], validators=None)
+    compile_sketches.run_arduino_cli_command.assert_called_once()
+
+
+def test_install_platforms_from_board_manager_snapshot(mocker, tmp_path):
+    platform_snapshot_path = tmp_path.joinpath("platform-snapshot")
+    arduino_cli_data_directory_path = tmp_path.joinpath("arduino15")
+    platform_list = [{compilesketches.CompileSketches.dependency_name_key: "arduino:avr",
+                      compilesketches.CompileSketches.dependency_version_key: "1.8.3"}]
+
+    def run_arduino_cli_command(self, command, enable_output):
+        if command[:2] == ["core", "install"]:
+            arduino_cli_data_directory_path.joinpath("packages", "arduino", "hardware", "avr", "1.8.3").mkdir(
+                parents=True
+            )
+            arduino_cli_data_directory_path.joinpath("packages", "arduino", "hardware", "avr", "1.8.3",
+                                                     "platform.txt").write_text("foo")
+            arduino_cli_data_directory_path.joinpath("package_index.json").write_text("{}")
+            arduino_cli_data_directory_path.joinpath("staging").mkdir()
+            arduino_cli_data_directory_path.joinpath("staging", "avr-1.8.3.tar.bz2").write_text("bar")
+
+    compile_sketches = get_compilesketches_object(cli_version="1.0.0",
+                                                  platform_snapshot_path=str(platform_snapshot_path))
+    compile_sketches.arduino_cli_version = "1.0.0"
+    compile_sketches.arduino_cli_data_directory_path = arduino_cli_data_directory_path
+    compile_sketches.board_manager_platforms_path = arduino_cli_data_directory_path.joinpath("packages")
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 side_effect=run_arduino_cli_command)
+    mocker.patch("compilesketches.CompileSketches.update_board_manager_index", autospec=True)
+
+    compile_sketches.install_platforms_from_board_manager(platform_list=platform_list)
+
+    compile_sketches.update_board_manager_index.assert_called_once()
+    assert compile_sketches.run_arduino_cli_command.call_count == 1
+    snapshot_path = compile_sketches.get_platform_snapshot_path(platform_list=platform_list)
+    assert snapshot_path.joinpath("packages", "arduino", "hardware", "avr", "1.8.3", "platform.txt").exists()
+    assert snapshot_path.joinpath("package_index.json").exists()
+    # The downloaded archives are not needed
+    assert not snapshot_path.joinpath("staging").exists()
+
+    # The platforms are restored from the snapshot, without installing them
+    compile_sketches.run_arduino_cli_command.reset_mock()
+    shutil.rmtree(path=arduino_cli_data_directory_path)
+    compile_sketches.installed_platforms = None
+    assert compile_sketches.get_installed_platforms() == {}
+
+    compile_sketches.update_board_manager_index.reset_mock()
+    compile_sketches.install_platforms_from_board_manager(platform_list=platform_list)
+
+    compile_sketches.update_board_manager_index.assert_not_called()
+    compile_sketches.run_arduino_cli_command.assert_not_called()
+    platform_txt_path = arduino_cli_data_directory_path.joinpath("packages", "arduino", "hardware", "avr", "1.8.3",
+                                                                 "platform.txt")
+    assert platform_txt_path.read_text() == "foo"
+    assert platform_txt_path.samefile(
+        snapshot_path.joinpath("packages", "arduino", "hardware", "avr", "1.8.3", "platform.txt")
+    )
+    # The index files are copied, not linked, since Arduino CLI modifies them in place
+    assert not arduino_cli_data_directory_path.joinpath("package_index.json").samefile(
+        snapshot_path.joinpath("package_index.json")
+    )
+    assert compile_sketches.get_installed_platforms() == {"arduino:avr": "1.8.3"}
+
+
+def test_get_platform_snapshot_path():
+    platform_list = [{compilesketches.CompileSketches.dependency_name_key: "arduino:avr",
+                      compilesketches.CompileSketches.dependency_version_key: "1.8.3"},
+                     {compilesketches.CompileSketches.dependency_name_key: "esp8266:esp8266",
+                      compilesketches.CompileSketches.dependency_version_key: "2.7.4",
+                      compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/index.json"}]
+
+    # Snapshots disabled
+    assert get_compilesketches_object().get_platform_snapshot_path(platform_list=platform_list) is None
+
+    compile_sketches = get_compilesketches_object(cli_version="latest", platform_snapshot_path="/foo/platform-snapshot")
+    compile_sketches.arduino_cli_version = "1.0.0"
+    snapshot_path = compile_sketches.get_platform_snapshot_path(platform_list=platform_list)
+    assert snapshot_path.parent == pathlib.Path("/foo/platform-snapshot")
+    assert compile_sketches.get_platform_snapshot_path(platform_list=platform_list) == snapshot_path
+
+    # The snapshot depends on the platforms and the Arduino CLI version
+    changed_platform_list = [dict(platform_list[0]), platform_list[1]]
+    changed_platform_list[0][compilesketches.CompileSketches.dependency_version_key] = "1.8.2"
+    assert compile_sketches.get_platform_snapshot_path(platform_list=changed_platform_list) != snapshot_path
+    # The Arduino CLI version is the installed version, not the cli-version input, which might be "latest"
+    other_compile_sketches = get_compilesketches_object(cli_version="latest",
+                                                        platform_snapshot_path="/foo/platform-snapshot")
+    other_compile_sketches.arduino_cli_version = "1.2.3"
+    assert other_compile_sketches.get_platform_snapshot_path(platform_list=platform_list) != snapshot_path
+    other_compile_sketches.arduino_cli_version = "1.0.0"
+    assert other_compile_sketches.get_platform_snapshot_path(platform_list=platform_list) == snapshot_path
+
+    # The installed version of platforms without a version is not known in advance
+    assert compile_sketches.get_platform_snapshot_path(
+        platform_list=[{compilesketches.CompileSketches.dependency_name_key: "arduino:avr"}]
+    ) is None
+    assert compile_sketches.get_platform_snapshot_path(
+        platform_list=[{compilesketches.CompileSketches.dependency_name_key: "arduino:avr",
+                        compilesketches.CompileSketches.dependency_version_key: "latest"}]
+    ) is None
+
+
+def test_read_lockfile(capsys, tmp_path):
+    lockfile_path = tmp_path.joinpath("lockfile.yml")
+
+    lockfile_path.write_text("cli-version: 0.11.0\nplatforms:\n  - name: arduino:avr\n    version: 1.8.3\n")
+    compile_sketches = get_compilesketches_object(cli_version="latest", lockfile_path=str(lockfile_path))
+    assert compile_sketches.lockfile == {"cli-version": "0.11.0",
+                                         "platforms": [{"name": "arduino:avr", "version": "1.8.3"}]}
+    # The Arduino CLI version is locked
+    assert compile_sketches.cli_version == "0.11.0"
+
+    for invalid_lockfile in ["- foo", "platforms: foo", "platforms: ["]:
+        lockfile_path.write_text(invalid_lockfile)
+        with pytest.raises(expected_exception=SystemExit, match="1"):
+            get_compilesketches_object(lockfile_path=str(lockfile_path))
+        assert capsys.readouterr().out.strip() == "::error::Invalid lockfile: " + str(lockfile_path)
+
+
+def test_write_lockfile(mocker, monkeypatch, tmp_path):
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(tmp_path))
+    lockfile_path = tmp_path.joinpath("lockfile.yml")
+    repository_dependency = {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.git",
+                             compilesketches.CompileSketches.dependency_version_key: "main"}
+    download_dependency = {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.zip"}
+
+    compile_sketches = get_compilesketches_object(lockfile_path=str(lockfile_path))
+    compile_sketches.arduino_cli_version = "0.11.0"
+    compile_sketches.platform_dependencies.manager = [
+        {compilesketches.CompileSketches.dependency_name_key: "arduino:avr"},
+        {compilesketches.CompileSketches.dependency_name_key: "foo:bar"}
+    ]
+    compile_sketches.platform_dependencies.repository = [repository_dependency]
+    compile_sketches.library_dependencies.manager = [{compilesketches.CompileSketches.dependency_name_key: "Servo"}]
+    compile_sketches.library_dependencies.path = [
+        {compilesketches.CompileSketches.dependency_source_path_key: str(tmp_path)},
+        {compilesketches.CompileSketches.dependency_source_path_key: str(tmp_path.joinpath("foo"))}
+    ]
+    compile_sketches.library_dependencies.download = [download_dependency]
+    compile_sketches.library_manager_releases = [{"name": "Servo",
+                                                  "version": "1.1.6",
+                                                  "url": "https://example.com/Servo-1.1.6.zip",
+                                                  "checksum": "SHA-256:foo",
+                                                  "size": 42}]
+    compile_sketches.repository_commits[("https://example.com/foo.git", "main")] = "foo-commit"
+    compile_sketches.download_hashes["https://example.com/foo.zip"] = "bar"
+    mocker.patch("compilesketches.CompileSketches.get_installed_platforms", autospec=True,
+                 return_value={"arduino:avr": "1.8.3"})
+
+    compile_sketches.write_lockfile()
+
+    assert yaml.load(stream=lockfile_path.read_text(), Loader=yaml.SafeLoader) == {
+        "cli-version": "0.11.0",
+        "platforms": [{"name": "arduino:avr", "version": "1.8.3"},
+                      # Not installed, so it is left as it was
+                      {"name": "foo:bar"},
+                      {"source-url": "https://example.com/foo.git",
+                       "version": "foo-commit"}],
+        "libraries": [{"name": "Servo"},
+                      {"source-path": "."},
+                      {"source-path": "foo"},
+                      {"source-url": "https://example.com/foo.zip", "checksum": "SHA-256:bar"}],
+        "library-manager-releases": [{"name": "Servo",
+                                      "version": "1.1.6",
+                                      "url": "https://example.com/Servo-1.1.6.zip",
+                                      "checksum": "SHA-256:foo"}]
+    }
+
+
+def test_install_from_lockfile(mocker, tmp_path):
+    lockfile_path = tmp_path.joinpath("lockfile.yml")
+    lockfile_path.write_text(
+        yaml.dump(data={"platforms": [{"name": "arduino:avr", "version": "1.8.3"}],
+                        "libraries": [{"name": "Servo"}],
+                        "library-manager-releases": [{"name": "Servo",
+                                                      "version": "1.1.6",
+                                                      "url": "https://example.com/Servo-1.1.6.zip",
+                                                      "checksum": "SHA-256:foo"}]})
+    )
+
+    compile_sketches = get_compilesketches_object(platforms="- name: foo:bar",
+                                                  libraries="- name: Foo",
+                                                  lockfile_path=str(lockfile_path))
+
+    mocker.patch("compilesketches.CompileSketches.install_platforms_from_board_manager", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.resolve_library_manager_dependencies", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.install_library_manager_releases", autospec=True)
+
+    compile_sketches.install_platforms()
+    compile_sketches.install_libraries()
+
+    # The dependencies are installed as locked, not as defined by the inputs
+    compile_sketches.install_platforms_from_board_manager.assert_called_once_with(
+        compile_sketches,
+        platform_list=[{"name": "arduino:avr", "version": "1.8.3"}]
+    )
+    compile_sketches.resolve_library_manager_dependencies.assert_not_called()
+    compile_sketches.install_library_manager_releases.assert_called_once_with(
+        compile_sketches,
+        library_release_list=[{"name": "Servo",
+                               "version": "1.1.6",
+                               "url": "https://example.com/Servo-1.1.6.zip",
+                               "checksum": "SHA-256:foo"}]
+    )
 
 
 @pytest.mark.parametrize("verbose, expected_output_level",
@@ -624,6 +1259,7 @@ def test_run_arduino_cli_command(mocker, verbose):
     command = ["foo", "command"]
     enable_output = unittest.mock.sentinel.enable_output
     exit_on_failure = unittest.mock.sentinel.exit_on_failure
+    environment = unittest.mock.sentinel.environment
     arduino_cli_installation_path = pathlib.PurePath("fooCLIinstallationPath")
 
     compile_sketches = get_compilesketches_object()
@@ -635,7 +1271,8 @@ def test_run_arduino_cli_command(mocker, verbose):
 
     assert compile_sketches.run_arduino_cli_command(command=command,
                                                     enable_output=enable_output,
-                                                    exit_on_failure=exit_on_failure) == run_command_return
+                                                    exit_on_failure=exit_on_failure,
+                                                    environment=environment) == run_command_return
 
     expected_run_command_command = [arduino_cli_installation_path.joinpath("arduino-cli")]
     expected_run_command_command.extend(command)
@@ -645,7 +1282,8 @@ def test_run_arduino_cli_command(mocker, verbose):
         compile_sketches,
         command=expected_run_command_command,
         enable_output=enable_output,
-        exit_on_failure=exit_on_failure
+        exit_on_failure=exit_on_failure,
+        environment=environment
     )
 
 
@@ -699,7 +1337,16 @@ def test_run_command(capsys, mocker, enable_output, exit_on_failure, returncode,
     assert capsys.readouterr().out.strip() == expected_output
 
     # noinspection PyUnresolvedReferences
-    subprocess.run.assert_called_once_with(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    subprocess.run.assert_called_once_with(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                           env=None)
+
+    # Test custom environment
+    environment = {"FOO": "bar"}
+    mocker.resetall()
+    compile_sketches.run_command(command=command, exit_on_failure=False, environment=environment)
+    # noinspection PyUnresolvedReferences
+    subprocess.run.assert_called_once_with(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                           env=environment)
 
 
 @pytest.mark.parametrize(
@@ -773,29 +1420,26 @@ def test_install_platforms_from_path(capsys, mocker, path_exists, platform_list)
 
 
 @pytest.mark.parametrize(
-    "platform,"
-    "command_data_stdout,"
-    "expected_installation_path",
+    "platform, installed_platforms, expected_installation_path, expected_is_overwrite",
     # No match to previously installed platforms
     [({compilesketches.CompileSketches.dependency_name_key: "foo:bar"},
-      "[{\"ID\": \"asdf:zxcv\"}]",
-      pathlib.PurePath("/foo/UserPlatformsPath/foo/bar")),
+      {"asdf:zxcv": "1.2.3"},
+      pathlib.PurePath("/foo/UserPlatformsPath/foo/bar"),
+      False),
      # Match with previously installed platform
      ({compilesketches.CompileSketches.dependency_name_key: "foo:bar"},
-      "[{\"ID\": \"foo:bar\", \"Installed\": \"1.2.3\"}]",
-      pathlib.PurePath("/foo/BoardManagerPlatformsPath/foo/hardware/bar/1.2.3"))]
+      {"foo:bar": "1.2.3"},
+      pathlib.PurePath("/foo/BoardManagerPlatformsPath/foo/hardware/bar/1.2.3"),
+      True)]
 )
 def test_get_platform_installation_path(mocker,
                                         platform,
-                                        command_data_stdout,
-                                        expected_installation_path):
-    class CommandData:
-        def __init__(self, stdout):
-            self.stdout = stdout
-
-    command_data = CommandData(stdout=command_data_stdout)
-
-    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True, return_value=command_data)
+                                        installed_platforms,
+                                        expected_installation_path,
+                                        expected_is_overwrite):
+    mocker.patch("compilesketches.CompileSketches.get_installed_platforms", autospec=True,
+                 return_value=installed_platforms)
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True)
 
     compile_sketches = get_compilesketches_object()
     compile_sketches.user_platforms_path = pathlib.PurePath("/foo/UserPlatformsPath")
@@ -803,10 +1447,44 @@ def test_get_platform_installation_path(mocker,
 
     platform_installation_path = compile_sketches.get_platform_installation_path(platform=platform)
     assert platform_installation_path.path == expected_installation_path
+    assert platform_installation_path.is_overwrite == expected_is_overwrite
+
+    # No subprocesses are needed to determine the installation path
+    compilesketches.CompileSketches.run_arduino_cli_command.assert_not_called()
+
+
+def test_get_installed_platforms(tmp_path):
+    board_manager_platforms_path = tmp_path.joinpath("packages")
+    for release_path, metadata_filename in [("arduino/hardware/avr/1.8.2", "installed.json"),
+                                            ("arduino/hardware/avr/1.8.10", "installed.json"),
+                                            ("arduino/hardware/samd/1.8.6", "platform.txt"),
+                                            ("arduino/hardware/megaavr/1.8.6", None),
+                                            ("esp8266/hardware/esp8266/2.7.4", "installed.json")]:
+        board_manager_platforms_path.joinpath(release_path).mkdir(parents=True)
+        if metadata_filename is not None:
+            board_manager_platforms_path.joinpath(release_path, metadata_filename).touch()
+    # Tools are not platforms
+    board_manager_platforms_path.joinpath("arduino", "tools", "avrdude", "6.3.0").mkdir(parents=True)
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.board_manager_platforms_path = board_manager_platforms_path
+
+    assert compile_sketches.get_installed_platforms() == {"arduino:avr": "1.8.10",
+                                                          "arduino:samd": "1.8.6",
+                                                          "esp8266:esp8266": "2.7.4"}
 
-    run_arduino_cli_command_calls = [unittest.mock.call(compile_sketches, command=["core", "update-index"]),
-                                     unittest.mock.call(compile_sketches, command=["core", "list", "--format", "json"])]
-    compilesketches.CompileSketches.run_arduino_cli_command.assert_has_calls(calls=run_arduino_cli_command_calls)
+    # The index is only built once
+    shutil.rmtree(path=board_manager_platforms_path)
+    assert compile_sketches.get_installed_platforms() == {"arduino:avr": "1.8.10",
+                                                          "arduino:samd": "1.8.6",
+                                                          "esp8266:esp8266": "2.7.4"}
+
+
+def test_get_installed_platforms_no_packages(tmp_path):
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.board_manager_platforms_path = tmp_path.joinpath("packages")
+
+    assert compile_sketches.get_installed_platforms() == {}
 
 
 def test_install_platforms_from_repository(mocker):
@@ -814,7 +1492,8 @@ def test_install_platforms_from_repository(mocker):
         {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url,
          compilesketches.CompileSketches.dependency_source_path_key: unittest.mock.sentinel.source_path,
          compilesketches.CompileSketches.dependency_destination_name_key: unittest.mock.sentinel.destination_name},
-        {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2}
+        {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2,
+         compilesketches.CompileSketches.dependency_submodules_key: ["foo"]}
     ]
 
     git_ref = unittest.mock.sentinel.git_ref
@@ -828,7 +1507,7 @@ def test_install_platforms_from_repository(mocker):
     platform_installation_path.path = pathlib.Path("/foo/PlatformInstallationPathParent/PlatformInstallationPathName")
 
     expected_source_path_list = [unittest.mock.sentinel.source_path, "."]
-    expected_destination_name_list = [unittest.mock.sentinel.destination_name, None]
+    expected_submodules_list = [None, ("foo",)]
 
     compile_sketches = get_compilesketches_object()
 
@@ -843,9 +1522,9 @@ def test_install_platforms_from_repository(mocker):
     get_repository_dependency_ref_calls = []
     get_platform_installation_path_calls = []
     install_from_repository_calls = []
-    for platform, expected_source_path, expected_destination_name in zip(platform_list,
-                                                                         expected_source_path_list,
-                                                                         expected_destination_name_list):
+    for platform, expected_source_path, expected_submodules in zip(platform_list,
+                                                                   expected_source_path_list,
+                                                                   expected_submodules_list):
         get_repository_dependency_ref_calls.append(unittest.mock.call(compile_sketches, dependency=platform))
         get_platform_installation_path_calls.append(unittest.mock.call(compile_sketches, platform=platform))
         install_from_repository_calls.append(
@@ -855,7 +1534,8 @@ def test_install_platforms_from_repository(mocker):
                                source_path=expected_source_path,
                                destination_parent_path=platform_installation_path.path.parent,
                                destination_name=platform_installation_path.path.name,
-                               force=platform_installation_path.is_overwrite)
+                               force=platform_installation_path.is_overwrite,
+                               submodules=expected_submodules)
         )
 
     compile_sketches.get_repository_dependency_ref.assert_has_calls(calls=get_repository_dependency_ref_calls)
@@ -877,8 +1557,10 @@ def test_install_platforms_from_download(mocker):
         {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url1,
          compilesketches.CompileSketches.dependency_source_path_key: unittest.mock.sentinel.source_path,
          compilesketches.CompileSketches.dependency_destination_name_key: unittest.mock.sentinel.destination_name},
-        {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2}
+        {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2,
+         compilesketches.CompileSketches.dependency_checksum_key: unittest.mock.sentinel.checksum}
     ]
+    expected_checksum_list = [None, unittest.mock.sentinel.checksum]
 
     class PlatformInstallationPath:
         def __init__(self):
@@ -901,7 +1583,8 @@ def test_install_platforms_from_download(mocker):
 
     get_platform_installation_path_calls = []
     install_from_download_calls = []
-    for platform, expected_source_path, in zip(platform_list, expected_source_path_list):
+    for platform, expected_source_path, expected_checksum in zip(platform_list, expected_source_path_list,
+                                                                 expected_checksum_list):
         get_platform_installation_path_calls.append(unittest.mock.call(compile_sketches, platform=platform))
         install_from_download_calls.append(
             unittest.mock.call(compile_sketches,
@@ -909,7 +1592,8 @@ def test_install_platforms_from_download(mocker):
                                source_path=expected_source_path,
                                destination_parent_path=platform_installation_path.path.parent,
                                destination_name=platform_installation_path.path.name,
-                               force=platform_installation_path.is_overwrite)
+                               force=platform_installation_path.is_overwrite,
+                               checksum=expected_checksum)
         )
     compile_sketches.install_from_download.assert_has_calls(calls=install_from_download_calls)
 
@@ -959,10 +1643,12 @@ def test_install_platforms_from_download(mocker):
       [],
       [{"source-url": "https://example.com/foo.zip"}])]
 )
-def test_install_libraries(mocker, libraries, expected_manager, expected_path, expected_repository,
+def test_install_libraries(monkeypatch, mocker, libraries, expected_manager, expected_path, expected_repository,
                            expected_download):
     libraries_path = pathlib.Path("/foo/LibrariesPath")
 
+    monkeypatch.setenv("GITHUB_REPOSITORY", "foo/bar")
+
     compile_sketches = get_compilesketches_object(libraries=libraries)
     compile_sketches.libraries_path = libraries_path
 
@@ -970,6 +1656,7 @@ def test_install_libraries(mocker, libraries, expected_manager, expected_path, e
     mocker.patch("compilesketches.CompileSketches.install_libraries_from_path", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_libraries_from_repository", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_libraries_from_download", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.fetch_dependency", autospec=True)
 
     compile_sketches.install_libraries()
 
@@ -980,40 +1667,302 @@ def test_install_libraries(mocker, libraries, expected_manager, expected_path, e
     else:
         compile_sketches.install_libraries_from_library_manager.assert_not_called()
 
-    if len(expected_path) > 0:
-        compile_sketches.install_libraries_from_path.assert_called_once_with(
-            compile_sketches,
-            library_list=expected_path)
-    else:
-        compile_sketches.install_libraries_from_path.assert_not_called()
+    # The libraries from other sources are installed individually
+    assert compile_sketches.install_libraries_from_path.call_args_list == [
+        unittest.mock.call(compile_sketches, library_list=[library]) for library in expected_path
+    ]
+    assert compile_sketches.install_libraries_from_repository.call_args_list == [
+        unittest.mock.call(compile_sketches, library_list=[library]) for library in expected_repository
+    ]
+    assert compile_sketches.install_libraries_from_download.call_args_list == [
+        unittest.mock.call(compile_sketches, library_list=[library]) for library in expected_download
+    ]
+    assert compile_sketches.fetch_dependency.call_count == len(expected_repository) + len(expected_download)
 
-    if len(expected_repository) > 0:
-        compile_sketches.install_libraries_from_repository.assert_called_once_with(
-            compile_sketches,
-            library_list=expected_repository)
-    else:
-        compile_sketches.install_libraries_from_repository.assert_not_called()
 
-    if len(expected_download) > 0:
-        compile_sketches.install_libraries_from_download.assert_called_once_with(
-            compile_sketches,
-            library_list=expected_download)
-    else:
-        compile_sketches.install_libraries_from_download.assert_not_called()
+def test_get_dependency_installation_task_list():
+    dependency_list = compilesketches.CompileSketches.Dependencies()
+    dependency_list.manager = [{compilesketches.CompileSketches.dependency_name_key: "Foo"}]
+    dependency_list.path = [{compilesketches.CompileSketches.dependency_source_path_key: "/foo/Bar"}]
+    dependency_list.repository = [
+        {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Baz.git"},
+        # Same repository as the previous dependency and same destination as the path dependency
+        {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Baz.git",
+         compilesketches.CompileSketches.dependency_destination_name_key: "Bar"}
+    ]
+    dependency_list.download = [
+        {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Qux.zip",
+         compilesketches.CompileSketches.dependency_destination_name_key: "Qux"}
+    ]
+
+    installations = []
 
+    def get_destination_key(dependency, source_type):
+        if source_type == "path":
+            return "Bar"
+        if source_type == "repository":
+            return dependency.get(compilesketches.CompileSketches.dependency_destination_name_key, "Baz")
+        return dependency[compilesketches.CompileSketches.dependency_destination_name_key]
+
+    compile_sketches = get_compilesketches_object()
 
-def test_install_libraries_from_library_manager(mocker):
+    task_list = compile_sketches.get_dependency_installation_task_list(
+        dependency_list=dependency_list,
+        install_from_manager=lambda library_list: installations.append(("manager", library_list)),
+        installers={source_type: functools.partial(lambda source_type_name, library_list: installations.append(
+            (source_type_name, library_list)
+        ), source_type) for source_type in ["path", "repository", "download"]},
+        get_destination_key=get_destination_key
+    )
+
+    assert [task["dependencies"] for task in task_list] == [
+        # Manager installation
+        [],
+        # Path installation
+        [0],
+        # Clone
+        [],
+        # Repository installation with unique destination
+        [0, 2],
+        # Repository installation from the same clone, overriding the path installation
+        [0, 2, 1],
+        # Download
+        [],
+        # Download installation with unique destination
+        [0, 5]
+    ]
+
+    for task in task_list[:2]:
+        task["function"]()
+    assert installations == [("manager", dependency_list.manager), ("path", [dependency_list.path[0]])]
+
+    # Destinations which can't be determined in advance are installed in order
+    task_list = compile_sketches.get_dependency_installation_task_list(
+        dependency_list=dependency_list,
+        install_from_manager=lambda library_list: None,
+        installers={"path": lambda library_list: None, "repository": lambda library_list: None,
+                    "download": lambda library_list: None},
+        get_destination_key=lambda dependency, source_type: None
+    )
+    assert [task["dependencies"] for task in task_list] == [[], [0], [], [0, 2, 1], [0, 2, 1, 3], [], [0, 5, 1, 3, 4]]
+
+    # Whether the dependencies are already installed is only checked by the fetch tasks, not while the tasks are
+    # listed
+    is_dependency_installed = unittest.mock.Mock(side_effect=lambda dependency, source_type: source_type == "download")
+    task_list = compile_sketches.get_dependency_installation_task_list(
+        dependency_list=dependency_list,
+        install_from_manager=lambda library_list: None,
+        installers={"path": lambda library_list: None, "repository": lambda library_list: None,
+                    "download": lambda library_list: None},
+        get_destination_key=get_destination_key,
+        is_dependency_installed=is_dependency_installed
+    )
+    assert [task["dependencies"] for task in task_list] == [[], [0], [], [0, 2], [0, 2, 1], [], [0, 5]]
+    is_dependency_installed.assert_not_called()
+    assert task_list[2]["function"].args == (
+        ("repository", "https://example.com/Baz.git", None, None, None),
+        [(dependency_list.repository[0], "repository"), (dependency_list.repository[1], "repository")],
+        is_dependency_installed
+    )
+
+
+def test_fetch_uninstalled_dependency(mocker):
+    fetch_key = ("download", "https://example.com/Foo.zip", None, None)
+    dependency_list = [({"source-url": "https://example.com/Foo.zip"}, "download"),
+                       ({"source-url": "https://example.com/Foo.zip", "destination-name": "Bar"}, "download")]
+
+    compile_sketches = get_compilesketches_object()
+
+    mocker.patch("compilesketches.CompileSketches.fetch_dependency", autospec=True)
+
+    # All the dependencies from the fetch are installed
+    compile_sketches.fetch_uninstalled_dependency(fetch_key=fetch_key,
+                                                  dependency_list=dependency_list,
+                                                  is_dependency_installed=lambda dependency, source_type: True)
+    compile_sketches.fetch_dependency.assert_not_called()
+
+    # One of the dependencies from the fetch is not installed
+    compile_sketches.fetch_uninstalled_dependency(
+        fetch_key=fetch_key,
+        dependency_list=dependency_list,
+        is_dependency_installed=lambda dependency, source_type: "destination-name" not in dependency
+    )
+    compile_sketches.fetch_dependency.assert_called_once_with(compile_sketches, fetch_key)
+
+    compile_sketches.fetch_dependency.reset_mock()
+    compile_sketches.fetch_uninstalled_dependency(fetch_key=fetch_key,
+                                                  dependency_list=dependency_list,
+                                                  is_dependency_installed=None)
+    compile_sketches.fetch_dependency.assert_called_once_with(compile_sketches, fetch_key)
+
+
+def test_is_library_dependency_installed(mocker, tmp_path):
+    url = "https://example.com/foo/Foo.git"
+    dependency = {compilesketches.CompileSketches.dependency_source_url_key: url,
+                  compilesketches.CompileSketches.dependency_version_key: "1.0.0"}
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.libraries_path = tmp_path
+
+    mocker.patch("compilesketches.CompileSketches.get_repository_commit", autospec=True, return_value="a" * 40)
+
+    # There is no network lookup when there is no installation made by a previous run
+    assert compile_sketches.is_library_dependency_installed(dependency=dependency, source_type="repository") is False
+    compile_sketches.get_repository_commit.assert_not_called()
+
+    tmp_path.joinpath("Foo").mkdir()
+    assert compile_sketches.is_library_dependency_installed(dependency=dependency, source_type="repository") is False
+    compile_sketches.get_repository_commit.assert_not_called()
+
+    tmp_path.joinpath("Foo", compilesketches.CompileSketches.installation_receipt_file_name).write_text(
+        json.dumps({"source-url": url, "source-path": ".", "submodules": None, "commit": "a" * 40,
+                    "contents": compilesketches.get_path_hash(path=tmp_path.joinpath("Foo"))})
+    )
+    assert compile_sketches.is_library_dependency_installed(dependency=dependency, source_type="repository") is True
+    compile_sketches.get_repository_commit.assert_called_once_with(compile_sketches, url=url, git_ref="1.0.0")
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_run_task_graph(jobs):
+    event_list = []
+    event_list_lock = threading.Lock()
+
+    def task(name):
+        with event_list_lock:
+            event_list.append(name)
+
+    compile_sketches = get_compilesketches_object(jobs=jobs)
+
+    task_list = [
+        {"function": functools.partial(task, "a"), "dependencies": []},
+        {"function": functools.partial(task, "b"), "dependencies": [0]},
+        {"function": functools.partial(task, "c"), "dependencies": []},
+        {"function": functools.partial(task, "d"), "dependencies": [1, 2]}
+    ]
+    compile_sketches.run_task_graph(task_list=task_list)
+
+    assert sorted(event_list) == ["a", "b", "c", "d"]
+    assert event_list.index("a") < event_list.index("b") < event_list.index("d")
+    assert event_list.index("c") < event_list.index("d")
+
+    # A failed task stops the installation
+    def failed_task():
+        sys.exit(1)
+
+    event_list = []
+    task_list = [
+        {"function": failed_task, "dependencies": []},
+        {"function": functools.partial(task, "b"), "dependencies": [0]}
+    ]
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.run_task_graph(task_list=task_list)
+    assert event_list == []
+
+
+@pytest.mark.parametrize(
+    "dependency, source_type, expected_destination_name",
+    [({compilesketches.CompileSketches.dependency_destination_name_key: "Foo",
+       compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Bar.zip"}, "download", "Foo"),
+     ({compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Bar.zip"}, "download", None),
+     ({compilesketches.CompileSketches.dependency_source_path_key: "/foo/Bar"}, "path", "Bar"),
+     ({compilesketches.CompileSketches.dependency_source_path_key: os.environ["GITHUB_WORKSPACE"]}, "path",
+      "RepositoryName"),
+     ({compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Bar.git/"}, "repository",
+      "Bar"),
+     ({compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Bar.git",
+       compilesketches.CompileSketches.dependency_source_path_key: "./src/Baz"}, "repository", "Baz"),
+     ({compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/Bar.git",
+       compilesketches.CompileSketches.dependency_source_path_key: "src/.."}, "repository", None)]
+)
+def test_get_library_destination_name(monkeypatch, dependency, source_type, expected_destination_name):
+    monkeypatch.setenv("GITHUB_REPOSITORY", "foo/RepositoryName")
+
+    compile_sketches = get_compilesketches_object()
+
+    assert compile_sketches.get_library_destination_name(dependency=dependency,
+                                                         source_type=source_type) == expected_destination_name
+
+
+def test_fetch_dependency(mocker):
+    compile_sketches = get_compilesketches_object()
+
+    mocker.patch("compilesketches.CompileSketches.get_repository_clone", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.get_extracted_download", autospec=True)
+
+    assert compile_sketches.get_fetch_key(
+        dependency={compilesketches.CompileSketches.dependency_source_path_key: "/foo"},
+        source_type="path"
+    ) is None
+
+    fetch_key = compile_sketches.get_fetch_key(
+        dependency={compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.git",
+                    compilesketches.CompileSketches.dependency_version_key: "1.2.3"},
+        source_type="repository"
+    )
+    compile_sketches.fetch_dependency(fetch_key)
+    compile_sketches.get_repository_clone.assert_called_once_with(compile_sketches,
+                                                                  url="https://example.com/foo.git",
+                                                                  git_ref="1.2.3",
+                                                                  sparse_path=None,
+                                                                  submodules=None)
+
+    # The clone is limited to the source path
+    compile_sketches.get_repository_clone.reset_mock()
+    fetch_key = compile_sketches.get_fetch_key(
+        dependency={compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.git",
+                    compilesketches.CompileSketches.dependency_source_path_key: "./libraries/Foo/",
+                    compilesketches.CompileSketches.dependency_submodules_key: ["libraries/Foo/src/Bar"]},
+        source_type="repository"
+    )
+    compile_sketches.fetch_dependency(fetch_key)
+    compile_sketches.get_repository_clone.assert_called_once_with(compile_sketches,
+                                                                  url="https://example.com/foo.git",
+                                                                  git_ref=None,
+                                                                  sparse_path="libraries/Foo",
+                                                                  submodules=("libraries/Foo/src/Bar",))
+
+    fetch_key = compile_sketches.get_fetch_key(
+        dependency={compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.zip",
+                    compilesketches.CompileSketches.dependency_checksum_key: "SHA-256:foo"},
+        source_type="download"
+    )
+    compile_sketches.fetch_dependency(fetch_key)
+    compile_sketches.get_extracted_download.assert_called_once_with(compile_sketches,
+                                                                    url="https://example.com/foo.zip",
+                                                                    checksum="SHA-256:foo",
+                                                                    sparse_path=None)
+
+
+@pytest.mark.parametrize("resolved", [True, False])
+def test_install_libraries_from_library_manager(mocker, resolved):
     run_command_output_level = unittest.mock.sentinel.run_command_output_level
+    library_release_list = unittest.mock.sentinel.library_release_list
     compile_sketches = get_compilesketches_object()
 
     library_list = [{compile_sketches.dependency_name_key: "foo"}, {compile_sketches.dependency_name_key: "bar"}]
 
+    mocker.patch("compilesketches.CompileSketches.resolve_library_manager_dependencies", autospec=True,
+                 return_value=library_release_list if resolved else None)
+    mocker.patch("compilesketches.CompileSketches.install_library_manager_releases", autospec=True)
     mocker.patch("compilesketches.CompileSketches.get_run_command_output_level", autospec=True,
                  return_value=run_command_output_level)
     mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True)
 
     compile_sketches.install_libraries_from_library_manager(library_list=library_list)
 
+    compile_sketches.resolve_library_manager_dependencies.assert_called_once_with(compile_sketches,
+                                                                                  library_list=library_list)
+    if resolved:
+        # The resolved releases are installed in a single batch
+        compile_sketches.install_library_manager_releases.assert_called_once_with(
+            compile_sketches,
+            library_release_list=library_release_list
+        )
+        compile_sketches.run_arduino_cli_command.assert_not_called()
+        return
+
+    compile_sketches.install_library_manager_releases.assert_not_called()
+
     lib_install_base_command = ["lib", "install"]
 
     run_arduino_cli_command_calls = []
@@ -1032,6 +1981,157 @@ def test_install_libraries_from_library_manager(mocker):
     compile_sketches.run_arduino_cli_command.assert_has_calls(calls=run_arduino_cli_command_calls)
 
 
+def get_library_index_entry(name, version, dependencies=None):
+    library_index_entry = {"name": name,
+                           "version": version,
+                           "url": "https://example.com/" + name + "-" + version + ".zip",
+                           "checksum": "SHA-256:" + hashlib.sha256((name + version).encode()).hexdigest()}
+    if dependencies is not None:
+        library_index_entry["dependencies"] = dependencies
+
+    return library_index_entry
+
+
+library_index_entries = [
+    get_library_index_entry(name="Foo", version="1.0.0", dependencies=[{"name": "Bar"}]),
+    get_library_index_entry(name="Foo", version="1.10.0", dependencies=[{"name": "Bar"}, {"name": "Baz"}]),
+    get_library_index_entry(name="Foo", version="1.2.0", dependencies=[{"name": "Bar"}]),
+    get_library_index_entry(name="Bar", version="2.0.0"),
+    get_library_index_entry(name="Bar", version="2.0.0-beta"),
+    get_library_index_entry(name="Bar", version="1.0.0"),
+    get_library_index_entry(name="Baz", version="1.0.0", dependencies=[{"name": "Foo"}]),
+    get_library_index_entry(name="Qux", version="1.0.0", dependencies=[{"name": "Bar", "version": "=1.0.0"}]),
+    get_library_index_entry(name="Quux", version="1.0.0", dependencies=[{"name": "Bar", "version": ">=1.0.0"}]),
+]
+
+
+def test_get_library_index(mocker, tmp_path):
+    run_command_output_level = unittest.mock.sentinel.run_command_output_level
+    tmp_path.joinpath("library_index.json").write_text(json.dumps({"libraries": library_index_entries}))
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.arduino_cli_data_directory_path = tmp_path
+
+    mocker.patch("compilesketches.CompileSketches.get_run_command_output_level", autospec=True,
+                 return_value=run_command_output_level)
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True)
+
+    library_releases = compile_sketches.get_library_index()
+
+    compile_sketches.run_arduino_cli_command.assert_called_once_with(compile_sketches,
+                                                                     command=["lib", "update-index"],
+                                                                     enable_output=run_command_output_level)
+    assert sorted(library_releases) == ["Bar", "Baz", "Foo", "Quux", "Qux"]
+    assert [library_release["version"] for library_release in library_releases["Foo"]] == ["1.0.0", "1.10.0", "1.2.0"]
+
+
+@pytest.mark.parametrize(
+    "library_list, expected_release_list",
+    [([{"name": "Foo"}], [("Foo", "1.10.0"), ("Bar", "2.0.0"), ("Baz", "1.0.0")]),
+     ([{"name": "Foo", "version": "latest"}], [("Foo", "1.10.0"), ("Bar", "2.0.0"), ("Baz", "1.0.0")]),
+     ([{"name": "Foo", "version": "1.0.0"}], [("Foo", "1.0.0"), ("Bar", "2.0.0")]),
+     ([{"name": "Foo@1.2.0"}], [("Foo", "1.2.0"), ("Bar", "2.0.0")]),
+     # A library from later in the list overrides the releases installed for earlier libraries
+     ([{"name": "Bar", "version": "1.0.0"}, {"name": "Foo", "version": "1.0.0"}], [("Bar", "2.0.0"), ("Foo", "1.0.0")]),
+     ([{"name": "Foo", "version": "1.0.0"}, {"name": "Bar", "version": "1.0.0"}], [("Foo", "1.0.0"), ("Bar", "1.0.0")]),
+     # Circular dependency
+     ([{"name": "Baz"}], [("Baz", "1.0.0"), ("Foo", "1.10.0"), ("Bar", "2.0.0")]),
+     ([{"name": "Qux"}], [("Qux", "1.0.0"), ("Bar", "1.0.0")]),
+     # Not in the index
+     ([{"name": "Foo"}, {"name": "Corge"}], None),
+     ([{"name": "Foo", "version": "3.0.0"}], None),
+     # Unsupported version constraint
+     ([{"name": "Quux"}], None)]
+)
+def test_resolve_library_manager_dependencies(mocker, library_list, expected_release_list):
+    library_releases = {}
+    for library_index_entry in library_index_entries:
+        library_releases.setdefault(library_index_entry["name"], []).append(library_index_entry)
+
+    compile_sketches = get_compilesketches_object()
+
+    mocker.patch("compilesketches.CompileSketches.get_library_index", autospec=True, return_value=library_releases)
+
+    library_release_list = compile_sketches.resolve_library_manager_dependencies(library_list=library_list)
+
+    if expected_release_list is None:
+        assert library_release_list is None
+    else:
+        assert [(library_release["name"], library_release["version"])
+                for library_release in library_release_list] == expected_release_list
+
+
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_install_library_manager_releases(mocker, tmp_path, jobs):
+    library_release_list = [get_library_index_entry(name="Foo Bar", version="1.0.0"),
+                            get_library_index_entry(name="Baz", version="1.0.0")]
+    libraries_path = tmp_path.joinpath("libraries")
+
+    def get_extracted_download(self, url, checksum):
+        archive_root_path = tmp_path.joinpath("extracted", url.rsplit("/", maxsplit=1)[1])
+        archive_root_path.mkdir(parents=True)
+        archive_root_path.joinpath("library.properties").write_text(
+            "version=" + url.rsplit("-", maxsplit=1)[1][:-len(".zip")] + "\n"
+        )
+        return archive_root_path
+
+    compile_sketches = get_compilesketches_object(jobs=jobs)
+    compile_sketches.libraries_path = libraries_path
+
+    mocker.patch("compilesketches.CompileSketches.get_extracted_download", autospec=True,
+                 side_effect=get_extracted_download)
+
+    compile_sketches.install_library_manager_releases(library_release_list=library_release_list)
+
+    # The archives are verified against the checksums from the index
+    for library_release in library_release_list:
+        compile_sketches.get_extracted_download.assert_any_call(compile_sketches,
+                                                                url=library_release["url"],
+                                                                checksum=library_release["checksum"])
+    assert filecmp.cmp(f1=libraries_path.joinpath("Foo_Bar", "library.properties"),
+                       f2=tmp_path.joinpath("extracted", "Foo Bar-1.0.0.zip", "library.properties"))
+    assert filecmp.cmp(f1=libraries_path.joinpath("Baz", "library.properties"),
+                       f2=tmp_path.joinpath("extracted", "Baz-1.0.0.zip", "library.properties"))
+
+    # The installed releases are not downloaded again
+    compile_sketches.get_extracted_download.reset_mock()
+    shutil.rmtree(path=tmp_path.joinpath("extracted"))
+    library_release_list[1] = get_library_index_entry(name="Baz", version="1.1.0")
+    compile_sketches.install_library_manager_releases(library_release_list=library_release_list)
+
+    compile_sketches.get_extracted_download.assert_called_once_with(compile_sketches,
+                                                                    url=library_release_list[1]["url"],
+                                                                    checksum=library_release_list[1]["checksum"])
+    assert libraries_path.joinpath("Foo_Bar", "library.properties").read_text() == "version=1.0.0\n"
+    assert libraries_path.joinpath("Baz", "library.properties").read_text() == "version=1.1.0\n"
+
+
+@pytest.mark.parametrize("version, expected_version",
+                         [("", "1.10.0"),
+                          (None, "1.10.0"),
+                          ("1.2.0", "1.2.0"),
+                          ("1.3.0", None)])
+def test_get_library_release(version, expected_version):
+    library_releases = [library_index_entry for library_index_entry in library_index_entries
+                        if library_index_entry["name"] == "Foo"]
+
+    library_release = compilesketches.get_library_release(library_releases=library_releases, version=version)
+
+    if expected_version is None:
+        assert library_release is None
+    else:
+        assert library_release["version"] == expected_version
+
+    assert compilesketches.get_library_release(library_releases=[], version="") is None
+
+
+def test_get_version_key():
+    version_list = ["1.0.0", "v1.10.0", "1.2", "1.2.0-beta", "2", "foo", "0.9.9"]
+    assert sorted(version_list, key=lambda version: compilesketches.get_version_key(version=version)) == [
+        "foo", "0.9.9", "1.0.0", "1.2.0-beta", "1.2", "v1.10.0", "2"
+    ]
+
+
 @pytest.mark.parametrize(
     "path_exists, library_list, expected_destination_name_list",
     [(False,
@@ -1095,11 +2195,13 @@ def test_install_libraries_from_repository(mocker):
     library_list = [
         {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url,
          compilesketches.CompileSketches.dependency_source_path_key: unittest.mock.sentinel.source_path,
-         compilesketches.CompileSketches.dependency_destination_name_key: unittest.mock.sentinel.destination_name},
+         compilesketches.CompileSketches.dependency_destination_name_key: unittest.mock.sentinel.destination_name,
+         compilesketches.CompileSketches.dependency_submodules_key: False},
         {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2}
     ]
     expected_source_path_list = [unittest.mock.sentinel.source_path, "."]
     expected_destination_name_list = [unittest.mock.sentinel.destination_name, None]
+    expected_submodules_list = [(), None]
 
     compile_sketches = get_compilesketches_object()
 
@@ -1110,9 +2212,12 @@ def test_install_libraries_from_repository(mocker):
 
     get_repository_dependency_ref_calls = []
     install_from_repository_calls = []
-    for library, expected_source_path, expected_destination_name in zip(library_list,
-                                                                        expected_source_path_list,
-                                                                        expected_destination_name_list):
+    for library, expected_source_path, expected_destination_name, expected_submodules in zip(
+        library_list,
+        expected_source_path_list,
+        expected_destination_name_list,
+        expected_submodules_list
+    ):
         get_repository_dependency_ref_calls.append(unittest.mock.call(compile_sketches, dependency=library))
         install_from_repository_calls.append(
             unittest.mock.call(compile_sketches,
@@ -1121,7 +2226,8 @@ def test_install_libraries_from_repository(mocker):
                                source_path=expected_source_path,
                                destination_parent_path=compile_sketches.libraries_path,
                                destination_name=expected_destination_name,
-                               force=True)
+                               force=True,
+                               submodules=expected_submodules)
         )
 
     compile_sketches.get_repository_dependency_ref.assert_has_calls(calls=get_repository_dependency_ref_calls)
@@ -1133,11 +2239,13 @@ def test_install_libraries_from_download(mocker):
         {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url1,
          compilesketches.CompileSketches.dependency_source_path_key: unittest.mock.sentinel.source_path,
          compilesketches.CompileSketches.dependency_destination_name_key: unittest.mock.sentinel.destination_name},
-        {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2}
+        {compilesketches.CompileSketches.dependency_source_url_key: unittest.mock.sentinel.source_url2,
+         compilesketches.CompileSketches.dependency_checksum_key: unittest.mock.sentinel.checksum}
     ]
 
     expected_source_path_list = [unittest.mock.sentinel.source_path, "."]
     expected_destination_name_list = [unittest.mock.sentinel.destination_name, None]
+    expected_checksum_list = [None, unittest.mock.sentinel.checksum]
 
     compile_sketches = get_compilesketches_object()
 
@@ -1146,15 +2254,17 @@ def test_install_libraries_from_download(mocker):
     compile_sketches.install_libraries_from_download(library_list=library_list)
 
     install_libraries_from_download_calls = []
-    for library, expected_source_path, expected_destination_name in zip(library_list, expected_source_path_list,
-                                                                        expected_destination_name_list):
+    for library, expected_source_path, expected_destination_name, expected_checksum in zip(
+        library_list, expected_source_path_list, expected_destination_name_list, expected_checksum_list
+    ):
         install_libraries_from_download_calls.append(
             unittest.mock.call(compile_sketches,
                                url=library[compilesketches.CompileSketches.dependency_source_url_key],
                                source_path=expected_source_path,
                                destination_parent_path=compilesketches.CompileSketches.libraries_path,
                                destination_name=expected_destination_name,
-                               force=True)
+                               force=True,
+                               checksum=expected_checksum)
         )
     compile_sketches.install_from_download.assert_has_calls(calls=install_libraries_from_download_calls)
 
@@ -1284,6 +2394,7 @@ def test_install_from_path(capsys,
 
         pathlib.Path.symlink_to.assert_called_once_with(expected_destination_path, target=source_path,
                                                         target_is_directory=is_dir)
+        assert compile_sketches.path_installations == {expected_destination_path: source_path}
 
 
 def test_install_from_path_functional(tmp_path):
@@ -1337,6 +2448,81 @@ def test_install_from_path_functional(tmp_path):
     assert filecmp.cmp(f1=test_file_path,
                        f2=destination_parent_path.joinpath(destination_name))
 
+    # Test existing link to the source path from a previous run
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.install_from_path(source_path=test_file_path,
+                                       destination_parent_path=destination_parent_path,
+                                       destination_name=destination_name)
+    assert compile_sketches.path_installations == {destination_parent_path.joinpath(destination_name): test_file_path}
+
+    # Test existing link to a source path which no longer exists
+    prep_test_folders()
+    destination_parent_path.mkdir()
+    destination_parent_path.joinpath(source_path.name).symlink_to(target=tmp_path.joinpath("nonexistent"))
+    compile_sketches.install_from_path(source_path=source_path, destination_parent_path=destination_parent_path)
+    assert directories_are_same(left_directory=source_path,
+                                right_directory=destination_parent_path.joinpath(source_path.name))
+
+
+def test_install_from_path_receipt(capsys, tmp_path):
+    source_path = tmp_path.joinpath("source")
+    source_path.mkdir()
+    source_path.joinpath(".git").mkdir()
+    source_path.joinpath("library.properties").write_text("name=Foo\nversion=1.2.3\n")
+    destination_parent_path = tmp_path.joinpath("destination-parent")
+    destination_path = destination_parent_path.joinpath("Foo")
+    receipt = {"source-url": "https://example.com/Foo.zip", "source-path": ".", "checksum": "SHA-256:foo"}
+
+    compile_sketches = get_compilesketches_object()
+
+    assert compile_sketches.is_installed(destination_path=destination_path, receipt=receipt) is False
+
+    compile_sketches.install_from_path(source_path=source_path,
+                                       destination_parent_path=destination_parent_path,
+                                       destination_name="Foo",
+                                       receipt=receipt)
+
+    # The installation is a copy of the source, without the Git metadata
+    assert not destination_path.is_symlink()
+    assert destination_path.joinpath("library.properties").samefile(source_path.joinpath("library.properties"))
+    assert not destination_path.joinpath(".git").exists()
+    assert compile_sketches.is_installed(destination_path=destination_path, receipt=receipt) is True
+    assert compile_sketches.is_installed(destination_path=destination_path,
+                                         receipt=dict(receipt, checksum="SHA-256:bar")) is False
+
+    # A modified installation doesn't match
+    destination_path.joinpath("library.properties").unlink()
+    destination_path.joinpath("library.properties").write_text("name=Foo\nversion=1.2.3\n# modified\n")
+    assert compile_sketches.is_installed(destination_path=destination_path, receipt=receipt) is False
+    destination_path.joinpath("library.properties").unlink()
+    destination_path.joinpath("library.properties").write_text("name=Foo\nversion=1.2.3\n")
+    assert compile_sketches.is_installed(destination_path=destination_path, receipt=receipt) is True
+    destination_path.joinpath("Foo.h").write_text("foo")
+    assert compile_sketches.is_installed(destination_path=destination_path, receipt=receipt) is False
+
+    # An installation with a receipt is replaced without forcing
+    compile_sketches.install_from_path(source_path=source_path,
+                                       destination_parent_path=destination_parent_path,
+                                       destination_name="Foo",
+                                       receipt=receipt)
+    assert compile_sketches.is_installed(destination_path=destination_path, receipt=receipt) is True
+
+    # Other installations are not
+    destination_parent_path.joinpath("Bar").mkdir()
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.install_from_path(source_path=source_path,
+                                           destination_parent_path=destination_parent_path,
+                                           destination_name="Bar",
+                                           receipt=receipt)
+    assert capsys.readouterr().out.strip() == (
+        "::error::Installation already exists: " + str(destination_parent_path.joinpath("Bar"))
+    )
+
+    # A link is never a match
+    destination_parent_path.joinpath("Baz").symlink_to(target=destination_path)
+    assert compile_sketches.is_installed(destination_path=destination_parent_path.joinpath("Baz"),
+                                         receipt=receipt) is False
+
 
 def test_path_is_sketch():
     # Sketch file
@@ -1363,10 +2549,62 @@ def test_path_is_sketch():
         path=test_data_path.joinpath("NoSketches", "NotSketch")) is False
 
 
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_compile_sketch_list(mocker, jobs):
+    fqbn_list = ["foo:bar:baz", "qux:quux:corge"]
+    sketch_list = [unittest.mock.sentinel.sketch1, unittest.mock.sentinel.sketch2, unittest.mock.sentinel.sketch3,
+                   unittest.mock.sentinel.sketch4]
+    compilation_list = [{"sketch_path": sketch, "fqbn": fqbn} for fqbn in fqbn_list for sketch in sketch_list]
+    clean_build_cache = unittest.mock.sentinel.clean_build_cache
+    replay_core_warnings = unittest.mock.sentinel.replay_core_warnings
+    environment = unittest.mock.sentinel.environment
+
+    def compile_sketch(self, sketch_path, fqbn, clean_build_cache, replay_core_warnings, build_path, build_cache_path,
+                       environment):
+        return type("CompilationResult", (), {"sketch": sketch_path,
+                                              "fqbn": fqbn,
+                                              "build_path": build_path,
+                                              "build_cache_path": build_cache_path})
+
+    compile_sketches = get_compilesketches_object(jobs=jobs)
+
+    mocker.patch("compilesketches.CompileSketches.compile_sketch", autospec=True, side_effect=compile_sketch)
+
+    compilation_result_list = compile_sketches.compile_sketch_list(compilation_list=compilation_list,
+                                                                   clean_build_cache=clean_build_cache,
+                                                                   replay_core_warnings=replay_core_warnings,
+                                                                   environment=environment)
+
+    # The results must be in the order of the compilation list
+    assert [
+        {"sketch_path": compilation_result.sketch, "fqbn": compilation_result.fqbn}
+        for compilation_result in compilation_result_list
+    ] == compilation_list
+
+    compile_sketch_calls = []
+    for compilation_result in compilation_result_list:
+        compile_sketch_calls.append(unittest.mock.call(compile_sketches,
+                                                       sketch_path=compilation_result.sketch,
+                                                       fqbn=compilation_result.fqbn,
+                                                       clean_build_cache=clean_build_cache,
+                                                       replay_core_warnings=replay_core_warnings,
+                                                       build_path=compilation_result.build_path,
+                                                       build_cache_path=compilation_result.build_cache_path,
+                                                       environment=environment))
+        assert compilation_result.build_path.parent == compilation_result.build_cache_path.parent
+        assert compilation_result.build_path.parent.parent == pathlib.Path(compile_sketches.temporary_directory.name)
+    compile_sketches.compile_sketch.assert_has_calls(calls=compile_sketch_calls, any_order=True)
+
+    # There is a dedicated build folder for each worker
+    build_path_set = {compilation_result.build_path for compilation_result in compilation_result_list}
+    assert 1 <= len(build_path_set) <= int(jobs)
+
+
 @pytest.mark.parametrize("clean_build_cache", [True, False])
+@pytest.mark.parametrize("use_build_path", [True, False])
 @pytest.mark.parametrize("returncode, expected_success", [(1, False),
                                                           (0, True)])
-def test_compile_sketch(capsys, mocker, clean_build_cache, returncode, expected_success):
+def test_compile_sketch(capsys, mocker, tmp_path, clean_build_cache, use_build_path, returncode, expected_success):
     stdout = unittest.mock.sentinel.stdout
     sketch_path = pathlib.Path("FooSketch", "FooSketch.ino").resolve()
 
@@ -1386,9 +2624,33 @@ def test_compile_sketch(capsys, mocker, clean_build_cache, returncode, expected_
     mocker.patch.object(pathlib.Path, "glob", autospec=True, return_value=build_cache_paths)
     mocker.patch("shutil.rmtree", autospec=True)
 
-    compilation_result = compile_sketches.compile_sketch(
-        sketch_path=sketch_path,
-        clean_build_cache=clean_build_cache
+    expected_compilation_command = ["compile", "--warnings", "all", "--fqbn", "foo:bar:baz"]
+    if use_build_path:
+        build_path = tmp_path.joinpath("build")
+        build_path.mkdir()
+        build_cache_path = tmp_path.joinpath("build-cache")
+        # The build cache folder doesn't exist yet
+        expected_compilation_command.extend(["--build-path", build_path, "--build-cache-path", build_cache_path])
+        compilation_result = compile_sketches.compile_sketch(sketch_path=sketch_path,
+                                                             fqbn="foo:bar:baz",
+                                                             clean_build_cache=clean_build_cache,
+                                                             build_path=build_path,
+                                                             build_cache_path=build_cache_path)
+        build_cache_paths = [build_path]
+    else:
+        compilation_result = compile_sketches.compile_sketch(
+            sketch_path=sketch_path,
+            fqbn="foo:bar:baz",
+            clean_build_cache=clean_build_cache
+        )
+    expected_compilation_command.append(sketch_path)
+
+    compile_sketches.run_arduino_cli_command.assert_called_once_with(
+        compile_sketches,
+        command=expected_compilation_command,
+        enable_output=compilesketches.CompileSketches.RunCommandOutput.NONE,
+        exit_on_failure=False,
+        environment=None
     )
 
     if clean_build_cache:
@@ -1397,27 +2659,979 @@ def test_compile_sketch(capsys, mocker, clean_build_cache, returncode, expected_
             rmtree_calls.append(unittest.mock.call(path=build_cache_path))
 
         # noinspection PyUnresolvedReferences
-        shutil.rmtree.assert_has_calls(calls=rmtree_calls)
+        assert shutil.rmtree.call_args_list == rmtree_calls
+    else:
+        # noinspection PyUnresolvedReferences
+        shutil.rmtree.assert_not_called()
+
+    # The output is printed by print_compilation_result()
+    assert capsys.readouterr().out == ""
+
+    assert compilation_result.sketch == sketch_path
+    assert compilation_result.fqbn == "foo:bar:baz"
+    assert compilation_result.success == expected_success
+    assert compilation_result.output == stdout
+
+
+def test_compile_sketch_replay_core_warnings(tmp_path, mocker):
+    sketch_path = pathlib.Path("FooSketch")
+    build_path = tmp_path.joinpath("build")
+    build_cache_path = tmp_path.joinpath("build-cache")
+    core_archive_path = build_cache_path.joinpath("cores", "foo_bar_baz", "core.a")
+    core_warning = "/foo/packages/foo/hardware/bar/1.2.3/cores/bar/main.cpp:1:2: warning: foo"
+    sketch_warning = "/foo/build/sketch/FooSketch.ino:3:4: warning: bar"
+    sketch_error = "/foo/build/sketch/FooSketch.ino:5:6: error: baz"
+
+    class CompilationData:
+        returncode = 0
+        compile_core = False
+
+    compile_sketches = get_compilesketches_object()
+
+    def run_arduino_cli_command(self, command, enable_output, exit_on_failure, environment):
+        # The build cache is kept, while the build folder is always clean
+        assert not build_path.exists()
+        build_path.mkdir()
+        build_cache_path.mkdir(exist_ok=True)
+        if CompilationData.compile_core:
+            core_archive_path.parent.mkdir(parents=True, exist_ok=True)
+            core_archive_path.write_text("core")
+        return CompilationData()
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 side_effect=run_arduino_cli_command)
+
+    def compile_sketch():
+        return compile_sketches.compile_sketch(sketch_path=sketch_path,
+                                               fqbn="foo:bar:baz",
+                                               clean_build_cache=False,
+                                               replay_core_warnings=True,
+                                               build_path=build_path,
+                                               build_cache_path=build_cache_path)
+
+    # The first compilation fails before the core is compiled
+    CompilationData.returncode = 1
+    CompilationData.stdout = sketch_error + "\n"
+    compilation_result = compile_sketch()
+    assert compilation_result.output == CompilationData.stdout
+    assert compile_sketches.core_warnings == {}
+
+    # The next compilation compiles the core
+    CompilationData.returncode = 0
+    CompilationData.compile_core = True
+    CompilationData.stdout = core_warning + "\n" + sketch_warning + "\n"
+    compilation_result = compile_sketch()
+    assert compilation_result.output == CompilationData.stdout
+    assert compile_sketches.get_warning_count_from_output(compilation_result=compilation_result) == 2
+
+    # Subsequent compilations reuse the compiled core
+    CompilationData.compile_core = False
+    CompilationData.stdout = sketch_warning + "\n"
+    compilation_result = compile_sketch()
+    assert build_cache_path.exists()
+    assert core_warning in compilation_result.output
+    assert compile_sketches.get_warning_count_from_output(compilation_result=compilation_result) == 2
+
+    # A compilation which fails with the reused core doesn't get the warnings of its compilation
+    CompilationData.returncode = 1
+    CompilationData.stdout = sketch_error + "\n"
+    compilation_result = compile_sketch()
+    assert compilation_result.output == CompilationData.stdout
+
+
+@pytest.mark.parametrize("recorded_core_warnings, core_compiled, success, expected_output",
+                         [(None, True, True, "foo output\n"),
+                          (None, False, True, "foo output\n"),
+                          ([], False, True, "foo output\n"),
+                          (["core.cpp:1:2: warning: foo"], False, True,
+                           "foo output\n"
+                           "Warnings from the compilation of the cached core:\n"
+                           "core.cpp:1:2: warning: foo"),
+                          (["core.cpp:1:2: warning: foo"], False, False, "foo output\n"),
+                          (["core.cpp:1:2: warning: foo"], True, True, "foo output\n")])
+def test_replay_core_warnings(recorded_core_warnings, core_compiled, success, expected_output):
+    core_warnings_key = (pathlib.Path("/foo/build-cache"), "foo:bar:baz")
+    compile_sketches = get_compilesketches_object()
+    if recorded_core_warnings is not None:
+        compile_sketches.core_warnings[core_warnings_key] = recorded_core_warnings
+
+    assert compile_sketches.replay_core_warnings(build_cache_path=core_warnings_key[0],
+                                                 fqbn=core_warnings_key[1],
+                                                 compilation_output="foo output\n",
+                                                 core_compiled=core_compiled,
+                                                 success=success) == expected_output
+
+    if core_compiled:
+        # The warnings from the compilation of the core are recorded
+        assert compile_sketches.core_warnings[core_warnings_key] == []
+    elif recorded_core_warnings is None:
+        # The core was compiled by a previous run, so its warnings are unknown
+        assert core_warnings_key not in compile_sketches.core_warnings
+
+
+def test_get_core_archive_states(tmp_path):
+    # The build cache folder doesn't exist before the first compilation
+    assert compilesketches.get_core_archive_states(build_cache_path=tmp_path.joinpath("build-cache")) == {}
+
+    core_archive_path = tmp_path.joinpath("build-cache", "cores", "foo_bar_baz", "core.a")
+    core_archive_path.parent.mkdir(parents=True)
+    core_archive_path.write_text("core")
+    core_archive_path.parent.joinpath("build.options.json").write_text("{}")
+
+    assert compilesketches.get_core_archive_states(build_cache_path=tmp_path.joinpath("build-cache")) == {
+        core_archive_path: core_archive_path.stat().st_mtime_ns
+    }
+
+
+def test_get_core_warnings_from_output():
+    compilation_output = (
+        "/foo/hardware/bar/1.2.3/cores/bar/wiring.c:1:2: warning: foo\n"
+        "   foo();\n"
+        "/foo/hardware/bar/1.2.3/variants/standard/pins.h:3:4: warning: bar\n"
+        "/foo/Arduino/libraries/Baz/Baz.cpp:5:6: warning: baz\n"
+        "/foo/build/sketch/Qux.ino:7:8: warning: qux\n"
+        "Sketch uses 42 bytes\n"
+    )
+
+    assert compilesketches.get_core_warnings_from_output(compilation_output=compilation_output) == [
+        "/foo/hardware/bar/1.2.3/cores/bar/wiring.c:1:2: warning: foo",
+        "/foo/hardware/bar/1.2.3/variants/standard/pins.h:3:4: warning: bar"
+    ]
+
+
+@pytest.mark.parametrize("returncode, cached", [(0, True), (1, False)])
+def test_compile_sketch_compilation_cache(mocker, tmp_path, returncode, cached):
+    sketch_path = tmp_path.joinpath("FooSketch")
+    sketch_path.mkdir()
+    sketch_path.joinpath("FooSketch.ino").write_text("foo")
+
+    class CompilationData:
+        stdout = "foo output"
+
+    CompilationData.returncode = returncode
+
+    compile_sketches = get_compilesketches_object(compilation_cache_path=str(tmp_path.joinpath("cache")))
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 return_value=CompilationData())
+    mocker.patch("compilesketches.CompileSketches.get_dependencies_fingerprint", autospec=True,
+                 return_value="foo fingerprint")
+
+    for _ in range(2):
+        compilation_result = compile_sketches.compile_sketch(sketch_path=sketch_path,
+                                                             fqbn="foo:bar:baz",
+                                                             clean_build_cache=False)
+        assert compilation_result.sketch == sketch_path
+        assert compilation_result.fqbn == "foo:bar:baz"
+        assert compilation_result.success == (returncode == 0)
+        assert compilation_result.output == CompilationData.stdout
+
+    # Only successful compilations are cached
+    if cached:
+        compile_sketches.run_arduino_cli_command.assert_called_once()
+    else:
+        assert compile_sketches.run_arduino_cli_command.call_count == 2
+
+    # A change to the sketch invalidates the cache entry
+    sketch_path.joinpath("FooSketch.ino").write_text("bar")
+    compile_sketches.run_arduino_cli_command.reset_mock()
+    compile_sketches.compile_sketch(sketch_path=sketch_path, fqbn="foo:bar:baz", clean_build_cache=False)
+    compile_sketches.run_arduino_cli_command.assert_called_once()
+
+
+def test_compile_sketch_compilation_cache_missing_sketch(mocker, tmp_path):
+    # A sketch added by the changes doesn't exist at the deltas base ref
+    sketch_path = tmp_path.joinpath("worktree", "FooSketch")
+
+    class CompilationData:
+        returncode = 1
+        stdout = "Error opening sketch"
+
+    compile_sketches = get_compilesketches_object(compilation_cache_path=str(tmp_path.joinpath("cache")))
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 return_value=CompilationData())
+    mocker.patch("compilesketches.CompileSketches.get_compilation_cache_key", autospec=True)
+
+    compilation_result = compile_sketches.compile_sketch(sketch_path=sketch_path,
+                                                         fqbn="foo:bar:baz",
+                                                         clean_build_cache=False)
+    assert compilation_result.success is False
+    assert compilation_result.output == CompilationData.stdout
+    # The cache is not used for the compilation
+    compile_sketches.get_compilation_cache_key.assert_not_called()
+    compile_sketches.run_arduino_cli_command.assert_called_once()
+
+
+def test_get_compilation_cache_key(mocker, tmp_path):
+    sketch_path = tmp_path.joinpath("FooSketch")
+    sketch_path.mkdir()
+    sketch_path.joinpath("FooSketch.ino").write_text("foo")
+    # The same sketch in another location, as for the deltas base ref compilation
+    other_sketch_path = tmp_path.joinpath("worktree", "FooSketch")
+    shutil.copytree(src=sketch_path, dst=other_sketch_path)
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.arduino_cli_version = "1.2.3"
+
+    mocker.patch("compilesketches.CompileSketches.get_dependencies_fingerprint", autospec=True,
+                 return_value="foo fingerprint")
+
+    key = compile_sketches.get_compilation_cache_key(sketch_path=sketch_path, fqbn="foo:bar:baz",
+                                                     clean_build_cache=False)
+    assert key == compile_sketches.get_compilation_cache_key(sketch_path=other_sketch_path, fqbn="foo:bar:baz",
+                                                             clean_build_cache=False)
+    assert key != compile_sketches.get_compilation_cache_key(sketch_path=sketch_path, fqbn="foo:bar:qux",
+                                                             clean_build_cache=False)
+    assert key != compile_sketches.get_compilation_cache_key(sketch_path=sketch_path, fqbn="foo:bar:baz",
+                                                             clean_build_cache=True)
+    assert key != compile_sketches.get_compilation_cache_key(sketch_path=sketch_path, fqbn="foo:bar:baz",
+                                                             clean_build_cache=False, replay_core_warnings=True)
+    # A change to the Arduino CLI version invalidates the cached results
+    compile_sketches.arduino_cli_version = "1.2.4"
+    assert key != compile_sketches.get_compilation_cache_key(sketch_path=sketch_path, fqbn="foo:bar:baz",
+                                                             clean_build_cache=False)
+    compile_sketches.arduino_cli_version = "1.2.3"
+    # noinspection PyUnresolvedReferences
+    compilesketches.CompileSketches.get_dependencies_fingerprint.return_value = "bar fingerprint"
+    assert key != compile_sketches.get_compilation_cache_key(sketch_path=sketch_path, fqbn="foo:bar:baz",
+                                                             clean_build_cache=False)
+
+
+def test_get_dependencies_fingerprint(mocker, tmp_path):
+    user_directory_path = tmp_path.joinpath("Arduino")
+    library_path = tmp_path.joinpath("FooLibrary")
+    library_path.mkdir()
+    library_path.joinpath("FooLibrary.h").write_text("foo")
+    installation_path = user_directory_path.joinpath("libraries", "FooLibrary")
+    installation_path.parent.mkdir(parents=True)
+    installation_path.symlink_to(target=library_path, target_is_directory=True)
+
+    class CommandData:
+        stdout = "foo list"
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.arduino_cli_user_directory_path = user_directory_path
+    compile_sketches.libraries_path = user_directory_path.joinpath("libraries")
+    compile_sketches.path_installations = {installation_path: library_path}
+
+    mocker.patch("compilesketches.CompileSketches.run_arduino_cli_command", autospec=True,
+                 return_value=CommandData())
+
+    environment = {"ARDUINO_DIRECTORIES_USER": str(user_directory_path)}
+    fingerprint = compile_sketches.get_dependencies_fingerprint(environment=environment)
+    # The fingerprint is only determined once for each environment
+    assert compile_sketches.get_dependencies_fingerprint(environment=environment) == fingerprint
+    assert compile_sketches.run_arduino_cli_command.call_count == 2
+
+    # A change to the contents of a path installation changes the fingerprint
+    library_path.joinpath("FooLibrary.h").write_text("bar")
+    compile_sketches.dependencies_fingerprints = {}
+    assert compile_sketches.get_dependencies_fingerprint(environment=environment) != fingerprint
+
+    # Changes to the files of a library which are not compiled don't change the fingerprint
+    fingerprint = compile_sketches.get_dependencies_fingerprint(environment=environment)
+    library_path.joinpath("README.md").write_text("foo")
+    library_path.joinpath("examples", "Foo").mkdir(parents=True)
+    library_path.joinpath("examples", "Foo", "Foo.ino").write_text("foo")
+    library_path.joinpath("examples", "Foo", "Foo.h").write_text("foo")
+    compile_sketches.dependencies_fingerprints = {}
+    assert compile_sketches.get_dependencies_fingerprint(environment=environment) == fingerprint
+    library_path.joinpath("library.properties").write_text("name=FooLibrary")
+    compile_sketches.dependencies_fingerprints = {}
+    assert compile_sketches.get_dependencies_fingerprint(environment=environment) != fingerprint
+
+    # The path installations are resolved in the user directory of the environment
+    overlay_path = tmp_path.joinpath("overlay")
+    other_library_path = tmp_path.joinpath("OtherFooLibrary")
+    shutil.copytree(src=library_path, dst=other_library_path)
+    compilesketches.create_overlay(source_path=user_directory_path,
+                                   overlay_path=overlay_path,
+                                   replacement_paths={installation_path: other_library_path})
+    assert (compile_sketches.get_dependencies_fingerprint(environment={"ARDUINO_DIRECTORIES_USER": str(overlay_path)})
+            == compile_sketches.get_dependencies_fingerprint(environment=environment))
+    other_library_path.joinpath("FooLibrary.h").write_text("baz")
+    compile_sketches.dependencies_fingerprints = {}
+    assert (compile_sketches.get_dependencies_fingerprint(environment={"ARDUINO_DIRECTORIES_USER": str(overlay_path)})
+            != compile_sketches.get_dependencies_fingerprint(environment=environment))
+
+
+def test_prune_compilation_cache(tmp_path):
+    compilation_cache_path = tmp_path.joinpath("cache")
+    compile_sketches = get_compilesketches_object(compilation_cache_path=str(compilation_cache_path),
+                                                  compilation_cache_size="1")
+
+    # Nothing to do if the cache doesn't exist yet
+    compile_sketches.prune_compilation_cache()
+
+    compilation_cache_path.mkdir()
+    entry_size = 400 * 1024
+    for entry_number in range(4):
+        entry_path = compilation_cache_path.joinpath("entry" + str(entry_number) + ".json")
+        entry_path.write_bytes(b"0" * entry_size)
+        # The higher numbered entries were used less recently
+        os.utime(path=entry_path, times=(1000 - entry_number, 1000 - entry_number))
+
+    compile_sketches.prune_compilation_cache()
+
+    assert sorted(path.name for path in compilation_cache_path.iterdir()) == ["entry0.json", "entry1.json"]
+
+
+@pytest.mark.parametrize("size_input, expected_size",
+                         [("0", 0), ("100", 100), ("-1", None), ("foo", None), ("", None)])
+def test_parse_size_input(size_input, expected_size):
+    assert compilesketches.parse_size_input(size_input=size_input) == expected_size
+
+
+def test_get_path_hash(tmp_path):
+    folder_path = tmp_path.joinpath("folder")
+    folder_path.joinpath("src").mkdir(parents=True)
+    folder_path.joinpath("src", "foo.h").write_text("foo")
+    folder_path.joinpath("bar.ino").write_text("bar")
+
+    path_hash = compilesketches.get_path_hash(path=folder_path)
+
+    # Hidden files and excluded paths are ignored
+    folder_path.joinpath(".git").mkdir()
+    folder_path.joinpath(".git", "index").write_text("baz")
+    folder_path.joinpath("cache").mkdir()
+    folder_path.joinpath("cache", "entry.json").write_text("qux")
+    assert compilesketches.get_path_hash(path=folder_path, excluded_paths=[folder_path.joinpath("cache")]) == path_hash
+
+    # Renaming a file changes the hash
+    folder_path.joinpath("src", "foo.h").rename(folder_path.joinpath("src", "bar.h"))
+    assert compilesketches.get_path_hash(path=folder_path, excluded_paths=[folder_path.joinpath("cache")]) != path_hash
+
+    # Files can be hashed too
+    assert compilesketches.get_path_hash(path=folder_path.joinpath("bar.ino")) != compilesketches.get_path_hash(
+        path=folder_path.joinpath("src", "bar.h")
+    )
+
+    # Only the files selected by the filter are hashed
+    path_hash = compilesketches.get_path_hash(path=folder_path, file_filter=lambda file_path: file_path.suffix == ".h")
+    folder_path.joinpath("bar.ino").write_text("baz")
+    assert compilesketches.get_path_hash(path=folder_path,
+                                         file_filter=lambda file_path: file_path.suffix == ".h") == path_hash
+    folder_path.joinpath("src", "bar.h").write_text("baz")
+    assert compilesketches.get_path_hash(path=folder_path,
+                                         file_filter=lambda file_path: file_path.suffix == ".h") != path_hash
+
+
+@pytest.mark.parametrize("success", [True, False])
+def test_print_compilation_result(capsys, success):
+    sketch_path = pathlib.Path("FooSketch", "FooSketch.ino").resolve()
+    output = "foo output"
+
+    compile_sketches = get_compilesketches_object()
+
+    compilation_result = type("CompilationResult", (), {"sketch": sketch_path,
+                                                        "fqbn": "foo:bar:baz",
+                                                        "success": success,
+                                                        "output": output})
+
+    compile_sketches.print_compilation_result(compilation_result=compilation_result)
 
     expected_stdout = (
-        "::group::Compiling sketch: " + str(compilesketches.path_relative_to_workspace(path=sketch_path)) + "\n"
-        + str(stdout) + "\n"
+        "::group::Compiling sketch: " + str(compilesketches.path_relative_to_workspace(path=sketch_path))
+        + " for board: foo:bar:baz\n"
+        + output + "\n"
         + "::endgroup::"
     )
-    if not expected_success:
+    if not success:
         expected_stdout += "\n::error::Compilation failed"
     assert capsys.readouterr().out.strip() == expected_stdout
 
-    assert compilation_result.sketch == sketch_path
-    assert compilation_result.success == expected_success
-    assert compilation_result.output == stdout
+
+@pytest.mark.parametrize("enable_deltas_report", ["true", "false"])
+@pytest.mark.parametrize("success_list", [[True, True, False, True, True], [False, False, False, False, False]])
+def test_get_previous_compilation_result_list(mocker, enable_deltas_report, success_list):
+    worktree_path = pathlib.Path("/foo/worktree")
+    environment = unittest.mock.sentinel.environment
+    sketch_list = [compilesketches.absolute_path(path="examples/Foo"),
+                   pathlib.Path("/outside/workspace/Bar"),
+                   compilesketches.absolute_path(path="examples/Baz"),
+                   compilesketches.absolute_path(path="examples/Qux"),
+                   compilesketches.absolute_path(path="examples/Unaffected")]
+    # The data of the fourth sketch at the base ref is provided by a report
+    previous_sketch_report_list = [None, None, None, unittest.mock.sentinel.previous_sketch_report, None]
+
+    compilation_result_list = []
+    for sketch, success in zip(sketch_list, success_list):
+        compilation_result_list.append(type("CompilationResult", (), {"sketch": sketch,
+                                                                      "fqbn": "foo:bar:baz",
+                                                                      "success": success}))
+
+    def compile_sketch_list(self, compilation_list, clean_build_cache, replay_core_warnings, environment, jobs):
+        return [type("CompilationResult", (), {"sketch": compilation["sketch_path"]})
+                for compilation in compilation_list]
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report=enable_deltas_report)
+
+    mocker.patch("compilesketches.CompileSketches.create_deltas_base_worktree", autospec=True,
+                 return_value=worktree_path)
+    mocker.patch("compilesketches.CompileSketches.remove_deltas_base_worktree", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.get_deltas_base_environment", autospec=True,
+                 return_value=environment)
+    mocker.patch("compilesketches.CompileSketches.compile_sketch_list", autospec=True,
+                 side_effect=compile_sketch_list)
+    # The last sketch is not affected by the changes since the base ref
+    mocker.patch("compilesketches.CompileSketches.is_affected_by_deltas_changes", autospec=True,
+                 side_effect=lambda self, sketch_path, fqbn: sketch_path.name != "Unaffected")
+
+    previous_compilation_result_list = compile_sketches.get_previous_compilation_result_list(
+        compilation_result_list=compilation_result_list,
+        previous_sketch_report_list=previous_sketch_report_list
+    )
+
+    if enable_deltas_report == "false" or not any(success_list):
+        assert previous_compilation_result_list == [None, None, None, None, None]
+        compile_sketches.create_deltas_base_worktree.assert_not_called()
+        compile_sketches.compile_sketch_list.assert_not_called()
+    else:
+        compile_sketches.create_deltas_base_worktree.assert_called_once_with(compile_sketches)
+        # Only the successful compilations are compiled at the base ref, all in a single batch
+        compile_sketches.compile_sketch_list.assert_called_once_with(
+            compile_sketches,
+            compilation_list=[{"sketch_path": worktree_path.joinpath("examples", "Foo"), "fqbn": "foo:bar:baz"},
+                              {"sketch_path": sketch_list[1], "fqbn": "foo:bar:baz"}],
+            clean_build_cache=False,
+            replay_core_warnings=False,
+            environment=environment,
+            jobs=None
+        )
+        compile_sketches.get_deltas_base_environment.assert_called_once_with(compile_sketches,
+                                                                             worktree_path=worktree_path)
+        compile_sketches.remove_deltas_base_worktree.assert_called_once_with(compile_sketches,
+                                                                             worktree_path=worktree_path)
+
+        # The results are identified by the workspace path of the sketch
+        assert previous_compilation_result_list[0].sketch == sketch_list[0]
+        assert previous_compilation_result_list[1].sketch == sketch_list[1]
+        assert previous_compilation_result_list[2] is None
+        assert previous_compilation_result_list[3] is None
+        # The data of the unaffected sketch at the base ref is the same as at the head ref
+        assert previous_compilation_result_list[4] is compilation_result_list[4]
+
+
+def test_compile_sketch_list_with_deltas_base(mocker):
+    compilation_list = [{"sketch_path": pathlib.Path("/foo/Foo"), "fqbn": "foo:bar:baz"},
+                        {"sketch_path": pathlib.Path("/foo/Bar"), "fqbn": "foo:bar:baz"}]
+    # Both compilations wait for the other to start, so the test fails unless they run at the same time
+    barrier = threading.Barrier(parties=2, timeout=10)
+
+    def compile_sketch_list(self, compilation_list, clean_build_cache, replay_core_warnings, jobs):
+        barrier.wait()
+        return [type("CompilationResult", (), {"sketch": compilation["sketch_path"],
+                                               "success": compilation["sketch_path"].name == "Foo"})
+                for compilation in compilation_list]
+
+    def compile_deltas_base_sketch_list(self, compilation_list, jobs):
+        barrier.wait()
+        return [type("CompilationResult", (), {"sketch": compilation["sketch_path"], "success": True})
+                for compilation in compilation_list]
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true", concurrent_deltas="true", jobs="3")
+
+    mocker.patch("compilesketches.CompileSketches.compile_sketch_list", autospec=True,
+                 side_effect=compile_sketch_list)
+    mocker.patch("compilesketches.CompileSketches.compile_deltas_base_sketch_list", autospec=True,
+                 side_effect=compile_deltas_base_sketch_list)
+    mocker.patch("compilesketches.CompileSketches.is_affected_by_deltas_changes", autospec=True, return_value=True)
+
+    compilation_result_list, previous_compilation_result_list = (
+        compile_sketches.compile_sketch_list_with_deltas_base(compilation_list=compilation_list,
+                                                              previous_sketch_report_list=[None, None])
+    )
+
+    # The jobs are split between the head and base ref compilations
+    compile_sketches.compile_sketch_list.assert_called_once_with(compile_sketches,
+                                                                 compilation_list=compilation_list,
+                                                                 clean_build_cache=False,
+                                                                 replay_core_warnings=False,
+                                                                 jobs=2)
+    compile_sketches.compile_deltas_base_sketch_list.assert_called_once_with(compile_sketches,
+                                                                             compilation_list=compilation_list,
+                                                                             jobs=1)
+    assert [compilation_result.success for compilation_result in compilation_result_list] == [True, False]
+    assert previous_compilation_result_list[0].sketch == compilation_list[0]["sketch_path"]
+    # There is no comparison against a failed compilation
+    assert previous_compilation_result_list[1] is None
+
+
+def test_compile_sketch_list_with_deltas_base_previous_sketch_reports(mocker):
+    compilation_list = [{"sketch_path": pathlib.Path("/foo/Foo"), "fqbn": "foo:bar:baz"},
+                        {"sketch_path": pathlib.Path("/foo/Bar"), "fqbn": "foo:bar:baz"}]
+    compilation_result_list = [type("CompilationResult", (), {"sketch": compilation["sketch_path"], "success": True})
+                               for compilation in compilation_list]
+    deltas_base_compilation_result = type("CompilationResult", (), {"sketch": pathlib.Path("/foo/Bar")})
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true", concurrent_deltas="true", jobs="3")
+
+    mocker.patch("compilesketches.CompileSketches.compile_sketch_list", autospec=True,
+                 return_value=compilation_result_list)
+    mocker.patch("compilesketches.CompileSketches.compile_deltas_base_sketch_list", autospec=True,
+                 return_value=[deltas_base_compilation_result])
+    mocker.patch("compilesketches.CompileSketches.is_affected_by_deltas_changes", autospec=True, return_value=True)
+
+    # Only the sketches without a previous sketch report are compiled at the base ref
+    assert compile_sketches.compile_sketch_list_with_deltas_base(
+        compilation_list=compilation_list,
+        previous_sketch_report_list=[unittest.mock.sentinel.previous_sketch_report, None]
+    ) == (compilation_result_list, [None, deltas_base_compilation_result])
+    compile_sketches.compile_deltas_base_sketch_list.assert_called_once_with(compile_sketches,
+                                                                             compilation_list=compilation_list[1:],
+                                                                             jobs=1)
+
+    # There is no base ref compilation when all the sketches have a previous sketch report, so the head ref compilation
+    # gets all the jobs
+    compile_sketches.compile_sketch_list.reset_mock()
+    compile_sketches.compile_deltas_base_sketch_list.reset_mock()
+    assert compile_sketches.compile_sketch_list_with_deltas_base(
+        compilation_list=compilation_list,
+        previous_sketch_report_list=[unittest.mock.sentinel.previous_sketch_report,
+                                     unittest.mock.sentinel.previous_sketch_report]
+    ) == (compilation_result_list, [None, None])
+    compile_sketches.compile_deltas_base_sketch_list.assert_not_called()
+    compile_sketches.compile_sketch_list.assert_called_once_with(compile_sketches,
+                                                                 compilation_list=compilation_list,
+                                                                 clean_build_cache=False,
+                                                                 replay_core_warnings=False)
+
+    # A sketch which is not affected by the changes since the base ref is not compiled at the base ref
+    compile_sketches.compile_sketch_list.reset_mock()
+    compilesketches.CompileSketches.is_affected_by_deltas_changes.reset_mock()
+    compilesketches.CompileSketches.is_affected_by_deltas_changes.return_value = False
+    assert compile_sketches.compile_sketch_list_with_deltas_base(
+        compilation_list=compilation_list,
+        previous_sketch_report_list=[unittest.mock.sentinel.previous_sketch_report, None]
+    ) == (compilation_result_list, [None, compilation_result_list[1]])
+    compile_sketches.is_affected_by_deltas_changes.assert_called_once_with(compile_sketches,
+                                                                           sketch_path=pathlib.Path("/foo/Bar"),
+                                                                           fqbn="foo:bar:baz")
+    compile_sketches.compile_deltas_base_sketch_list.assert_not_called()
+
+
+@pytest.mark.parametrize("enable_warnings_report", ["true", "false"])
+def test_get_previous_sketch_report_list(capsys, mocker, tmp_path, enable_warnings_report):
+    deltas_base_commit = "a" * 40
+    baseline_report_path = tmp_path.joinpath("baseline")
+    baseline_report_path.mkdir()
+    foo_sketch_report = {"name": "examples/Foo", "compilation_success": True, "sizes": [],
+                         "warnings": {"current": {"absolute": 0}}}
+    bar_sketch_report = {"name": "examples/Bar", "compilation_success": True, "sizes": []}
+    baseline_report_path.joinpath("foo-bar-baz.json").write_text(json.dumps(
+        {"commit_hash": deltas_base_commit,
+         "commit_url": "https://example.com",
+         "boards": [{"board": "foo:bar:baz", "sketches": [foo_sketch_report, bar_sketch_report]}]}
+    ))
+    # A report made at a different commit is stale
+    baseline_report_path.joinpath("qux-quux-corge.json").write_text(json.dumps(
+        {"commit_hash": "b" * 40,
+         "commit_url": "https://example.com",
+         "boards": [{"board": "qux:quux:corge", "sketches": [foo_sketch_report]}]}
+    ))
+    baseline_report_path.joinpath("invalid.json").write_text("foo")
+    compilation_list = [
+        {"sketch_path": compilesketches.absolute_path(path="examples/Foo"), "fqbn": "foo:bar:baz"},
+        {"sketch_path": compilesketches.absolute_path(path="examples/Bar"), "fqbn": "foo:bar:baz"},
+        {"sketch_path": compilesketches.absolute_path(path="examples/Baz"), "fqbn": "foo:bar:baz"},
+        {"sketch_path": compilesketches.absolute_path(path="examples/Foo"), "fqbn": "qux:quux:corge"}
+    ]
+
+    # There is no baseline report
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true",
+                                                  enable_warnings_report=enable_warnings_report)
+    mocker.patch("compilesketches.CompileSketches.fetch_deltas_base_ref", autospec=True,
+                 return_value=deltas_base_commit)
+    assert compile_sketches.get_previous_sketch_report_list(compilation_list=compilation_list) == [
+        None, None, None, None
+    ]
+    compile_sketches.fetch_deltas_base_ref.assert_not_called()
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true",
+                                                  enable_warnings_report=enable_warnings_report,
+                                                  baseline_report_path=str(baseline_report_path))
+    previous_sketch_report_list = compile_sketches.get_previous_sketch_report_list(compilation_list=compilation_list)
+    if enable_warnings_report == "true":
+        # The report on Bar was made without the warnings report, so the sketch must be compiled
+        assert previous_sketch_report_list == [foo_sketch_report, None, None, None]
+    else:
+        assert previous_sketch_report_list == [foo_sketch_report, bar_sketch_report, None, None]
+    assert capsys.readouterr().out == (
+        "::warning::Unable to read baseline report: " + str(baseline_report_path.joinpath("invalid.json")) + "\n"
+        + "Baseline report " + str(baseline_report_path.joinpath("qux-quux-corge.json")) + " was made at commit "
+        + "b" * 40 + " rather than at the deltas base ref commit " + deltas_base_commit + ", so it is not used\n"
+    )
+
+    # The path of a single report file
+    compile_sketches.baseline_report_path = baseline_report_path.joinpath("foo-bar-baz.json")
+    assert compile_sketches.get_previous_sketch_report_list(compilation_list=compilation_list)[0] == foo_sketch_report
+
+    # A missing baseline report
+    compile_sketches.baseline_report_path = tmp_path.joinpath("nonexistent.json")
+    assert compile_sketches.get_previous_sketch_report_list(compilation_list=compilation_list) == [
+        None, None, None, None
+    ]
+
+    # The sketches not in the baseline report are looked up in the result store
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true",
+                                                  enable_warnings_report=enable_warnings_report,
+                                                  baseline_report_path=str(baseline_report_path),
+                                                  result_store_path=str(tmp_path.joinpath("store", "results.db")))
+    stored_sketch_report = {"name": "examples/Baz", "compilation_success": True, "sizes": [],
+                            "warnings": {"current": {"absolute": 2}}}
+    mocker.patch("compilesketches.CompileSketches.get_stored_sketch_reports", autospec=True,
+                 return_value={("foo:bar:baz", "examples/Baz"): stored_sketch_report})
+    assert compile_sketches.get_previous_sketch_report_list(compilation_list=compilation_list)[2] == (
+        stored_sketch_report
+    )
+    compile_sketches.get_stored_sketch_reports.assert_called_once_with(
+        compile_sketches,
+        commit_hash=deltas_base_commit,
+        key_list=[("foo:bar:baz", "examples/Foo"), ("foo:bar:baz", "examples/Bar"), ("foo:bar:baz", "examples/Baz"),
+                  ("qux:quux:corge", "examples/Foo")]
+    )
+
+    # The baseline report is not used when the deltas report is disabled
+    compile_sketches = get_compilesketches_object(enable_deltas_report="false",
+                                                  baseline_report_path=str(baseline_report_path))
+    assert compile_sketches.get_previous_sketch_report_list(compilation_list=compilation_list) == [
+        None, None, None, None
+    ]
+
+
+def test_result_store(mocker, tmp_path):
+    result_store_path = tmp_path.joinpath("store", "results.db")
+    foo_sketch_report = {
+        "name": "examples/Foo",
+        "compilation_success": True,
+        "sizes": [{"name": "flash", "maximum": 32256,
+                   "current": {"absolute": 444, "relative": 1.38},
+                   "previous": {"absolute": 400, "relative": 1.24},
+                   "delta": {"absolute": 44, "relative": 0.14}}],
+        "warnings": {"current": {"absolute": 3}, "previous": {"absolute": 1}, "delta": {"absolute": 2}}
+    }
+    bar_sketch_report = {
+        "name": "examples/Bar",
+        "compilation_success": False,
+        "sizes": [{"name": "flash", "maximum": "N/A", "current": {"absolute": "N/A", "relative": "N/A"}}]
+    }
+
+    mocker.patch("compilesketches.get_head_commit_hash", autospec=True, return_value="a" * 40)
+    mocker.patch("sqlite3.connect", autospec=True, side_effect=sqlite3.connect)
+
+    # The result store is not used if no path is set
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.save_result_store()
+    sqlite3.connect.assert_not_called()
+
+    compile_sketches = get_compilesketches_object(result_store_path=str(result_store_path),
+                                                  result_store_retention="2")
+    compile_sketches.store_sketch_report(fqbn="foo:bar:baz", sketch_report=foo_sketch_report)
+    compile_sketches.store_sketch_report(fqbn="foo:bar:baz", sketch_report=bar_sketch_report)
+    # The data is only added to the store at the end of the run
+    assert not result_store_path.exists()
+    compile_sketches.save_result_store()
+    # The data is stored at the commit of the sketches report
+    compilesketches.get_head_commit_hash.assert_called_once_with()
+    assert compile_sketches.result_store_connection is None
+
+    compilesketches.get_head_commit_hash.return_value = "b" * 40
+    mocker.patch("time.time", return_value=time.time() + 24 * 60 * 60)
+    compile_sketches = get_compilesketches_object(result_store_path=str(result_store_path),
+                                                  result_store_retention="2")
+    compile_sketches.store_sketch_report(fqbn="foo:bar:baz", sketch_report=foo_sketch_report)
+    compile_sketches.save_result_store()
+    sqlite3.connect.reset_mock()
+
+    # Only the current data is stored
+    assert compile_sketches.get_stored_sketch_reports(
+        commit_hash="a" * 40,
+        key_list=[("foo:bar:baz", "examples/Foo"), ("foo:bar:baz", "examples/Bar"), ("foo:bar:baz", "examples/Baz"),
+                  ("qux:quux:corge", "examples/Foo")]
+    ) == {
+        ("foo:bar:baz", "examples/Foo"): {
+            "name": "examples/Foo",
+            "compilation_success": True,
+            "sizes": [{"name": "flash", "maximum": 32256, "current": {"absolute": 444, "relative": 1.38}}],
+            "warnings": {"current": {"absolute": 3}}
+        },
+        ("foo:bar:baz", "examples/Bar"): bar_sketch_report
+    }
+
+    # The connection is opened once per run
+    key_list = [("foo:bar:baz", "examples/Foo")]
+    assert list(compile_sketches.get_stored_sketch_reports(commit_hash="b" * 40, key_list=key_list)) == key_list
+    sqlite3.connect.assert_called_once()
+
+    # The data stored longer ago than the retention time is removed
+    time.time.return_value += 1.5 * 24 * 60 * 60
+    compile_sketches.save_result_store()
+    sqlite3.connect.assert_called_once()
+    assert compile_sketches.get_stored_sketch_reports(commit_hash="a" * 40, key_list=key_list) == {}
+    assert list(compile_sketches.get_stored_sketch_reports(commit_hash="b" * 40, key_list=key_list)) == key_list
+
+
+@pytest.fixture
+def deltas_repository(monkeypatch, tmp_path):
+    """Create a workspace repository with an origin remote which contains the base commit of the deltas comparison."""
+    origin_path = tmp_path.joinpath("origin")
+    origin_repository = git.Repo.init(path=origin_path)
+    origin_repository.config_writer().set_value("user", "name", "Foo").release()
+    origin_repository.config_writer().set_value("user", "email", "foo@example.com").release()
+    origin_path.joinpath("Foo.ino").write_text("base")
+    origin_repository.index.add(["Foo.ino"])
+    base_commit = origin_repository.index.commit("Base")
+    origin_path.joinpath("Foo.ino").write_text("head")
+    origin_repository.index.add(["Foo.ino"])
+    origin_repository.index.commit("Head")
+
+    workspace_path = tmp_path.joinpath("workspace")
+    git.Repo.clone_from(url=origin_path.as_uri(), to_path=workspace_path)
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(workspace_path))
+
+    class DeltasRepository:
+        path = workspace_path
+        base_ref = base_commit.hexsha
+
+    DeltasRepository.origin = origin_repository
+
+    return DeltasRepository()
+
+
+def test_create_deltas_base_worktree(deltas_repository):
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true",
+                                                  deltas_base_ref=deltas_repository.base_ref)
+
+    worktree_path = compile_sketches.create_deltas_base_worktree()
+
+    assert worktree_path.joinpath("Foo.ino").read_text() == "base"
+    assert git.Repo(path=worktree_path).head.object.hexsha == deltas_repository.base_ref
+    # The head ref tree is not touched
+    assert deltas_repository.path.joinpath("Foo.ino").read_text() == "head"
+
+    compile_sketches.remove_deltas_base_worktree(worktree_path=worktree_path)
+
+    assert not worktree_path.exists()
+    assert len(git.Repo(path=deltas_repository.path).git.worktree("list").splitlines()) == 1
+
+
+def test_fetch_deltas_base_ref(deltas_repository):
+    with deltas_repository.origin.config_writer() as config_writer:
+        config_writer.set_value("uploadpack", "allowFilter", True)
+    deltas_repository.origin.create_head("base", commit=deltas_repository.base_ref)
+    # The workspace has an outdated local branch of the same name
+    git.Repo(path=deltas_repository.path).create_head("base")
+
+    config_path = deltas_repository.path.joinpath(".git", "config")
+    config = config_path.read_text()
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true", deltas_base_ref="base")
+
+    assert compile_sketches.fetch_deltas_base_ref() == deltas_repository.base_ref
+    # The configuration for the partial fetch is kept until the file contents are checked out
+    assert git.Repo(path=deltas_repository.path).config_reader().get_value("extensions", "partialClone") == "origin"
+    worktree_path = compile_sketches.create_deltas_base_worktree()
+    assert worktree_path.joinpath("Foo.ino").read_text() == "base"
+    # The partial clone configuration is not left behind in the workspace repository
+    assert config_path.read_text() == config
+    compile_sketches.remove_deltas_base_worktree(worktree_path=worktree_path)
+
+    # The ref is only fetched once per run
+    deltas_repository.origin.heads["base"].commit = deltas_repository.origin.head.commit
+    assert compile_sketches.fetch_deltas_base_ref() == deltas_repository.base_ref
+
+    # The configuration is also restored at the end of a run which didn't check out the deltas base ref
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true", deltas_base_ref="base")
+    compile_sketches.fetch_deltas_base_ref()
+    assert config_path.read_text() != config
+    compile_sketches.restore_workspace_git_config()
+    assert config_path.read_text() == config
+    # Restoring again has no effect
+    compile_sketches.restore_workspace_git_config()
+    assert config_path.read_text() == config
+
+
+def test_get_deltas_changed_paths(deltas_repository):
+    deltas_repository.path.joinpath("Foo.ino").write_text("changed")
+    deltas_repository.path.joinpath("Bar.ino").write_text("untracked")
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true")
+    compile_sketches.deltas_base_commit = deltas_repository.base_ref
+
+    # The working tree is compared with the base ref
+    assert compile_sketches.get_deltas_changed_paths() == {pathlib.PurePath("Foo.ino")}
+
+    # The paths are only determined once per run
+    compile_sketches.deltas_base_commit = git.Repo(path=deltas_repository.path).head.commit.hexsha
+    assert compile_sketches.get_deltas_changed_paths() == {pathlib.PurePath("Foo.ino")}
+
+
+def test_is_affected_by_deltas_changes(capsys, monkeypatch, tmp_path):
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(tmp_path))
+    for sketch_name in ["Foo", "Bar", "Baz"]:
+        tmp_path.joinpath("examples", sketch_name).mkdir(parents=True)
+        tmp_path.joinpath("examples", sketch_name, sketch_name + ".ino").touch()
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.deltas_changed_paths = {pathlib.PurePath("examples/Foo/Foo.ino"),
+                                             pathlib.PurePath("libraries/Qux/src/Qux.h"),
+                                             pathlib.PurePath("README.md")}
+
+    assert compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Foo"),
+                                                          fqbn="foo:bar:baz")
+    assert capsys.readouterr().out == (
+        "Sketch: examples/Foo for board: foo:bar:baz is affected by the change to: examples/Foo/Foo.ino so it will be "
+        "compiled at the deltas base ref\n"
+    )
+    # A sketch path may be the path of the primary sketch file
+    assert compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Foo", "Foo.ino"),
+                                                          fqbn="foo:bar:baz")
+    capsys.readouterr()
+
+    assert not compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Bar"),
+                                                              fqbn="foo:bar:baz")
+    assert capsys.readouterr().out == (
+        "Sketch: examples/Bar for board: foo:bar:baz is not affected by the changes since the deltas base ref, so its "
+        "data at the head ref is used for the base ref\n"
+    )
+
+    # A change to the source of a dependency installed from the workspace affects all sketches, while the sources of
+    # dependencies installed from outside the workspace are the same at both refs
+    compile_sketches.path_installations = {
+        pathlib.Path("/foo/libraries/Qux"): tmp_path.joinpath("libraries", "Qux"),
+        pathlib.Path("/foo/libraries/Quux"): pathlib.Path("/outside/workspace/libraries/Quux")
+    }
+    compile_sketches.deltas_changed_paths.add(pathlib.PurePath("/outside/workspace/libraries/Quux/Quux.h"))
+    assert compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Baz"),
+                                                          fqbn="foo:bar:baz")
+    assert capsys.readouterr().out == (
+        "Sketch: examples/Baz for board: foo:bar:baz is affected by the change to: libraries/Qux/src/Qux.h so it will "
+        "be compiled at the deltas base ref\n"
+    )
+    del compile_sketches.path_installations[pathlib.Path("/foo/libraries/Qux")]
+    assert not compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Baz"),
+                                                              fqbn="foo:bar:baz")
+
+    # A platform installed from the root of the workspace is affected by any change
+    compile_sketches.path_installations[compile_sketches.user_platforms_path.joinpath("foo", "bar")] = tmp_path
+    assert compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Baz"),
+                                                          fqbn="foo:bar:baz")
+    capsys.readouterr()
+
+
+def test_is_affected_by_deltas_changes_root_library(capsys, monkeypatch, tmp_path):
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(tmp_path))
+    for sketch_name in ["Foo", "Bar"]:
+        tmp_path.joinpath("examples", sketch_name).mkdir(parents=True)
+        tmp_path.joinpath("examples", sketch_name, sketch_name + ".ino").touch()
+
+    compile_sketches = get_compilesketches_object()
+    # The default libraries input installs the root of the workspace as a library
+    compile_sketches.path_installations = {compile_sketches.libraries_path.joinpath("Root"): tmp_path}
+
+    # Changes to files which are not compiled don't affect the sketches
+    compile_sketches.deltas_changed_paths = {pathlib.PurePath("README.md"),
+                                             pathlib.PurePath(".github/workflows/compile-examples.yml"),
+                                             pathlib.PurePath("docs/api.md"),
+                                             pathlib.PurePath("examples/Bar/Bar.ino"),
+                                             pathlib.PurePath("examples/Bar/helper.h")}
+    assert not compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Foo"),
+                                                              fqbn="foo:bar:baz")
+    assert capsys.readouterr().out == (
+        "Sketch: examples/Foo for board: foo:bar:baz is not affected by the changes since the deltas base ref, so its "
+        "data at the head ref is used for the base ref\n"
+    )
+
+    # Changes to the library source affect the sketches
+    for changed_path in ["library.properties", "src/Root.cpp", "src/data.txt", "Root.h", "utility/helper.c"]:
+        compile_sketches.deltas_changed_paths = {pathlib.PurePath("README.md"), pathlib.PurePath(changed_path)}
+        assert compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Foo"),
+                                                              fqbn="foo:bar:baz")
+        assert capsys.readouterr().out == (
+            "Sketch: examples/Foo for board: foo:bar:baz is affected by the change to: " + changed_path
+            + " so it will be compiled at the deltas base ref\n"
+        )
+
+    # Changes to the sketch itself still affect it
+    compile_sketches.deltas_changed_paths = {pathlib.PurePath("examples/Foo/Foo.ino")}
+    assert compile_sketches.is_affected_by_deltas_changes(sketch_path=tmp_path.joinpath("examples", "Foo"),
+                                                          fqbn="foo:bar:baz")
+
+
+def test_get_deltas_base_environment(monkeypatch, tmp_path):
+    workspace_path = tmp_path.joinpath("workspace")
+    worktree_path = tmp_path.joinpath("worktree")
+    user_directory_path = tmp_path.joinpath("Arduino")
+    data_directory_path = tmp_path.joinpath("arduino15")
+    for path in [workspace_path, worktree_path, user_directory_path, data_directory_path]:
+        path.mkdir()
+
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(workspace_path))
+
+    installations = {
+        # Library installed from the workspace
+        user_directory_path.joinpath("libraries", "FooLibrary"): workspace_path.joinpath("src"),
+        # Library installed from outside the workspace
+        user_directory_path.joinpath("libraries", "BarLibrary"): tmp_path.joinpath("BarLibrary"),
+        # Platform installed from outside the workspace
+        data_directory_path.joinpath("packages", "foo", "hardware", "bar", "1.2.3"): tmp_path.joinpath("platform")
+    }
+    for destination_path, source_path in installations.items():
+        source_path.mkdir(exist_ok=True)
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        destination_path.symlink_to(target=source_path, target_is_directory=True)
+
+    monkeypatch.delenv("ARDUINO_DIRECTORIES_USER", raising=False)
+    monkeypatch.delenv("ARDUINO_DIRECTORIES_DATA", raising=False)
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.arduino_cli_user_directory_path = user_directory_path
+    compile_sketches.arduino_cli_data_directory_path = data_directory_path
+    compile_sketches.path_installations = installations
+
+    environment = compile_sketches.get_deltas_base_environment(worktree_path=worktree_path)
+
+    user_overlay_path = pathlib.Path(environment["ARDUINO_DIRECTORIES_USER"])
+    assert user_overlay_path.joinpath("libraries", "FooLibrary").resolve() == worktree_path.joinpath("src")
+    assert user_overlay_path.joinpath("libraries", "BarLibrary").resolve() == tmp_path.joinpath("BarLibrary")
+    # The data directory doesn't contain installations from the workspace, so no overlay is needed
+    assert "ARDUINO_DIRECTORIES_DATA" not in environment
+    # The environment of the script is not modified
+    assert "ARDUINO_DIRECTORIES_USER" not in os.environ
+
+
+def test_create_overlay(tmp_path):
+    source_path = tmp_path.joinpath("source")
+    source_path.joinpath("libraries", "Foo").mkdir(parents=True)
+    source_path.joinpath("libraries", "Foo", "Foo.h").write_text("foo")
+    source_path.joinpath("libraries", "Bar").mkdir(parents=True)
+    source_path.joinpath("libraries", "Bar", "Bar.h").write_text("bar")
+    source_path.joinpath("file.txt").write_text("file")
+    replacement_path = tmp_path.joinpath("replacement")
+    replacement_path.mkdir()
+    replacement_path.joinpath("Foo.h").write_text("replacement")
+    overlay_path = tmp_path.joinpath("overlay")
+
+    compilesketches.create_overlay(source_path=source_path,
+                                   overlay_path=overlay_path,
+                                   replacement_paths={source_path.joinpath("libraries", "Foo"): replacement_path})
+
+    assert overlay_path.joinpath("libraries", "Foo", "Foo.h").read_text() == "replacement"
+    assert overlay_path.joinpath("libraries", "Bar", "Bar.h").read_text() == "bar"
+    assert overlay_path.joinpath("file.txt").read_text() == "file"
+    # Folders not containing replacements are linked rather than recreated
+    assert overlay_path.joinpath("libraries", "Bar").is_symlink()
+    assert not overlay_path.joinpath("libraries").is_symlink()
+    # The source is not modified
+    assert source_path.joinpath("libraries", "Foo", "Foo.h").read_text() == "foo"
 
 
 # noinspection PyUnresolvedReferences
 @pytest.mark.parametrize("enable_warnings_report", ["true", "false"])
 @pytest.mark.parametrize("do_deltas_report", [True, False])
-def test_get_sketch_report(mocker, enable_warnings_report, do_deltas_report):
-    original_git_ref = unittest.mock.sentinel.original_git_ref
+@pytest.mark.parametrize("has_previous_compilation_result", [True, False])
+def test_get_sketch_report(capsys, mocker, enable_warnings_report, do_deltas_report, has_previous_compilation_result):
     sizes_list = [unittest.mock.sentinel.sketch_report_list1, unittest.mock.sentinel.sketch_report_list2]
     warning_count_list = [unittest.mock.sentinel.warning_count_list1, unittest.mock.sentinel.warning_count_list2]
     sketch = "/foo/SketchName"
@@ -1426,25 +3640,17 @@ def test_get_sketch_report(mocker, enable_warnings_report, do_deltas_report):
     class CompilationResult:
         def __init__(self, sketch_input, success_input):
             self.sketch = sketch_input
+            self.fqbn = "foo:bar:baz"
             self.success = success_input
 
     compilation_result = CompilationResult(sketch_input=sketch, success_input=success)
 
-    previous_compilation_result = unittest.mock.sentinel.previous_compilation_result
-    sizes_report = unittest.mock.sentinel.sizes_report
-    warnings_report = unittest.mock.sentinel.warnings_report
-
-    # Stub
-    class Repo:
-        hexsha = original_git_ref
-
-        def __init__(self):
-            self.head = self
-            self.object = self
-            self.git = self
-
-        def checkout(self):
-            pass  # pragma: no cover
+    if has_previous_compilation_result:
+        previous_compilation_result = unittest.mock.sentinel.previous_compilation_result
+    else:
+        previous_compilation_result = None
+    sizes_report = unittest.mock.sentinel.sizes_report
+    warnings_report = unittest.mock.sentinel.warnings_report
 
     compile_sketches = get_compilesketches_object(enable_warnings_report=enable_warnings_report)
 
@@ -1454,15 +3660,12 @@ def test_get_sketch_report(mocker, enable_warnings_report, do_deltas_report):
                  side_effect=warning_count_list)
     mocker.patch("compilesketches.CompileSketches.do_deltas_report", autospec=True,
                  return_value=do_deltas_report)
-    mocker.patch("git.Repo", autospec=True, return_value=Repo())
-    mocker.patch("compilesketches.CompileSketches.checkout_deltas_base_ref", autospec=True)
-    mocker.patch("compilesketches.CompileSketches.compile_sketch", autospec=True,
-                 return_value=previous_compilation_result)
-    mocker.patch.object(Repo, "checkout")
+    mocker.patch("compilesketches.CompileSketches.print_compilation_result", autospec=True)
     mocker.patch("compilesketches.CompileSketches.get_sizes_report", autospec=True, return_value=sizes_report)
     mocker.patch("compilesketches.CompileSketches.get_warnings_report", autospec=True, return_value=warnings_report)
 
-    sketch_report = compile_sketches.get_sketch_report(compilation_result=compilation_result)
+    sketch_report = compile_sketches.get_sketch_report(compilation_result=compilation_result,
+                                                       previous_compilation_result=previous_compilation_result)
 
     get_sizes_from_output_calls = [unittest.mock.call(compile_sketches, compilation_result=compilation_result)]
     if enable_warnings_report == "true":
@@ -1475,18 +3678,24 @@ def test_get_sketch_report(mocker, enable_warnings_report, do_deltas_report):
         expected_current_warnings = warning_count_list[0]
     else:
         expected_current_warnings = None
-    # noinspection PyUnresolvedReferences
-    compilesketches.CompileSketches.do_deltas_report.assert_called_once_with(compile_sketches,
-                                                                             compilation_result=compilation_result,
-                                                                             current_sizes=sizes_list[0],
-                                                                             current_warnings=expected_current_warnings)
-    if do_deltas_report:
-        git.Repo.assert_called_once_with(path=os.environ["GITHUB_WORKSPACE"])
-        compile_sketches.checkout_deltas_base_ref.assert_called_once()
-        compile_sketches.compile_sketch.assert_called_once_with(compile_sketches,
-                                                                sketch_path=compilation_result.sketch,
-                                                                clean_build_cache=(enable_warnings_report == "true"))
-        Repo.checkout.assert_called_once_with(original_git_ref, recurse_submodules=True)
+
+    if has_previous_compilation_result:
+        # noinspection PyUnresolvedReferences
+        compilesketches.CompileSketches.do_deltas_report.assert_called_once_with(
+            compile_sketches,
+            compilation_result=compilation_result,
+            current_sizes=sizes_list[0],
+            current_warnings=expected_current_warnings
+        )
+
+    if has_previous_compilation_result and do_deltas_report:
+        assert capsys.readouterr().out.strip() == (
+            "Compiling previous version of sketch to determine memory usage change"
+        )
+        compile_sketches.print_compilation_result.assert_called_once_with(
+            compile_sketches,
+            compilation_result=previous_compilation_result
+        )
         get_sizes_from_output_calls.append(
             unittest.mock.call(compile_sketches, compilation_result=previous_compilation_result))
         if enable_warnings_report == "true":
@@ -1496,6 +3705,7 @@ def test_get_sketch_report(mocker, enable_warnings_report, do_deltas_report):
         expected_previous_warnings = warning_count_list[1]
 
     else:
+        compile_sketches.print_compilation_result.assert_not_called()
         expected_previous_sizes = None
         expected_previous_warnings = None
 
@@ -1526,6 +3736,90 @@ def test_get_sketch_report(mocker, enable_warnings_report, do_deltas_report):
     assert sketch_report == expected_sketch_report
 
 
+@pytest.mark.parametrize("enable_warnings_report", ["true", "false"])
+def test_get_sketch_report_previous_sketch_report(capsys, mocker, enable_warnings_report):
+    current_sizes = unittest.mock.sentinel.current_sizes
+    previous_sizes = unittest.mock.sentinel.previous_sizes
+    compilation_result = type("CompilationResult", (), {"sketch": compilesketches.absolute_path(path="examples/Foo"),
+                                                        "fqbn": "foo:bar:baz",
+                                                        "success": True})
+    previous_sketch_report = {"name": "examples/Foo", "sizes": [], "warnings": {"current": {"absolute": 3}}}
+
+    compile_sketches = get_compilesketches_object(enable_deltas_report="true",
+                                                  enable_warnings_report=enable_warnings_report,
+                                                  result_store_path="foo/results.db")
+
+    mocker.patch("compilesketches.CompileSketches.get_sizes_from_output", autospec=True, return_value=current_sizes)
+    mocker.patch("compilesketches.CompileSketches.get_warning_count_from_output", autospec=True, return_value=5)
+    mocker.patch("compilesketches.CompileSketches.do_deltas_report", autospec=True, return_value=True)
+    mocker.patch("compilesketches.CompileSketches.get_sizes_from_sketch_report", autospec=True,
+                 return_value=previous_sizes)
+    mocker.patch("compilesketches.CompileSketches.print_compilation_result", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.get_sizes_report", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.get_warnings_report", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.store_sketch_report", autospec=True)
+
+    sketch_report = compile_sketches.get_sketch_report(compilation_result=compilation_result,
+                                                       previous_compilation_result=None,
+                                                       previous_sketch_report=previous_sketch_report)
+
+    assert capsys.readouterr().out.strip() == (
+        "Using the report on the previous version of sketch to determine memory usage change"
+    )
+    # The previous data is taken from the report, not from a compilation
+    compile_sketches.get_sizes_from_output.assert_called_once_with(compile_sketches,
+                                                                   compilation_result=compilation_result)
+    compile_sketches.print_compilation_result.assert_not_called()
+    compile_sketches.get_sizes_from_sketch_report.assert_called_once_with(compile_sketches,
+                                                                          sketch_report=previous_sketch_report,
+                                                                          current_sizes=current_sizes)
+    compile_sketches.get_sizes_report.assert_called_once_with(compile_sketches,
+                                                              current_sizes=current_sizes,
+                                                              previous_sizes=previous_sizes)
+    if enable_warnings_report == "true":
+        compile_sketches.get_warnings_report.assert_called_once_with(compile_sketches,
+                                                                     current_warnings=5,
+                                                                     previous_warnings=3)
+    else:
+        compile_sketches.get_warnings_report.assert_not_called()
+    # The report is recorded in the result store
+    compile_sketches.store_sketch_report.assert_called_once_with(compile_sketches,
+                                                                 fqbn="foo:bar:baz",
+                                                                 sketch_report=sketch_report)
+
+
+def test_get_sizes_from_sketch_report():
+    compile_sketches = get_compilesketches_object()
+    sketch_report = {
+        "name": "examples/Foo",
+        "compilation_success": True,
+        "sizes": [
+            {"name": "RAM for global variables", "maximum": 2048,
+             "current": {"absolute": 9, "relative": 0.44}},
+            {"name": "flash", "maximum": 32256,
+             "current": {"absolute": 444, "relative": 1.38},
+             "previous": {"absolute": 400, "relative": 1.24},
+             "delta": {"absolute": 44, "relative": 0.14}}
+        ]
+    }
+    current_sizes = [
+        {"name": "flash", "absolute": 450, "maximum": 32256, "relative": 1.4},
+        {"name": "RAM for global variables", "absolute": 9, "maximum": 2048, "relative": 0.44},
+        {"name": "EEPROM", "absolute": 1, "maximum": 1024, "relative": 0.1}
+    ]
+
+    # The sizes are in the order of the current sizes, with "N/A" for the memory types not in the report
+    assert compile_sketches.get_sizes_from_sketch_report(sketch_report=sketch_report,
+                                                         current_sizes=current_sizes) == [
+        {"name": "flash", "absolute": 444, "maximum": 32256, "relative": 1.38},
+        {"name": "RAM for global variables", "absolute": 9, "maximum": 2048, "relative": 0.44},
+        {"name": "EEPROM",
+         "absolute": compile_sketches.not_applicable_indicator,
+         "maximum": compile_sketches.not_applicable_indicator,
+         "relative": compile_sketches.not_applicable_indicator}
+    ]
+
+
 @pytest.mark.parametrize(
     "compilation_success, compilation_output, flash, maximum_flash, relative_flash, ram, maximum_ram, relative_ram",
     [(False,
@@ -1807,39 +4101,6 @@ def test_do_deltas_report(monkeypatch,
                                              current_warnings=current_warnings) == do_deltas_report_expected
 
 
-def test_checkout_deltas_base_ref(monkeypatch, mocker):
-    deltas_base_ref = unittest.mock.sentinel.deltas_base_ref
-
-    # Stubs
-    class Repo:
-        def __init__(self):
-            self.remotes = {"origin": self}
-            self.git = self
-
-        def fetch(self):
-            pass  # pragma: no cover
-
-        def checkout(self):
-            pass  # pragma: no cover
-
-    compile_sketches = get_compilesketches_object(enable_deltas_report="true", deltas_base_ref=deltas_base_ref)
-
-    mocker.patch("git.Repo", autospec=True, return_value=Repo())
-    mocker.patch.object(Repo, "fetch")
-    mocker.patch.object(Repo, "checkout")
-
-    compile_sketches.checkout_deltas_base_ref()
-
-    git.Repo.assert_called_once_with(path=os.environ["GITHUB_WORKSPACE"])
-    Repo.fetch.assert_called_once_with(refspec=deltas_base_ref,
-                                       verbose=compile_sketches.verbose,
-                                       no_tags=True,
-                                       prune=True,
-                                       depth=1,
-                                       recurse_submodules=True)
-    Repo.checkout.assert_called_once_with(deltas_base_ref, recurse_submodules=True)
-
-
 def test_get_sizes_report(mocker):
     sizes_report = [unittest.mock.sentinel.size_report1, unittest.mock.sentinel.size_report1]
     current_sizes = [unittest.mock.sentinel.current_sizes1, unittest.mock.sentinel.current_sizes2]
@@ -1998,14 +4259,8 @@ def test_get_warnings_report(current_warnings, previous_warnings, expected_repor
     ) == expected_report
 
 
-def test_get_sketches_report(monkeypatch, mocker):
-    github_repository = "fooRepository/fooOwner"
-    fqbn_arg = "arduino:avr:uno"
-    current_git_ref = "fooref"
-
-    monkeypatch.setenv("GITHUB_REPOSITORY", github_repository)
-
-    mocker.patch("compilesketches.get_head_commit_hash", autospec=True, return_value=current_git_ref)
+def test_get_board_report(mocker):
+    fqbn = "arduino:avr:uno"
 
     sizes_summary_report = unittest.mock.sentinel.sizes_summary_report
     warnings_summary_report = unittest.mock.sentinel.warnings_summary_report
@@ -2019,22 +4274,13 @@ def test_get_sketches_report(monkeypatch, mocker):
                  autospec=True,
                  return_value=warnings_summary_report)
 
-    compile_sketches = get_compilesketches_object(fqbn_arg=fqbn_arg)
+    compile_sketches = get_compilesketches_object()
 
-    assert compile_sketches.get_sketches_report(sketch_report_list=sketch_report_list) == {
-        compilesketches.CompileSketches.ReportKeys.commit_hash: current_git_ref,
-        compilesketches.CompileSketches.ReportKeys.commit_url: ("https://github.com/"
-                                                                + github_repository
-                                                                + "/commit/"
-                                                                + current_git_ref),
-        compilesketches.CompileSketches.ReportKeys.boards: [
-            {
-                compilesketches.CompileSketches.ReportKeys.board: compile_sketches.fqbn,
-                compilesketches.CompileSketches.ReportKeys.sizes: sizes_summary_report,
-                compilesketches.CompileSketches.ReportKeys.warnings: warnings_summary_report,
-                compilesketches.CompileSketches.ReportKeys.sketches: sketch_report_list
-            }
-        ]
+    assert compile_sketches.get_board_report(fqbn=fqbn, sketch_report_list=sketch_report_list) == {
+        compilesketches.CompileSketches.ReportKeys.board: fqbn,
+        compilesketches.CompileSketches.ReportKeys.sizes: sizes_summary_report,
+        compilesketches.CompileSketches.ReportKeys.warnings: warnings_summary_report,
+        compilesketches.CompileSketches.ReportKeys.sketches: sketch_report_list
     }
 
     compile_sketches.get_sizes_summary_report.assert_called_once_with(compile_sketches,
@@ -2048,18 +4294,30 @@ def test_get_sketches_report(monkeypatch, mocker):
     compilesketches.CompileSketches.get_sizes_summary_report.return_value = []
     compilesketches.CompileSketches.get_warnings_summary_report.return_value = {}
 
-    assert compile_sketches.get_sketches_report(sketch_report_list=sketch_report_list) == {
+    assert compile_sketches.get_board_report(fqbn=fqbn, sketch_report_list=sketch_report_list) == {
+        compilesketches.CompileSketches.ReportKeys.board: fqbn,
+        compilesketches.CompileSketches.ReportKeys.sketches: sketch_report_list
+    }
+
+
+def test_get_sketches_report(monkeypatch, mocker):
+    github_repository = "fooRepository/fooOwner"
+    current_git_ref = "fooref"
+    board_report_list = [unittest.mock.sentinel.board_report1, unittest.mock.sentinel.board_report2]
+
+    monkeypatch.setenv("GITHUB_REPOSITORY", github_repository)
+
+    mocker.patch("compilesketches.get_head_commit_hash", autospec=True, return_value=current_git_ref)
+
+    compile_sketches = get_compilesketches_object()
+
+    assert compile_sketches.get_sketches_report(board_report_list=board_report_list) == {
         compilesketches.CompileSketches.ReportKeys.commit_hash: current_git_ref,
         compilesketches.CompileSketches.ReportKeys.commit_url: ("https://github.com/"
                                                                 + github_repository
                                                                 + "/commit/"
                                                                 + current_git_ref),
-        compilesketches.CompileSketches.ReportKeys.boards: [
-            {
-                compilesketches.CompileSketches.ReportKeys.board: compile_sketches.fqbn,
-                compilesketches.CompileSketches.ReportKeys.sketches: sketch_report_list
-            }
-        ]
+        compilesketches.CompileSketches.ReportKeys.boards: board_report_list
     }
 
 
@@ -2420,7 +4678,10 @@ def test_get_warnings_summary_report():
     )
 
 
-def test_create_sketches_report_file(monkeypatch, tmp_path):
+@pytest.mark.parametrize("fqbn_arg, expected_file_name",
+                         [("arduino:avr:uno", "arduino-avr-uno.json"),
+                          ("- arduino:avr:uno\n- arduino:samd:mkrzero", "sketches-report.json")])
+def test_create_sketches_report_file(monkeypatch, tmp_path, fqbn_arg, expected_file_name):
     sketches_report_path = tmp_path
     sketches_report = [{
         "sketch": "examples/Foo",
@@ -2435,11 +4696,11 @@ def test_create_sketches_report_file(monkeypatch, tmp_path):
     }]
 
     compile_sketches = get_compilesketches_object(sketches_report_path=str(sketches_report_path),
-                                                  fqbn_arg="arduino:avr:uno")
+                                                  fqbn_arg=fqbn_arg)
 
     compile_sketches.create_sketches_report_file(sketches_report=sketches_report)
 
-    with open(file=str(sketches_report_path.joinpath("arduino-avr-uno.json"))) as sketch_report_file:
+    with open(file=str(sketches_report_path.joinpath(expected_file_name))) as sketch_report_file:
         assert json.load(sketch_report_file) == sketches_report
 
 
@@ -2491,6 +4752,33 @@ def test_parse_fqbn_arg_input(fqbn_arg, expected_fqbn, expected_additional_url):
     assert parsed_fqbn_arg["additional_url"] == expected_additional_url
 
 
+@pytest.mark.parametrize("fqbn_input, expected_board_list",
+                         [("arduino:avr:uno", [{"fqbn": "arduino:avr:uno", "additional_url": None}]),
+                          ('\'"foo:bar:baz" "https://example.com/package_foo_index.json"\'',
+                           [{"fqbn": "foo:bar:baz", "additional_url": "https://example.com/package_foo_index.json"}]),
+                          ("foo:bar:baz https://example.com/package_foo_index.json",
+                           [{"fqbn": "foo:bar:baz", "additional_url": "https://example.com/package_foo_index.json"}]),
+                          ("- arduino:avr:uno\n- foo:bar:baz https://example.com/package_foo_index.json",
+                           [{"fqbn": "arduino:avr:uno", "additional_url": None},
+                            {"fqbn": "foo:bar:baz", "additional_url": "https://example.com/package_foo_index.json"}])])
+def test_parse_fqbn_input(fqbn_input, expected_board_list):
+    assert compilesketches.parse_fqbn_input(fqbn_input=fqbn_input) == expected_board_list
+
+
+@pytest.mark.parametrize("jobs_input, expected_output",
+                         [("", os.cpu_count() or 1), ("1", 1), ("12", 12), ("0", None), ("-1", None), ("foo", None)])
+def test_parse_jobs_input(jobs_input, expected_output):
+    assert compilesketches.parse_jobs_input(jobs_input=jobs_input) == expected_output
+
+
+@pytest.mark.parametrize("path_input, expected_output",
+                         [("", None),
+                          ("foo/bar.json", pathlib.Path(os.environ["GITHUB_WORKSPACE"], "foo", "bar.json").resolve()),
+                          ("/foo/bar", pathlib.Path("/foo/bar").resolve())])
+def test_parse_optional_path_input(path_input, expected_output):
+    assert compilesketches.parse_optional_path_input(path_input=path_input) == expected_output
+
+
 @pytest.mark.parametrize("boolean_input, expected_output",
                          [("true", True), ("True", True), ("false", False), ("False", False), ("foo", None)])
 def test_parse_boolean_input(boolean_input, expected_output):
@@ -2522,6 +4810,28 @@ def test_absolute_path(path, expected_absolute_path):
     assert compilesketches.absolute_path(path=pathlib.PurePath(path)) == expected_absolute_path
 
 
+def test_get_git_config_path(tmp_path):
+    repository = git.Repo.init(path=tmp_path.joinpath("repository"))
+    repository.index.commit("foo")
+    repository.git.worktree("add", "--detach", tmp_path.joinpath("worktree"), "HEAD")
+
+    config_path = tmp_path.joinpath("repository", ".git", "config")
+    assert compilesketches.get_git_config_path(repository=repository).resolve() == config_path
+    # The configuration is shared by the worktrees of the repository
+    assert compilesketches.get_git_config_path(
+        repository=git.Repo(path=tmp_path.joinpath("worktree"))
+    ).resolve() == config_path
+
+
+@pytest.mark.parametrize("path, expected_path",
+                         [(os.environ["GITHUB_WORKSPACE"] + "/examples/Foo", "/foo/worktree/examples/Foo"),
+                          ("/outside/workspace/Foo", "/outside/workspace/Foo")])
+def test_path_in_worktree(path, expected_path):
+    assert compilesketches.path_in_worktree(path=pathlib.Path(path), worktree_path=pathlib.Path("/foo/worktree")) == (
+        pathlib.Path(expected_path)
+    )
+
+
 @pytest.mark.parametrize(
     "path, expected_path",
     [("foo/bar-relative-path", pathlib.PurePath("foo/bar-relative-path")),
@@ -2576,8 +4886,22 @@ def test_install_from_download(capsys,
                                                destination_name=destination_name)
 
         # Verify that the installation matches the source
-        assert directories_are_same(left_directory=url_source_path.joinpath(source_path),
-                                    right_directory=destination_parent_path.joinpath(expected_destination_name))
+        assert directories_are_same(
+            left_directory=url_source_path.joinpath(source_path),
+            right_directory=destination_parent_path.joinpath(expected_destination_name),
+            ignore=[compilesketches.CompileSketches.installation_receipt_file_name]
+        )
+        # The installation is a copy, which doesn't depend on the extracted download
+        assert not destination_parent_path.joinpath(expected_destination_name).is_symlink()
+        assert json.loads(
+            destination_parent_path.joinpath(expected_destination_name,
+                                             compilesketches.CompileSketches.installation_receipt_file_name).read_text()
+        ) == {"source-url": url,
+              "source-path": source_path,
+              "checksum": "SHA-256:" + compile_sketches.download_hashes[url],
+              "contents": compilesketches.get_path_hash(
+                  path=destination_parent_path.joinpath(expected_destination_name)
+              )}
     else:
         with pytest.raises(expected_exception=SystemExit, match="1"):
             compile_sketches.install_from_download(url=url,
@@ -2587,6 +4911,439 @@ def test_install_from_download(capsys,
         assert capsys.readouterr().out.strip() == ("::error::Archive source path: " + source_path + " not found")
 
 
+def create_test_archive(archive_path, member_list):
+    """Create a tar or zip archive, depending on the file extension, containing the members from the list of tuples of
+    the member name and content."""
+    if archive_path.suffix == ".zip":
+        with zipfile.ZipFile(file=archive_path, mode="w") as archive:
+            for member_name, content in member_list:
+                archive.writestr(member_name, content)
+    else:
+        with tarfile.open(name=archive_path, mode="w:gz") as archive:
+            for member_name, content in member_list:
+                member = tarfile.TarInfo(name=member_name)
+                member.size = len(content)
+                archive.addfile(tarinfo=member, fileobj=io.BytesIO(content))
+
+
+@pytest.mark.parametrize("archive_name", ["foo.tar.gz", "foo.zip"])
+@pytest.mark.parametrize("use_download_cache", [True, False])
+@pytest.mark.parametrize(
+    "member_name_prefix, sparse_path",
+    [("root/", "src"), ("root/", None), ("", "src"), ("", None), ("./root/", "src/bar")]
+)
+def test_get_extracted_download(tmp_path, archive_name, use_download_cache, member_name_prefix, sparse_path):
+    archive_path = tmp_path.joinpath(archive_name)
+    create_test_archive(archive_path=archive_path,
+                        member_list=[(member_name_prefix + "src/foo.h", b"foo"),
+                                     (member_name_prefix + "src/bar/bar.h", b"bar"),
+                                     (member_name_prefix + "extras/baz.bin", b"baz")])
+
+    if use_download_cache:
+        download_cache_path = str(tmp_path.joinpath("download-cache"))
+    else:
+        download_cache_path = ""
+    compile_sketches = get_compilesketches_object(download_cache_path=download_cache_path)
+
+    archive_root_path = compile_sketches.get_extracted_download(url=archive_path.as_uri(),
+                                                                checksum=None,
+                                                                sparse_path=sparse_path)
+
+    if member_name_prefix == "":
+        assert archive_root_path.name.startswith("install_from_download-")
+    else:
+        assert archive_root_path.name == "root"
+    assert archive_root_path.joinpath("src", "bar", "bar.h").read_bytes() == b"bar"
+    # Only the sparse path is extracted
+    assert archive_root_path.joinpath("src", "foo.h").exists() == (sparse_path in [None, "src"])
+    assert archive_root_path.joinpath("extras", "baz.bin").exists() == (sparse_path is None)
+
+    # The extraction is only done once
+    assert compile_sketches.get_extracted_download(url=archive_path.as_uri(),
+                                                   checksum=None,
+                                                   sparse_path=sparse_path) == archive_root_path
+
+
+def test_get_extracted_download_stream_checksum(capsys, tmp_path):
+    archive_path = tmp_path.joinpath("foo.tar.gz")
+    create_test_archive(archive_path=archive_path, member_list=[("root/foo.h", b"foo")])
+    archive_hash = hashlib.sha256(archive_path.read_bytes()).hexdigest()
+
+    compile_sketches = get_compilesketches_object()
+
+    archive_root_path = compile_sketches.get_extracted_download(url=archive_path.as_uri(),
+                                                                checksum="SHA-256:" + archive_hash)
+    assert archive_root_path.joinpath("foo.h").read_bytes() == b"foo"
+
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.get_extracted_download(url=archive_path.as_uri(), checksum="SHA-256:" + "0" * 64)
+    assert capsys.readouterr().out.strip() == (
+        "::error::Checksum mismatch for download URL: " + archive_path.as_uri() + " Expected: " + "0" * 64
+        + " Actual: " + archive_hash
+    )
+
+
+def test_get_extracted_download_stream_fallback(mocker, tmp_path):
+    archive_path = tmp_path.joinpath("foo.tar")
+    with tarfile.open(name=archive_path, mode="w") as archive:
+        member = tarfile.TarInfo(name="root/extras/foo.h")
+        member.size = 3
+        archive.addfile(tarinfo=member, fileobj=io.BytesIO(b"foo"))
+        # Hard link to a file outside the sparse path
+        member = tarfile.TarInfo(name="root/src/foo.h")
+        member.type = tarfile.LNKTYPE
+        member.linkname = "root/extras/foo.h"
+        archive.addfile(tarinfo=member)
+
+    compile_sketches = get_compilesketches_object()
+
+    mocker.patch("compilesketches.CompileSketches.download", autospec=True, return_value=archive_path)
+
+    archive_root_path = compile_sketches.get_extracted_download(url=archive_path.as_uri(), sparse_path="src")
+
+    # The archive is downloaded and extracted in full instead
+    compile_sketches.download.assert_called_once()
+    assert archive_root_path.joinpath("src", "foo.h").read_bytes() == b"foo"
+
+
+@pytest.mark.parametrize("member_list, expected_root_name",
+                         [([(("root",), True), (("root", "foo.h"), False)], "root"),
+                          ([(("root", "foo.h"), False), (("__MACOSX", "root"), True)], "root"),
+                          ([(("root", "foo.h"), False), (("foo.h",), False)], None),
+                          ([(("root", "foo.h"), False), (("extras", "foo.h"), False)], None),
+                          ([(("foo.h",), False)], None),
+                          ([], None)])
+def test_get_archive_member_root_path(member_list, expected_root_name):
+    extract_path = pathlib.PurePath("/foo/ExtractPath")
+
+    archive_root_path = compilesketches.get_archive_member_root_path(member_list=member_list,
+                                                                     extract_path=extract_path)
+
+    if expected_root_name is None:
+        assert archive_root_path == extract_path
+    else:
+        assert archive_root_path == extract_path.joinpath(expected_root_name)
+
+
+@pytest.mark.parametrize("url, expected_is_tar_archive",
+                         [("https://example.com/foo.tar.gz", True),
+                          ("https://example.com/foo.TGZ", True),
+                          ("https://example.com/foo.tar.bz2?bar=baz", True),
+                          ("https://example.com/foo.tar.xz", True),
+                          ("https://example.com/foo.zip", False),
+                          ("https://example.com/foo.gz", False)])
+def test_is_tar_archive_url(url, expected_is_tar_archive):
+    assert compilesketches.is_tar_archive_url(url=url) == expected_is_tar_archive
+
+
+@pytest.fixture
+def http_server():
+    """Serve a file, with support for conditional requests via ETag or Last-Modified headers."""
+
+    class HTTPServer:
+        content = b"foo content"
+        etag = '"foo-etag"'
+        last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+        # Status of the response to each request
+        status_list = []
+
+    class RequestHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if ((HTTPServer.etag is not None and self.headers.get("If-None-Match") == HTTPServer.etag)
+                    or (HTTPServer.last_modified is not None
+                        and self.headers.get("If-Modified-Since") == HTTPServer.last_modified)):
+                HTTPServer.status_list.append(304)
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            HTTPServer.status_list.append(200)
+            self.send_response(200)
+            if HTTPServer.etag is not None:
+                self.send_header("ETag", HTTPServer.etag)
+            if HTTPServer.last_modified is not None:
+                self.send_header("Last-Modified", HTTPServer.last_modified)
+            self.send_header("Content-Length", str(len(HTTPServer.content)))
+            self.end_headers()
+            if self.command == "GET":
+                self.wfile.write(HTTPServer.content)
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(server_address=("127.0.0.1", 0), RequestHandlerClass=RequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    HTTPServer.url = "http://127.0.0.1:" + str(server.server_port) + "/foo/archive.zip"
+
+    yield HTTPServer
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("etag, last_modified",
+                         [('"foo-etag"', None),
+                          (None, "Wed, 21 Oct 2015 07:28:00 GMT"),
+                          (None, None)])
+# With multiple jobs, a HEAD request determines whether the file is downloaded in ranges
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_download_cache(tmp_path, http_server, etag, last_modified, jobs):
+    http_server.etag = etag
+    http_server.last_modified = last_modified
+    download_cache_path = tmp_path.joinpath("download-cache")
+
+    compile_sketches = get_compilesketches_object(download_cache_path=str(download_cache_path), jobs=jobs)
+
+    for _ in range(2):
+        download_file_path = compile_sketches.download(url=http_server.url,
+                                                       download_folder_path=tmp_path.joinpath("download-folder"))
+        assert download_file_path.name == "archive.zip"
+        assert download_cache_path in download_file_path.parents
+        assert download_file_path.read_bytes() == http_server.content
+
+    if etag is None and last_modified is None:
+        # There is no way to check whether the file has changed. The HEAD request is only made once.
+        assert http_server.status_list == {"1": [200, 200], "2": [200, 200, 200]}[jobs]
+    else:
+        # The conditional HEAD request shows the file hasn't changed, so the file is not requested
+        assert http_server.status_list == {"1": [200, 304], "2": [200, 200, 304]}[jobs]
+
+    # A changed file is downloaded again
+    http_server.content = b"bar content"
+    http_server.etag = None if etag is None else '"bar-etag"'
+    http_server.last_modified = None if last_modified is None else "Thu, 22 Oct 2015 07:28:00 GMT"
+    download_file_path = compile_sketches.download(url=http_server.url,
+                                                   download_folder_path=tmp_path.joinpath("download-folder"))
+    assert download_file_path.read_bytes() == b"bar content"
+    assert http_server.status_list[-1] == 200
+
+
+@pytest.mark.parametrize("use_download_cache", [True, False])
+def test_download_checksum(capsys, tmp_path, http_server, use_download_cache):
+    download_folder_path = tmp_path.joinpath("download-folder")
+    download_folder_path.mkdir()
+    if use_download_cache:
+        download_cache_path = str(tmp_path.joinpath("download-cache"))
+    else:
+        download_cache_path = ""
+
+    compile_sketches = get_compilesketches_object(download_cache_path=download_cache_path)
+
+    content_hash = hashlib.sha256(http_server.content).hexdigest()
+    download_file_path = compile_sketches.download(url=http_server.url,
+                                                   download_folder_path=download_folder_path,
+                                                   checksum="SHA-256:" + content_hash.upper())
+    assert download_file_path.read_bytes() == http_server.content
+    if not use_download_cache:
+        assert download_file_path == download_folder_path.joinpath("archive.zip")
+
+    # The checksum is also verified for a cached download
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.download(url=http_server.url,
+                                  download_folder_path=download_folder_path,
+                                  checksum="SHA-256:" + "0" * 64)
+    assert capsys.readouterr().out.strip() == (
+        "::error::Checksum mismatch for download URL: " + http_server.url + " Expected: " + "0" * 64 + " Actual: "
+        + content_hash
+    )
+    if use_download_cache:
+        # The bad file is removed from the cache
+        assert not download_file_path.exists()
+
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.download(url=http_server.url,
+                                  download_folder_path=download_folder_path,
+                                  checksum="MD5:foo")
+    assert capsys.readouterr().out.strip() == (
+        "::error::Invalid checksum: MD5:foo for download URL: " + http_server.url
+        + " (the supported format is SHA-256:<hash>)"
+    )
+
+
+@pytest.fixture
+def ranged_http_server():
+    """Serve a file of a little over 3 MiB, with support for range requests validated by If-Range."""
+
+    class HTTPServer:
+        content = bytes(range(256)) * 4 * 1024 * 3 + b"foo"
+        etag = '"foo-etag"'
+        accept_ranges = True
+        # Change the ETag after the first request, as if the file was updated during the download
+        change_etag = False
+        # Status of the response to each request
+        status_list = []
+
+    class RequestHandler(http.server.BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            HTTPServer.status_list.append("HEAD")
+            self.send_response(200)
+            if HTTPServer.accept_ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", HTTPServer.etag)
+            self.send_header("Content-Length", str(len(HTTPServer.content)))
+            if HTTPServer.change_etag:
+                HTTPServer.etag = '"bar-etag"'
+            self.end_headers()
+
+        def do_GET(self):
+            range_match = re.fullmatch(pattern=r"bytes=([0-9]+)-([0-9]+)", string=self.headers.get("Range", ""))
+            if (HTTPServer.accept_ranges and range_match is not None
+                    and self.headers.get("If-Range") == HTTPServer.etag):
+                first_byte = int(range_match.group(1))
+                last_byte = int(range_match.group(2))
+                body = HTTPServer.content[first_byte:last_byte + 1]
+                HTTPServer.status_list.append(206)
+                self.send_response(206)
+                self.send_header("Content-Range",
+                                 "bytes {}-{}/{}".format(first_byte, last_byte, len(HTTPServer.content)))
+            else:
+                body = HTTPServer.content
+                HTTPServer.status_list.append(200)
+                self.send_response(200)
+            if HTTPServer.accept_ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", HTTPServer.etag)
+            self.send_header("Content-Length", str(len(body)))
+            if HTTPServer.change_etag:
+                # Changed before the headers are sent, so that no other request can be made with the previous ETag
+                HTTPServer.etag = '"bar-etag"'
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(server_address=("127.0.0.1", 0), RequestHandlerClass=RequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    HTTPServer.url = "http://127.0.0.1:" + str(server.server_port) + "/foo/archive.tar.bz2"
+
+    yield HTTPServer
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize(
+    "jobs, ranged_download_threshold, accept_ranges, change_etag, expected_status_list",
+    # The size of the file and the support for range requests are determined by a HEAD request
+    [("4", "1", True, False, ["HEAD", 206, 206, 206, 206]),
+     ("2", "1", True, False, ["HEAD", 206, 206]),
+     # File not larger than the threshold
+     ("4", "64", True, False, ["HEAD", 200]),
+     # Ranged downloads disabled
+     ("4", "0", True, False, [200]),
+     ("1", "1", True, False, [200]),
+     # Server doesn't support range requests
+     ("4", "1", False, False, ["HEAD", 200]),
+     # File changed during the download, fall back to a single stream
+     ("4", "1", True, True, ["HEAD", 200, 200, 200, 200, 200])]
+)
+@pytest.mark.parametrize("use_download_cache", [False, True])
+def test_download_ranges(tmp_path, ranged_http_server, jobs, ranged_download_threshold, accept_ranges, change_etag,
+                         expected_status_list, use_download_cache):
+    ranged_http_server.accept_ranges = accept_ranges
+    ranged_http_server.change_etag = change_etag
+    compile_sketches = get_compilesketches_object(
+        jobs=jobs,
+        ranged_download_threshold=ranged_download_threshold,
+        download_cache_path=str(tmp_path.joinpath("download-cache")) if use_download_cache else ""
+    )
+    download_folder_path = tmp_path.joinpath("download")
+    download_folder_path.mkdir()
+
+    download_file_path = compile_sketches.download(
+        url=ranged_http_server.url,
+        download_folder_path=download_folder_path,
+        checksum="SHA-256:" + hashlib.sha256(ranged_http_server.content).hexdigest()
+    )
+
+    assert download_file_path.read_bytes() == ranged_http_server.content
+    assert ranged_http_server.status_list == expected_status_list
+
+
+@pytest.mark.parametrize("ranged_download_threshold, expected_extraction", [("1", False), ("64", True)])
+def test_stream_extract_download_ranged(mocker, tmp_path, ranged_http_server, ranged_download_threshold,
+                                        expected_extraction):
+    compile_sketches = get_compilesketches_object(jobs="4", ranged_download_threshold=ranged_download_threshold)
+    mocker.patch("compilesketches.extract_tar_archive", autospec=True, return_value=unittest.mock.sentinel.root_path)
+    mocker.patch("tarfile.open", autospec=True)
+
+    archive_root_path = compile_sketches.stream_extract_download(url=ranged_http_server.url,
+                                                                 checksum=None,
+                                                                 extract_path=tmp_path,
+                                                                 sparse_path=None)
+
+    if expected_extraction:
+        assert archive_root_path == unittest.mock.sentinel.root_path
+        compilesketches.extract_tar_archive.assert_called_once()
+        assert ranged_http_server.status_list == ["HEAD", 200]
+    else:
+        # Large archives are left to be downloaded in ranges, without starting a transfer of the file
+        assert archive_root_path is None
+        compilesketches.extract_tar_archive.assert_not_called()
+        assert ranged_http_server.status_list == ["HEAD"]
+
+        # The HEAD request is not repeated by the ranged download
+        download_folder_path = tmp_path.joinpath("download")
+        download_folder_path.mkdir()
+        compile_sketches.download(url=ranged_http_server.url, download_folder_path=download_folder_path)
+        assert ranged_http_server.status_list == ["HEAD", 206, 206, 206, 206]
+
+
+@pytest.mark.parametrize("etag, last_modified",
+                         [('"foo-etag"', None),
+                          (None, "Wed, 21 Oct 2015 07:28:00 GMT")])
+def test_get_url_validators(http_server, etag, last_modified):
+    http_server.etag = etag
+    http_server.last_modified = last_modified
+
+    validators = compilesketches.get_url_validators(url=http_server.url)
+    assert validators == {"etag": etag, "last_modified": last_modified}
+
+    # The file hasn't changed
+    assert compilesketches.get_url_validators(url=http_server.url, validators=validators) is None
+
+    # The file has changed
+    if etag is not None:
+        http_server.etag = '"bar-etag"'
+    else:
+        http_server.last_modified = "Thu, 22 Oct 2015 07:28:00 GMT"
+    assert compilesketches.get_url_validators(url=http_server.url, validators=validators) == {
+        "etag": http_server.etag, "last_modified": http_server.last_modified
+    }
+    # The requests don't download the file
+    assert all(status in [200, 304] for status in http_server.status_list)
+
+
+def test_get_board_manager_index_file_name():
+    assert compilesketches.get_board_manager_index_file_name(
+        url="https://example.com/foo/package_foo_index.json?bar=baz"
+    ) == "package_foo_index.json"
+
+
+@pytest.mark.parametrize("headers, expected_validator",
+                         [({"ETag": '"foo-etag"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}, '"foo-etag"'),
+                          ({"ETag": 'W/"foo-etag"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+                           "Wed, 21 Oct 2015 07:28:00 GMT"),
+                          ({"ETag": 'W/"foo-etag"'}, None),
+                          ({}, None)])
+def test_get_range_validator(headers, expected_validator):
+    assert compilesketches.get_range_validator(headers=headers) == expected_validator
+
+
+@pytest.mark.parametrize("checksum, expected_hash",
+                         [("SHA-256:" + "aB" * 32, "ab" * 32),
+                          ("SHA-256:" + "a" * 63, None),
+                          ("SHA-1:" + "a" * 40, None),
+                          ("a" * 64, None)])
+def test_parse_checksum(checksum, expected_hash):
+    assert compilesketches.parse_checksum(checksum=checksum) == expected_hash
+
+
 @pytest.mark.parametrize("archive_extract_path, expected_archive_root_path",
                          [(test_data_path.joinpath("test_get_archive_root_folder_name", "has-root"),
                            test_data_path.joinpath("test_get_archive_root_folder_name", "has-root", "root")),
@@ -2598,20 +5355,77 @@ def test_get_archive_root_path(archive_extract_path, expected_archive_root_path)
     assert compilesketches.get_archive_root_path(archive_extract_path) == expected_archive_root_path
 
 
-@pytest.mark.parametrize("url, source_path, destination_name, expected_destination_name",
-                         [("https://example.com/foo/FooRepositoryName.git", ".", None, "FooRepositoryName"),
+@pytest.mark.parametrize("submodules, expected_submodules",
+                         [(None, None),
+                          (True, None),
+                          (False, ()),
+                          (["foo", "bar/baz"], ("foo", "bar/baz")),
+                          ([], ())])
+def test_get_repository_dependency_submodules(submodules, expected_submodules):
+    dependency = {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.git"}
+    if submodules is not None:
+        dependency[compilesketches.CompileSketches.dependency_submodules_key] = submodules
+
+    compile_sketches = get_compilesketches_object()
+
+    assert compile_sketches.get_repository_dependency_submodules(dependency=dependency) == expected_submodules
+
+
+@pytest.mark.parametrize("submodules", ["foo", [1]])
+def test_get_repository_dependency_submodules_invalid(capsys, submodules):
+    dependency = {compilesketches.CompileSketches.dependency_source_url_key: "https://example.com/foo.git",
+                  compilesketches.CompileSketches.dependency_submodules_key: submodules}
+
+    compile_sketches = get_compilesketches_object()
+
+    with pytest.raises(expected_exception=SystemExit, match="1"):
+        compile_sketches.get_repository_dependency_submodules(dependency=dependency)
+    assert capsys.readouterr().out.startswith("::error::Invalid submodules value:")
+
+
+@pytest.mark.parametrize(
+    "submodules, sparse_path, expected_arguments",
+    [(None, None, ["--recommend-shallow", "--"]),
+     (None, "foo", ["--recommend-shallow", "--", "foo"]),
+     (("bar", "baz"), "foo", ["--recommend-shallow", "--", "bar", "baz"]),
+     ((), None, None)]
+)
+def test_update_submodules(submodules, sparse_path, expected_arguments):
+    repository = unittest.mock.MagicMock()
+
+    compile_sketches = get_compilesketches_object(jobs="3")
+    compile_sketches.update_submodules(repository=repository,
+                                       submodules=submodules,
+                                       sparse_path=sparse_path)
+
+    if expected_arguments is None:
+        repository.git.submodule.assert_not_called()
+    else:
+        repository.git.submodule.assert_called_once_with("update", "--init", "--recursive", "--jobs", "3",
+                                                         *expected_arguments)
+
+
+@pytest.mark.parametrize("url, source_path, destination_name, expected_destination_name, expected_sparse_path",
+                         [("https://example.com/foo/FooRepositoryName.git", ".", None, "FooRepositoryName", None),
                           ("https://example.com/foo/FooRepositoryName.git/", "./examples", "FooDestinationName",
-                           "FooDestinationName"),
-                          ("git://example.com/foo/FooRepositoryName", "examples", None, None)])
-def test_install_from_repository(mocker, url, source_path, destination_name, expected_destination_name):
+                           "FooDestinationName", "examples"),
+                          ("git://example.com/foo/FooRepositoryName", "examples", None, None, "examples")])
+def test_install_from_repository(mocker, url, source_path, destination_name, expected_destination_name,
+                                 expected_sparse_path):
     git_ref = unittest.mock.sentinel.git_ref
-    destination_parent_path = unittest.mock.sentinel.destination_parent_path
+    destination_parent_path = pathlib.PurePath("/foo/DestinationParentPath")
     force = unittest.mock.sentinel.force
+    submodules = ("foo",)
     clone_path = pathlib.PurePath("/foo/ClonePath")
 
     mocker.patch("tempfile.mkdtemp", autospec=True, return_value=clone_path)
     mocker.patch("compilesketches.CompileSketches.clone_repository", autospec=True)
     mocker.patch("compilesketches.CompileSketches.install_from_path", autospec=True)
+    # There is no installation by a previous run, so the commit is not looked up
+    mocker.patch("compilesketches.CompileSketches.has_installation_receipt", autospec=True, return_value=False)
+    mocker.patch("compilesketches.CompileSketches.get_repository_commit", autospec=True)
+    mocker.patch("git.Repo", autospec=True)
+    git.Repo.return_value.head.commit.hexsha = "foo-commit"
 
     compile_sketches = get_compilesketches_object()
 
@@ -2620,7 +5434,8 @@ def test_install_from_repository(mocker, url, source_path, destination_name, exp
                                              source_path=source_path,
                                              destination_parent_path=destination_parent_path,
                                              destination_name=destination_name,
-                                             force=force)
+                                             force=force,
+                                             submodules=submodules)
 
     # noinspection PyUnresolvedReferences
     tempfile.mkdtemp.assert_called_once_with(dir=compile_sketches.temporary_directory.name,
@@ -2628,16 +5443,396 @@ def test_install_from_repository(mocker, url, source_path, destination_name, exp
     compile_sketches.clone_repository.assert_called_once_with(compile_sketches,
                                                               url=url,
                                                               git_ref=git_ref,
-                                                              destination_path=clone_path)
+                                                              destination_path=clone_path,
+                                                              sparse_path=expected_sparse_path,
+                                                              submodules=submodules)
     # noinspection PyUnresolvedReferences
     compile_sketches.install_from_path.assert_called_once_with(
         compile_sketches,
         source_path=clone_path.joinpath(source_path),
         destination_parent_path=destination_parent_path,
         destination_name=expected_destination_name,
-        force=force
+        force=force,
+        receipt={"source-url": url, "source-path": source_path, "submodules": ["foo"], "commit": "foo-commit"}
+    )
+    assert compile_sketches.repository_commits == {(url, git_ref): "foo-commit"}
+    compile_sketches.has_installation_receipt.assert_called_once_with(
+        compile_sketches,
+        destination_path=pathlib.Path(destination_parent_path,
+                                      expected_destination_name or pathlib.PurePath(source_path).name)
+    )
+    compile_sketches.get_repository_commit.assert_not_called()
+
+
+def test_install_from_repository_installed(mocker, tmp_path):
+    url = "https://example.com/foo/FooRepositoryName.git"
+    destination_parent_path = tmp_path.joinpath("destination-parent")
+    destination_path = destination_parent_path.joinpath("FooRepositoryName")
+    destination_path.mkdir(parents=True)
+    destination_path.joinpath(compilesketches.CompileSketches.installation_receipt_file_name).write_text(
+        json.dumps({"source-url": url, "source-path": ".", "submodules": None, "commit": "a" * 40,
+                    "contents": compilesketches.get_path_hash(path=destination_path)})
     )
 
+    mocker.patch("compilesketches.CompileSketches.get_repository_clone", autospec=True)
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.install_from_repository(url=url,
+                                             git_ref="a" * 40,
+                                             source_path=".",
+                                             destination_parent_path=destination_parent_path)
+
+    compile_sketches.get_repository_clone.assert_not_called()
+    assert compile_sketches.path_installations == {destination_path: destination_path}
+
+
+def commit_file(repository, file_name, content):
+    """Commit a file to the test repository and return the commit. Each commit is dated a day after the previous one."""
+    pathlib.Path(repository.working_tree_dir, file_name).write_text(content)
+    repository.index.add([file_name])
+    actor = git.Actor(name="Foo", email="foo@example.com")
+    commit_date = "2020-01-{:02d}T00:00:00".format(len(list(repository.iter_commits("--all"))) + 1)
+    return repository.index.commit(message="Add " + file_name, author=actor, committer=actor,
+                                   author_date=commit_date, commit_date=commit_date)
+
+
+@pytest.fixture
+def origin_repository(tmp_path):
+    repository = git.Repo.init(path=tmp_path.joinpath("origin"))
+    with repository.config_writer() as config_writer:
+        config_writer.set_value("user", "name", "Foo")
+        config_writer.set_value("user", "email", "foo@example.com")
+    commit_file(repository=repository, file_name="foo.txt", content="foo")
+    repository.create_tag("v1.0.0")
+
+    return repository
+
+
+@pytest.mark.parametrize("repository_cache_path", ["", "repository-cache"])
+def test_get_repository_clone(mocker, tmp_path, repository_cache_path):
+    url = "https://example.com/foo/FooRepository.git"
+    git_ref = unittest.mock.sentinel.git_ref
+    submodules = ("foo",)
+    mirror_path = pathlib.PurePath("/foo/MirrorPath")
+
+    mocker.patch("compilesketches.CompileSketches.clone_repository", autospec=True)
+    mocker.patch("compilesketches.CompileSketches.get_repository_mirror", autospec=True, return_value=mirror_path)
+
+    compile_sketches = get_compilesketches_object(repository_cache_path=repository_cache_path)
+
+    clone_folder = compile_sketches.get_repository_clone(url=url, git_ref=git_ref, submodules=submodules)
+    # The clone is only done once
+    assert compile_sketches.get_repository_clone(url=url, git_ref=git_ref, submodules=submodules) == clone_folder
+
+    if repository_cache_path == "":
+        compile_sketches.clone_repository.assert_called_once_with(compile_sketches,
+                                                                  url=url,
+                                                                  git_ref=git_ref,
+                                                                  destination_path=clone_folder,
+                                                                  sparse_path=None,
+                                                                  submodules=submodules)
+    else:
+        compile_sketches.get_repository_mirror.assert_called_once_with(compile_sketches, url=url)
+        compile_sketches.clone_repository.assert_called_once_with(compile_sketches,
+                                                                  url=url,
+                                                                  git_ref=git_ref,
+                                                                  destination_path=clone_folder,
+                                                                  reference_path=mirror_path,
+                                                                  submodules=submodules)
+
+
+def test_get_repository_mirror(tmp_path, origin_repository):
+    url = pathlib.Path(origin_repository.working_tree_dir).as_uri()
+    repository_cache_path = tmp_path.joinpath("repository-cache")
+
+    compile_sketches = get_compilesketches_object(repository_cache_path=str(repository_cache_path))
+    mirror_path = compile_sketches.get_repository_mirror(url=url)
+
+    assert repository_cache_path in mirror_path.parents
+    mirror_repository = git.Repo(path=mirror_path)
+    assert mirror_repository.bare
+    assert mirror_repository.rev_parse("v1.0.0") == origin_repository.head.commit
+
+    new_commit = commit_file(repository=origin_repository, file_name="bar.txt", content="bar")
+    origin_repository.create_tag("v1.0.1")
+
+    # The mirror is only updated once per run
+    assert compile_sketches.get_repository_mirror(url=url) == mirror_path
+    assert mirror_repository.head.commit != new_commit
+
+    # The cached mirror is updated by the next run
+    compile_sketches = get_compilesketches_object(repository_cache_path=str(repository_cache_path))
+    assert compile_sketches.get_repository_mirror(url=url) == mirror_path
+    assert mirror_repository.head.commit == new_commit
+    assert mirror_repository.rev_parse("v1.0.1") == new_commit
+
+    # An invalid cache entry is replaced
+    shutil.rmtree(path=mirror_path)
+    mirror_path.mkdir()
+    compile_sketches = get_compilesketches_object(repository_cache_path=str(repository_cache_path))
+    assert compile_sketches.get_repository_mirror(url=url) == mirror_path
+    assert git.Repo(path=mirror_path).head.commit == new_commit
+
+
+@pytest.mark.parametrize("git_ref", ["v1.0.0", "latest", None])
+def test_clone_repository_reference(tmp_path, origin_repository, git_ref):
+    url = pathlib.Path(origin_repository.working_tree_dir).as_uri()
+    first_commit = origin_repository.head.commit
+    new_commit = commit_file(repository=origin_repository, file_name="bar.txt", content="bar")
+    if git_ref == "latest":
+        origin_repository.create_tag("v1.0.1")
+
+    compile_sketches = get_compilesketches_object(repository_cache_path=str(tmp_path.joinpath("repository-cache")))
+    destination_path = tmp_path.joinpath("destination_path")
+
+    compile_sketches.clone_repository(url=url,
+                                      git_ref=git_ref,
+                                      destination_path=destination_path,
+                                      reference_path=compile_sketches.get_repository_mirror(url=url))
+
+    cloned_repository = git.Repo(path=destination_path)
+    # The objects are borrowed from the mirror
+    assert destination_path.joinpath(".git", "objects", "info", "alternates").exists()
+    if git_ref == "v1.0.0":
+        assert cloned_repository.head.commit == first_commit
+    else:
+        assert cloned_repository.head.commit == new_commit
+
+
+@pytest.mark.parametrize(
+    "git_ref, allow_hash_fetch, expected_commit_index, expected_shallow",
+    [(None, False, 3, True),
+     ("v1.0.0", False, 0, True),
+     ("v1.1.0", False, 1, True),
+     ("refs/tags/v1.1.0", False, 1, True),
+     ("foo-branch", False, 2, True),
+     ("latest", False, 1, True),
+     ("second-commit-hash", True, 1, True),
+     # The server doesn't allow fetching commits by hash
+     ("second-commit-hash", False, 1, False),
+     # Not resolvable from the remote refs
+     ("second-commit-hash-abbreviated", True, 1, False),
+     ("v1.1.0~1", False, 0, False)]
+)
+def test_clone_repository_shallow(monkeypatch, tmp_path, origin_repository, git_ref, allow_hash_fetch,
+                                  expected_commit_index, expected_shallow):
+    commit_list = [origin_repository.head.commit]
+    commit_list.append(commit_file(repository=origin_repository, file_name="bar.txt", content="bar"))
+    # Annotated tag
+    origin_repository.create_tag("v1.1.0", message="Release 1.1.0")
+    origin_repository.create_head("foo-branch")
+    origin_repository.heads["foo-branch"].checkout()
+    commit_list.append(commit_file(repository=origin_repository, file_name="baz.txt", content="baz"))
+    origin_repository.heads["master"].checkout()
+    commit_list.append(commit_file(repository=origin_repository, file_name="qux.txt", content="qux"))
+    with origin_repository.config_writer() as config_writer:
+        config_writer.set_value("uploadpack", "allowFilter", True)
+        config_writer.set_value("uploadpack", "allowAnySHA1InWant", allow_hash_fetch)
+    # Prevent protocol version 2 from implicitly allowing fetching commits by hash
+    monkeypatch.setenv("GIT_CONFIG_PARAMETERS", "'protocol.version=0'")
+
+    if git_ref == "second-commit-hash":
+        git_ref = commit_list[1].hexsha
+    elif git_ref == "second-commit-hash-abbreviated":
+        git_ref = commit_list[1].hexsha[:7]
+
+    url = pathlib.Path(origin_repository.working_tree_dir).as_uri()
+    destination_path = tmp_path.joinpath("destination_path")
+    destination_path.mkdir()
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.clone_repository(url=url, git_ref=git_ref, destination_path=destination_path)
+
+    cloned_repository = git.Repo(path=destination_path)
+    assert cloned_repository.head.commit == commit_list[expected_commit_index]
+    assert destination_path.joinpath(".git", "shallow").exists() == expected_shallow
+
+
+def test_clone_repository_commit_hash(mocker, tmp_path, origin_repository):
+    commit = commit_file(repository=origin_repository, file_name="bar.txt", content="bar")
+    commit_file(repository=origin_repository, file_name="baz.txt", content="baz")
+    with origin_repository.config_writer() as config_writer:
+        config_writer.set_value("uploadpack", "allowAnySHA1InWant", True)
+    mocker.spy(compilesketches, "get_remote_refs")
+
+    destination_path = tmp_path.joinpath("destination_path")
+    destination_path.mkdir()
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.clone_repository(url=pathlib.Path(origin_repository.working_tree_dir).as_uri(),
+                                      git_ref=commit.hexsha,
+                                      destination_path=destination_path)
+
+    assert git.Repo(path=destination_path).head.commit == commit
+    assert destination_path.joinpath(".git", "shallow").exists()
+    # The commit hash doesn't need to be resolved
+    compilesketches.get_remote_refs.assert_not_called()
+
+
+@pytest.mark.parametrize("git_ref", [None, "v1.0.0"])
+def test_clone_repository_sparse(tmp_path, origin_repository, git_ref):
+    pathlib.Path(origin_repository.working_tree_dir, "libraries", "Foo").mkdir(parents=True)
+    pathlib.Path(origin_repository.working_tree_dir, "libraries", "Bar").mkdir(parents=True)
+    commit_file(repository=origin_repository, file_name="libraries/Foo/Foo.h", content="foo")
+    commit_file(repository=origin_repository, file_name="libraries/Bar/Bar.h", content="bar")
+    if git_ref is not None:
+        origin_repository.delete_tag(origin_repository.tags[git_ref])
+        origin_repository.create_tag(git_ref)
+    with origin_repository.config_writer() as config_writer:
+        config_writer.set_value("uploadpack", "allowFilter", True)
+
+    url = pathlib.Path(origin_repository.working_tree_dir).as_uri()
+    destination_path = tmp_path.joinpath("destination_path")
+    destination_path.mkdir()
+
+    compile_sketches = get_compilesketches_object()
+    compile_sketches.clone_repository(url=url,
+                                      git_ref=git_ref,
+                                      destination_path=destination_path,
+                                      sparse_path="libraries/Foo")
+
+    assert destination_path.joinpath("libraries", "Foo", "Foo.h").read_text() == "foo"
+    assert not destination_path.joinpath("libraries", "Bar").exists()
+    assert not destination_path.joinpath("foo.txt").exists()
+    cloned_repository = git.Repo(path=destination_path)
+    assert cloned_repository.head.commit == origin_repository.head.commit
+    # The contents of the files outside the sparse path were not downloaded
+    missing_object_list = cloned_repository.git.rev_list("--objects", "--missing=print", "HEAD").splitlines()
+    assert "?" + origin_repository.head.commit.tree["libraries/Bar/Bar.h"].hexsha in missing_object_list
+    assert "?" + origin_repository.head.commit.tree["libraries/Foo/Foo.h"].hexsha not in missing_object_list
+
+
+@pytest.mark.parametrize("source_path, expected_sparse_path",
+                         [(".", None),
+                          ("./", None),
+                          ("..", None),
+                          ("../foo", None),
+                          ("/foo", None),
+                          ("foo/..", None),
+                          ("foo/*", None),
+                          ("foo[1]", None),
+                          ("#foo", None),
+                          ("!foo", None),
+                          ("foo", "foo"),
+                          ("./foo/bar/", "foo/bar"),
+                          ("foo/../bar", "bar")])
+def test_get_sparse_path(source_path, expected_sparse_path):
+    assert compilesketches.get_sparse_path(source_path=source_path) == expected_sparse_path
+
+
+@pytest.mark.parametrize("git_ref, submodules, expected_submodule_list",
+                         [(None, None, ["sub/a", "sub/b"]),
+                          ("v1.0.0", None, ["sub/a", "sub/b"]),
+                          (None, ("sub/a",), ["sub/a"]),
+                          ("v1.0.0", ("sub/b",), ["sub/b"]),
+                          ("v1.0.0", (), [])])
+def test_clone_repository_submodules(monkeypatch, tmp_path, origin_repository, git_ref, submodules,
+                                     expected_submodule_list):
+    # Local submodule URLs are disallowed by default
+    monkeypatch.setenv("GIT_CONFIG_PARAMETERS", "'protocol.file.allow=always'")
+    for submodule_name in ["a", "b"]:
+        submodule_repository = git.Repo.init(path=tmp_path.joinpath(submodule_name))
+        commit_file(repository=submodule_repository, file_name=submodule_name + ".h", content=submodule_name)
+        origin_repository.git.submodule("add", pathlib.Path(submodule_repository.working_tree_dir).as_uri(),
+                                        "sub/" + submodule_name)
+    actor = git.Actor(name="Foo", email="foo@example.com")
+    origin_repository.index.commit(message="Add submodules", author=actor, committer=actor)
+    origin_repository.delete_tag(origin_repository.tags["v1.0.0"])
+    origin_repository.create_tag("v1.0.0")
+
+    url = pathlib.Path(origin_repository.working_tree_dir).as_uri()
+    destination_path = tmp_path.joinpath("destination_path")
+    destination_path.mkdir()
+
+    compile_sketches = get_compilesketches_object(jobs="2")
+    compile_sketches.clone_repository(url=url, git_ref=git_ref, destination_path=destination_path,
+                                      submodules=submodules)
+
+    for submodule_name in ["a", "b"]:
+        assert destination_path.joinpath("sub", submodule_name, submodule_name + ".h").exists() == (
+            "sub/" + submodule_name in expected_submodule_list
+        )
+
+
+def test_get_remote_refs(origin_repository):
+    lightweight_tag_commit = origin_repository.head.commit
+    annotated_tag_commit = commit_file(repository=origin_repository, file_name="bar.txt", content="bar")
+    annotated_tag = origin_repository.create_tag("v1.1.0", message="Release 1.1.0")
+
+    remote_refs = compilesketches.get_remote_refs(url=pathlib.Path(origin_repository.working_tree_dir).as_uri())
+
+    assert remote_refs["HEAD"] == annotated_tag_commit.hexsha
+    assert remote_refs["refs/heads/master"] == annotated_tag_commit.hexsha
+    assert remote_refs["refs/tags/v1.0.0"] == lightweight_tag_commit.hexsha
+    # Annotated tags are resolved to the tagged commit
+    assert annotated_tag.tag.hexsha != annotated_tag_commit.hexsha
+    assert remote_refs["refs/tags/v1.1.0"] == annotated_tag_commit.hexsha
+    assert "refs/tags/v1.1.0^{}" not in remote_refs
+
+
+@pytest.mark.parametrize("git_ref, expected_remote_ref",
+                         [("HEAD", "HEAD"),
+                          ("refs/heads/foo", "refs/heads/foo"),
+                          ("heads/foo", "refs/heads/foo"),
+                          ("foo", "refs/tags/foo"),
+                          ("bar", "refs/heads/bar"),
+                          (1.5, "refs/tags/1.5"),
+                          ("f" * 40, "f" * 40),
+                          ("f" * 7, None),
+                          ("baz", None)])
+def test_get_remote_ref(git_ref, expected_remote_ref):
+    remote_refs = {"HEAD": "a" * 40,
+                   "refs/heads/foo": "b" * 40,
+                   "refs/tags/foo": "c" * 40,
+                   "refs/heads/bar": "d" * 40,
+                   "refs/tags/1.5": "e" * 40}
+
+    assert compilesketches.get_remote_ref(remote_refs=remote_refs, git_ref=git_ref) == expected_remote_ref
+
+
+def test_get_repository_commit(mocker):
+    mocker.patch("compilesketches.get_remote_refs", autospec=True,
+                 return_value={"HEAD": "a" * 40, "refs/tags/v1.0.0": "b" * 40})
+
+    compile_sketches = get_compilesketches_object()
+
+    assert compile_sketches.get_repository_commit(url="https://example.com/foo.git", git_ref=None) == "a" * 40
+    assert compile_sketches.get_repository_commit(url="https://example.com/foo.git", git_ref="v1.0.0") == "b" * 40
+    assert compile_sketches.get_repository_commit(url="https://example.com/foo.git", git_ref="v2.0.0") is None
+    # Full commit hashes don't need to be looked up
+    assert compile_sketches.get_repository_commit(url="https://example.com/foo.git", git_ref="c" * 40) == "c" * 40
+    # The remote refs are looked up once per repository
+    assert compile_sketches.get_repository_commit(url="https://example.com/foo.git", git_ref=None) == "a" * 40
+    compilesketches.get_remote_refs.assert_called_once_with(url="https://example.com/foo.git")
+    # The lookup is shared with the clone
+    assert compile_sketches.get_repository_remote_refs(url="https://example.com/foo.git") == {
+        "HEAD": "a" * 40, "refs/tags/v1.0.0": "b" * 40
+    }
+    compilesketches.get_remote_refs.assert_called_once()
+
+    compilesketches.get_remote_refs.side_effect = git.exc.GitCommandError("ls-remote", 128)
+    assert compile_sketches.get_repository_commit(url="https://example.com/bar.git", git_ref=None) is None
+
+
+def test_get_latest_tag(tmp_path, origin_repository):
+    url = pathlib.Path(origin_repository.working_tree_dir).as_uri()
+    compile_sketches = get_compilesketches_object()
+
+    # The repository has no tags
+    origin_repository.delete_tag(origin_repository.tags["v1.0.0"])
+    assert compile_sketches.get_latest_tag(url=url, remote_refs=compilesketches.get_remote_refs(url=url)) is None
+
+    with origin_repository.config_writer() as config_writer:
+        config_writer.set_value("uploadpack", "allowFilter", True)
+    first_commit = origin_repository.head.commit
+    origin_repository.create_tag("v2.0.0")
+    second_commit = commit_file(repository=origin_repository, file_name="bar.txt", content="bar")
+    # The tag of the most recent commit is the latest, regardless of the version
+    origin_repository.create_tag("v1.0.1", ref=second_commit, message="Release 1.0.1")
+    assert first_commit.committed_date < second_commit.committed_date
+
+    assert compile_sketches.get_latest_tag(url=url, remote_refs=compilesketches.get_remote_refs(url=url)) == "v1.0.1"
+
 
 @pytest.mark.parametrize("git_ref", ["v1.0.2", "latest", None])
 def test_clone_repository(tmp_path, git_ref):